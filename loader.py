@@ -2,6 +2,8 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from data import config
 from utils.db_api.sqlite import Database
+from utils.db_api.async_sqlite import AsyncDatabase
+from utils.sender import MessagePipeline
 
 
 bot = Bot(token=config.BOT_TOKEN)
@@ -9,4 +11,8 @@ dp = Dispatcher()
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 db = Database()
-db = Database(path_to_db="main.db")
\ No newline at end of file
+db = Database(path_to_db="main.db")
+# Handlerlar va scheduler uchun: so'rovlar DB thread'larida, event loop bloklanmaydi
+adb = AsyncDatabase(db)
+# Chiquvchi xabarlar navbati (scheduler va admin xabarlari)
+sender = MessagePipeline(bot)
@@ -9,8 +9,20 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from loader import bot, dp, db
-from utils.api.crypto import get_real_prices
+from loader import bot, dp, db, adb, sender
+from utils.api.crypto import (
+    get_real_prices, close_session, get_cache_stats, get_router_stats, is_valid_symbol, symbol_registry
+)
+from utils.api.stream import ticker_stream, PRICE_STREAM_ENABLED
+from utils.api.fiat import fiat_rates
+from utils.scheduler import start_scheduler, watched_symbols, scheduler_stats
+from utils.watchlist import watchlist
+from utils.price_state import price_state
+from utils.render import fragments, render_search_card, format_price
+from utils.sharding import shards
+from utils.counters import view_counters
+from utils.user_cache import user_cache
+from utils.alerts import alerts, parse_alert, Alert, ABOVE, BELOW, ALERTS_MAX_FREE, ALERTS_MAX_PREMIUM
 
 # Configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,6 +46,9 @@ class PremiumOrder(StatesGroup):
 class CoinSearch(StatesGroup):
     waiting_for_symbol = State()
 
+class AlertSetup(StatesGroup):
+    rule = State()
+
 # ==================== KEYBOARDS ====================
 def main_menu(user_id):
     kb = [[KeyboardButton(text="📊 Narxlarni ko'rish")],
@@ -45,51 +60,16 @@ def main_menu(user_id):
 def back_keyboard():
     return ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="🏠 Asosiy menyu")]], resize_keyboard=True)
 
-def is_registered(user_id):
+async def is_registered(user_id):
     """Return True if the user exists in the Users table."""
-    return bool(db.execute("SELECT 1 FROM Users WHERE id=?", (user_id,), fetchone=True))
-
-
-def format_price(value, currency='USD'):
-    """Format small prices with adaptive precision to avoid 0.0000 output.
-    currency: 'USD', 'RUB', or 'UZS'
-    """
-    try:
-        v = float(value)
-    except Exception:
-        return "N/A"
+    return await user_cache.get(user_id) is not None
 
-    # USD formatting
-    if currency == 'USD':
-        if v >= 1:
-            return f"${v:,.2f}"
-        if v >= 0.01:
-            return f"${v:,.4f}"
-        if v >= 0.0001:
-            return f"${v:,.6f}"
-        return f"${v:.8f}"
-
-    # RUB formatting
-    if currency == 'RUB':
-        if v >= 1:
-            return f"{v:,.2f} ₽"
-        if v >= 0.01:
-            return f"{v:,.4f} ₽"
-        return f"{v:.6f} ₽"
-
-    # UZS formatting (show integer part if large)
-    if currency == 'UZS':
-        if v >= 1:
-            return f"{int(round(v)): ,d} so'm".replace(' ,', ',')
-        return f"{v:.2f} so'm"
-
-    return str(value)
 
 # ==================== START & REGISTRATION ====================
 @dp.message(Command("start"))
 async def start_bot(message: types.Message, state: FSMContext):
     await state.clear()
-    user = db.execute("SELECT * FROM Users WHERE id=?", (message.from_user.id,), fetchone=True)
+    user = await user_cache.get(message.from_user.id)
     
     if not user:
         kb = [[KeyboardButton(text="📱 Raqamni ulashish", request_contact=True)]]
@@ -100,7 +80,7 @@ async def start_bot(message: types.Message, state: FSMContext):
         )
         await state.set_state(Register.phone)
     else:
-        await message.answer(f"Xush kelibsiz! {user[3]} 👋", reply_markup=main_menu(message.from_user.id))
+        await message.answer(f"Xush kelibsiz! {user['full_name']} 👋", reply_markup=main_menu(message.from_user.id))
 
 @dp.message(Register.phone, F.contact)
 async def get_phone(message: types.Message, state: FSMContext):
@@ -110,11 +90,13 @@ async def get_phone(message: types.Message, state: FSMContext):
     username = message.from_user.username or "N/A"
 
     try:
-        db.execute(
+        await adb.execute(
             "INSERT INTO Users (id, phone, username, full_name, interval_min, is_premium, view_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (message.from_user.id, phone, username, full_name, MIN_INTERVAL, 0, 0),
             commit=True
         )
+        user_cache.put(message.from_user.id, phone=phone, username=username, full_name=full_name, interval_min=MIN_INTERVAL)
+        watchlist.set_user(message.from_user.id, MIN_INTERVAL, False)
         await message.answer("✅ Ro'yxatdan o'tdingiz!", reply_markup=main_menu(message.from_user.id), parse_mode="HTML")
         logger.info(f"New user: {message.from_user.id}")
     except Exception as e:
@@ -128,9 +110,10 @@ async def get_phone(message: types.Message, state: FSMContext):
 @dp.message(F.text == "📊 Narxlarni ko'rish")
 async def show_coins_search(message: types.Message, state: FSMContext):
     await state.clear()    # Ensure user is registered before allowing coin search
-    if not is_registered(message.from_user.id):
+    if not await is_registered(message.from_user.id):
         return await message.answer("Iltimos /start bilan ro'yxatdan o'ting.", reply_markup=main_menu(message.from_user.id))
-    db.execute("UPDATE Users SET view_count = view_count + 1 WHERE id=?", (message.from_user.id,), commit=True)
+    view_counters.add_view(message.from_user.id)
+    user_cache.increment(message.from_user.id, "view_count")
     await state.set_state(CoinSearch.waiting_for_symbol)
     await message.answer(
         "💰 <b>Coin qidiruv</b>\n\nCoin belgisini kiriting👇",
@@ -145,57 +128,46 @@ async def search_coin(message: types.Message, state: FSMContext):
         return await message.answer("Asosiy menyu", reply_markup=main_menu(message.from_user.id))
     
     # Extra safety: prevent unregistered users from performing searches
-    if not is_registered(message.from_user.id):
+    u = await user_cache.get(message.from_user.id)
+    if u is None:
         await state.clear()
         return await message.answer("Iltimos /start bilan ro'yxatdan o'ting.", reply_markup=main_menu(message.from_user.id))
 
     coin = message.text.upper().strip()
     
-    if not coin.isalpha() or len(coin) < 2:
+    if not is_valid_symbol(coin):
         return await message.answer("❌ To'g'ri coin belgisini kiriting (masalan: BTC)")
     
     # Daily limit check for free users (5 views/day). Premium and admin exempt.
-    u = db.execute("SELECT is_premium, daily_views, last_view_date FROM Users WHERE id=?", (message.from_user.id,), fetchone=True)
     today = datetime.now().strftime("%Y-%m-%d")
-    if u:
-        is_prem = bool(u[0]) or (message.from_user.id == PRIMARY_ADMIN)
-        daily = u[1] or 0
-        last_date = u[2]
-        if last_date != today:
-            db.execute("UPDATE Users SET daily_views=0, last_view_date=? WHERE id=?", (today, message.from_user.id), commit=True)
-            daily = 0
-        if not is_prem and daily >= 5:
+    is_prem = bool(u['is_premium']) or (message.from_user.id == PRIMARY_ADMIN)
+    if not is_prem:
+        # Xotiradagi hisoblagich - DB'ga fonda yoziladi
+        daily = view_counters.daily_views(message.from_user.id, today, u['daily_views'], u['last_view_date'])
+        if daily >= 5:
             kb = InlineKeyboardBuilder()
             kb.button(text="💎 Premium", callback_data="buy_premium")
             kb.adjust(1)
             return await message.answer("⚠️ Bugun bepul limit (5 ta) tugadi. Iltimos ertaga qayta urinib ko'ring yoki Premium oling👇", parse_mode="HTML", reply_markup=kb.as_markup())
+        # Tekshiruvdan keyin darhol (await'dan oldin) band qilinadi - parallel qidiruvlar
+        # limitdan o'tib ketmaydi; narx topilmasa qaytariladi
+        view_counters.add_daily(message.from_user.id, today)
+    reserved = not is_prem
     
-    loading = await message.answer("🔍 Qidirilmoqda...")
-    
+    loading = None
     try:
-        data = get_real_prices([coin])
+        loading = await message.answer("🔍 Qidirilmoqda...")
+        data = await get_real_prices([coin])
         if not data or data[0] is None:
             await loading.delete()
             return await message.answer(f"❌  Bu turdagi coin mavjud emas. Iltimos to'g'ri kiriting.", parse_mode="HTML")
+        # Narx topildi - ko'rish hisobda qoladi
+        reserved = False
         
-        d = data[0]
-        usd_str = format_price(d.get('usd', 0), 'USD')
-        rub_str = format_price(d.get('rub', 0), 'RUB')
-        uzs_str = format_price(d.get('uzs', 0), 'UZS')
-
-        text = f"💰 <b>{coin}</b>\n\n💵 USD: <code>{usd_str}</code>\n🇷🇺 RUB: <code>{rub_str}</code>\n🇺🇿 UZS: <code>{uzs_str}</code>"
-        
-        # Increment daily_views for free users
-        u2 = db.execute("SELECT is_premium FROM Users WHERE id=?", (message.from_user.id,), fetchone=True)
-        is_prem2 = bool(u2[0]) if u2 else False
-        if not is_prem2 and message.from_user.id != PRIMARY_ADMIN:
-            db.execute("UPDATE Users SET daily_views = daily_views + 1 WHERE id=?", (message.from_user.id,), commit=True)
-        
-        exists = db.execute("SELECT * FROM CryptoPreferences WHERE user_id=? AND coin_symbol=?", 
-                           (message.from_user.id, coin), fetchone=True)
+        text = render_search_card(coin, data[0])
         
         kb = InlineKeyboardBuilder()
-        if exists:
+        if watchlist.has(message.from_user.id, coin):
             kb.button(text="✅ Kuzatuvda", callback_data=f"watching_{coin}")
         else:
             kb.button(text="🔔 Kuzatuvga qo'shish", callback_data=f"notify_{coin}")
@@ -204,20 +176,26 @@ async def search_coin(message: types.Message, state: FSMContext):
         await message.answer(text, parse_mode="HTML", reply_markup=kb.as_markup())
     except Exception as e:
         logger.error(f"Search error: {e}")
-        await loading.delete()
+        if loading:
+            await loading.delete()
         await message.answer("❌ Xatolik yuz berdi.")
+    finally:
+        # Narx topilmadi, xato yoki bekor qilindi - band qilingan ko'rish qaytariladi
+        if reserved:
+            view_counters.release_daily(message.from_user.id, today)
 
 @dp.callback_query(F.data.startswith("notify_"))
 async def add_watchlist(callback: types.CallbackQuery):
     # Prevent unregistered users from adding coins to watchlist
-    if not is_registered(callback.from_user.id):
+    if not await is_registered(callback.from_user.id):
         await callback.answer("Iltimos /start bilan ro'yxatdan o'ting.", show_alert=True)
         return
 
     coin = callback.data.split("_")[1]
     try:
-        db.execute("INSERT INTO CryptoPreferences (user_id, coin_symbol) VALUES (?, ?)",
+        await adb.execute("INSERT OR IGNORE INTO CryptoPreferences (user_id, coin_symbol) VALUES (?, ?)",
                   (callback.from_user.id, coin), commit=True)
+        watchlist.add(callback.from_user.id, coin)
         await callback.answer(f"✅ {coin} qo'shildi!", show_alert=True)
         kb = InlineKeyboardBuilder()
         kb.button(text="✅ Kuzatuvda", callback_data=f"watching_{coin}")
@@ -229,46 +207,139 @@ async def add_watchlist(callback: types.CallbackQuery):
 @dp.message(F.text == "🔔 Avto-xabardorlik")
 async def auto_notify(message: types.Message):
     # Ensure the user is registered before showing auto-notify settings
-    if not is_registered(message.from_user.id):
+    if not await is_registered(message.from_user.id):
         return await message.answer("Iltimos /start bilan ro'yxatdan o'ting.", reply_markup=main_menu(message.from_user.id))
 
-    coins = db.execute("SELECT coin_symbol FROM CryptoPreferences WHERE user_id=?", 
-                      (message.from_user.id,), fetchall=True)
-    interval = db.execute("SELECT interval_min FROM Users WHERE id=?", 
-                         (message.from_user.id,), fetchone=True)[0] or MIN_INTERVAL
+    coins = sorted(watchlist.coins_of(message.from_user.id))
+    interval = watchlist.interval(message.from_user.id)
+    user_alerts = alerts.user_alerts(message.from_user.id)
     
     text = "<b>🔔 Avto-xabardorlik</b>\n\n"
+    kb = InlineKeyboardBuilder()
     if not coins:
         text += "❌ Hech qanday coin yo'q.\n📊 Avval coin qo'shing."
-        kb = InlineKeyboardBuilder()
     else:
         text += f"🕒 Interval: {interval}s\n📊 Coinlar: {len(coins)} ta\n\nO'chirish:"
-        kb = InlineKeyboardBuilder()
         for c in coins:
-            kb.button(text=f"❌ {c[0]}", callback_data=f"remove_{c[0]}")
+            kb.button(text=f"❌ {c}", callback_data=f"remove_{c}")
         kb.button(text="🕒 Intervalni o'zgartirish", callback_data="edit_interval")
-        kb.adjust(1)
+        live = "✅ yoqilgan" if watchlist.ticker_message(message.from_user.id) is not None else "❌ o'chiq"
+        kb.button(text=f"📌 Live ticker: {live}", callback_data="live_toggle")
+    
+    text += f"\n\n🚨 Signallar: {len(user_alerts)} ta"
+    for a in user_alerts:
+        kb.button(text=f"🗑 {a.describe()}", callback_data=f"alertdel_{a.id}")
+    kb.button(text="➕ Signal qo'shish", callback_data="alert_add")
+    kb.adjust(1)
     
     await message.answer(text, parse_mode="HTML", reply_markup=kb.as_markup())
 
 @dp.callback_query(F.data.startswith("remove_"))
 async def remove_coin(callback: types.CallbackQuery):
     # Prevent unregistered users from removing coins
-    if not is_registered(callback.from_user.id):
+    if not await is_registered(callback.from_user.id):
         await callback.answer("Iltimos /start bilan ro'yxatdan o'ting.", show_alert=True)
         return
 
     coin = callback.data.split("_")[1]
-    db.execute("DELETE FROM CryptoPreferences WHERE user_id=? AND coin_symbol=?",
+    await adb.execute("DELETE FROM CryptoPreferences WHERE user_id=? AND coin_symbol=?",
               (callback.from_user.id, coin), commit=True)
+    watchlist.remove(callback.from_user.id, coin)
     await callback.answer(f"✅ {coin} o'chirildi!")
     await callback.message.delete()
 
+@dp.callback_query(F.data == "live_toggle")
+async def live_toggle(callback: types.CallbackQuery):
+    """Live ticker: har o'zgarishda yangi xabar o'rniga bitta pin qilingan xabar tahrirlanadi"""
+    if not await is_registered(callback.from_user.id):
+        await callback.answer("Iltimos /start bilan ro'yxatdan o'ting.", show_alert=True)
+        return
+
+    enabled = watchlist.ticker_message(callback.from_user.id) is None
+    await adb.execute("UPDATE Users SET live_ticker=?, ticker_message_id=NULL WHERE id=?",
+              (int(enabled), callback.from_user.id), commit=True)
+    watchlist.set_live(callback.from_user.id, enabled)
+    if enabled:
+        await callback.answer("📌 Live ticker yoqildi - narxlar bitta xabarda yangilanadi", show_alert=True)
+    else:
+        await callback.answer("Live ticker o'chirildi")
+    await callback.message.delete()
+
+@dp.callback_query(F.data == "alert_add")
+async def alert_add(callback: types.CallbackQuery, state: FSMContext):
+    if not await is_registered(callback.from_user.id):
+        await callback.answer("Iltimos /start bilan ro'yxatdan o'ting.", show_alert=True)
+        return
+
+    await state.set_state(AlertSetup.rule)
+    await callback.message.answer(
+        "🚨 <b>Yangi signal</b>\n\n"
+        "<code>BTC > 70000</code> - narx shu qiymatdan oshganda\n"
+        "<code>TON < 5</code> - narx shu qiymatdan tushganda\n"
+        "<code>BTC 5% 60</code> - 60 daqiqa ichida ±5% o'zgarganda",
+        parse_mode="HTML",
+        reply_markup=back_keyboard()
+    )
+    await callback.answer()
+
+@dp.message(AlertSetup.rule, F.text)
+async def alert_rule(message: types.Message, state: FSMContext):
+    if message.text == "🏠 Asosiy menyu":
+        await state.clear()
+        return await message.answer("Asosiy menyu", reply_markup=main_menu(message.from_user.id))
+
+    rule = parse_alert(message.text)
+    if not rule or not is_valid_symbol(rule[0]):
+        return await message.answer("❌ Format noto'g'ri. Masalan: <code>BTC > 70000</code>", parse_mode="HTML")
+    coin, kind, threshold, window_min = rule
+
+    uid = message.from_user.id
+    limit = ALERTS_MAX_PREMIUM if watchlist.is_premium(uid) or uid == PRIMARY_ADMIN else ALERTS_MAX_FREE
+    if len(alerts.user_alerts(uid)) >= limit:
+        await state.clear()
+        return await message.answer(f"⚠️ Signallar limiti: {limit} ta", reply_markup=main_menu(uid))
+
+    data = await get_real_prices([coin])
+    if not data or data[0] is None:
+        return await message.answer("❌  Bu turdagi coin mavjud emas. Iltimos to'g'ri kiriting.")
+    price = data[0]['usd']
+    if kind == ABOVE and price >= threshold:
+        return await message.answer(f"⚠️ {coin} hozir {format_price(price)} - chegara bundan yuqori bo'lsin.")
+    if kind == BELOW and price <= threshold:
+        return await message.answer(f"⚠️ {coin} hozir {format_price(price)} - chegara bundan past bo'lsin.")
+
+    alert_id = await adb.insert(
+        "INSERT INTO PriceAlerts (user_id, coin_symbol, kind, threshold, window_min, active, created_at) VALUES (?, ?, ?, ?, ?, 1, ?)",
+        (uid, coin, kind, threshold, window_min, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    )
+    alert = Alert(alert_id, uid, coin, kind, threshold, window_min)
+    alerts.add(alert)
+    alerts.seed(coin, price)
+    shards.forward_alert_add(alert, price)
+    await state.clear()
+    await message.answer(
+        f"✅ Signal qo'shildi: <b>{alert.describe()}</b>\n💵 Hozir: <code>{format_price(price)}</code>",
+        parse_mode="HTML",
+        reply_markup=main_menu(uid)
+    )
+
+@dp.callback_query(F.data.startswith("alertdel_"))
+async def remove_alert(callback: types.CallbackQuery):
+    alert = alerts.get(int(callback.data.split("_")[1]))
+    if not alert or alert.user_id != callback.from_user.id:
+        await callback.answer("❌ Signal topilmadi", show_alert=True)
+        return
+
+    await adb.execute("UPDATE PriceAlerts SET active=0 WHERE id=?", (alert.id,), commit=True)
+    alerts.remove(alert.id)
+    shards.forward_alert_remove(alert)
+    await callback.answer(f"✅ {alert.describe()} o'chirildi!")
+    await callback.message.delete()
+
 # ==================== PROFILE ====================
 @dp.message(F.text == "👤 Profile")
 async def profile(message: types.Message):
-    u = db.execute("SELECT full_name, phone, is_premium, premium_until, interval_min, view_count FROM Users WHERE id=?",
-                  (message.from_user.id,), fetchone=True)
+    u = await user_cache.get(message.from_user.id)
     
     if not u:
         return await message.answer("Iltimos /start bilan ro'yxatdan o'ting.", reply_markup=main_menu(message.from_user.id))
@@ -276,12 +347,12 @@ async def profile(message: types.Message):
     if message.from_user.id == PRIMARY_ADMIN:
         status, expire, is_prem = "⚡ Admin", "Cheksiz", True
     else:
-        is_prem = bool(u[2])
+        is_prem = bool(u['is_premium'])
         status = "💎 Premium" if is_prem else "🆓 Oddiy"
-        expire = u[3] or "Yo'q"
+        expire = u['premium_until'] or "Yo'q"
     
-    # Unpack the selected columns (order: full_name, phone, is_premium, premium_until, interval_min, view_count)
-    full_name, phone, is_premium_flag, premium_until, interval_min, view_count = u
+    # view_count keshda write-behind ko'rishlar bilan birga yuritiladi
+    full_name, phone, interval_min, view_count = u['full_name'], u['phone'], u['interval_min'], u['view_count']
     username = message.from_user.username or "N/A"
     user_id = message.from_user.id
 
@@ -308,16 +379,17 @@ async def update_name(message: types.Message, state: FSMContext):
         await state.clear()
         return await message.answer("Bekor qilindi", reply_markup=main_menu(message.from_user.id))
     
-    db.execute("UPDATE Users SET full_name=? WHERE id=?", (message.text, message.from_user.id), commit=True)
+    await adb.execute("UPDATE Users SET full_name=? WHERE id=?", (message.text, message.from_user.id), commit=True)
+    user_cache.update(message.from_user.id, full_name=message.text)
     await message.answer("✅ Yangilandi!", reply_markup=main_menu(message.from_user.id))
     await state.clear()
 
 @dp.callback_query(F.data == "edit_interval")
 async def edit_interval(callback: types.CallbackQuery, state: FSMContext):
     await state.clear()
-    u = db.execute("SELECT is_premium FROM Users WHERE id=?", (callback.from_user.id,), fetchone=True)
+    u = await user_cache.get(callback.from_user.id)
     
-    if callback.from_user.id == PRIMARY_ADMIN or (u and u[0]):
+    if callback.from_user.id == PRIMARY_ADMIN or (u and u['is_premium']):
         await callback.message.answer(f"🕒 Yangi interval (min {MIN_INTERVAL}s):", reply_markup=back_keyboard())
         await state.set_state(EditProfile.interval)
     else:
@@ -337,7 +409,9 @@ async def update_interval(message: types.Message, state: FSMContext):
     if val < MIN_INTERVAL:
         return await message.answer(f"⚠️ Min {MIN_INTERVAL}s!")
     
-    db.execute("UPDATE Users SET interval_min=? WHERE id=?", (val, message.from_user.id), commit=True)
+    await adb.execute("UPDATE Users SET interval_min=? WHERE id=?", (val, message.from_user.id), commit=True)
+    user_cache.update(message.from_user.id, interval_min=val)
+    watchlist.set_interval(message.from_user.id, val)
     await message.answer(f"✅ Interval: {val}s", reply_markup=main_menu(message.from_user.id), parse_mode="HTML")
     await state.clear()
 
@@ -409,8 +483,8 @@ async def handle_payment(message: types.Message, state: FSMContext):
     rate = extract_rate(caption_text)
 
     # Get phone from DB if available
-    phone_row = db.execute("SELECT phone FROM Users WHERE id=?", (message.from_user.id,), fetchone=True)
-    phone = phone_row[0] if phone_row else "N/A"
+    u = await user_cache.get(message.from_user.id)
+    phone = u['phone'] if u else "N/A"
 
     username = message.from_user.username or "N/A"
     full_name = message.from_user.full_name or username or "N/A"
@@ -437,17 +511,19 @@ async def handle_payment(message: types.Message, state: FSMContext):
 
     # Save last payment info to user record so admin can see it in the panel
     try:
-        db.execute(
+        await adb.execute(
             "UPDATE Users SET last_payment_amount=?, last_payment_rate=? WHERE id=?",
             (amount, rate, message.from_user.id), commit=True
         )
+        user_cache.update(message.from_user.id, last_payment_amount=amount, last_payment_rate=rate)
     except Exception as e:
         logger.error(f"Failed to save last payment info: {e}")
 
     try:
-        await bot.send_photo(PRIMARY_ADMIN, message.photo[-1].file_id,
+        # Pipeline orqali yuboriladi; natija kutiladi, xato bo'lsa foydalanuvchiga aytiladi
+        await (await sender.submit(PRIMARY_ADMIN, "send_photo", photo=message.photo[-1].file_id,
             caption=caption,
-            reply_markup=kb.as_markup())
+            reply_markup=kb.as_markup()))
         await message.answer("✅ Yuborildi! Admin tomonidan tasdiqlanishini kuting.", reply_markup=main_menu(message.from_user.id))
     except Exception as e:
         logger.error(f"Error sending payment to admin: {e}")
@@ -460,28 +536,112 @@ async def admin_panel(message: types.Message):
     if message.from_user.id != PRIMARY_ADMIN:
         return
     
-    users = db.execute("SELECT id, full_name, is_premium, view_count FROM Users", fetchall=True)
+    users = await adb.execute("SELECT id, full_name, is_premium, view_count FROM Users", fetchall=True)
     kb = InlineKeyboardBuilder()
     for u in users:
         icon = "💎" if u[2] else "👤"
-        kb.button(text=f"{icon} {u[1]} ({u[3]})", callback_data=f"user_{u[0]}")
+        kb.button(text=f"{icon} {u[1]} ({(u[3] or 0) + view_counters.pending_views(u[0])})", callback_data=f"user_{u[0]}")
     kb.adjust(1)
     await message.answer(f"👥 Users: {len(users)}", reply_markup=kb.as_markup())
 
+@dp.message(Command("stats"))
+async def ops_stats(message: types.Message):
+    """Ops uchun: narx cache va manbalar holati"""
+    if message.from_user.id != PRIMARY_ADMIN:
+        return
+
+    cache = get_cache_stats()
+    router = get_router_stats()
+
+    lines = ["<b>📈 Narx cache</b>"]
+    lines.append(", ".join(f"{k}: {v}" for k, v in cache.items()))
+    lines.append("")
+    lines.append(f"<b>🔀 Manbalar</b> ({' → '.join(router['order'])})")
+    for name, p in router["providers"].items():
+        lines.append(
+            f"{name}: {p['state']} | req {p['requests']} | err {p['error_rate']:.0%} | "
+            f"429 {p['rate_limited']} | 401 {p['auth_errors']} | p50 {p['p50_ms']}ms | p95 {p['p95_ms']}ms"
+        )
+    for name, q in router["quota"].items():
+        lines.append(
+            f"  {name} kvota: {q['remaining']}/{q['capacity']:.0f} | throttled {q['throttled']} | "
+            f"kutish {q['waited_seconds']}s"
+        )
+    hedge = router["hedge"]
+    lines.append(
+        f"Hedge: {'on' if hedge['enabled'] else 'off'} | byudjet {hedge['tokens']} | rad {hedge['denied']} | "
+        f"hedge {hedge['hedges']} | yutuq {hedge['wins']}"
+    )
+    lines.append("")
+    lines.append(
+        "<b>🕒 Scheduler</b> " + ", ".join(
+            f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in scheduler_stats.items()
+        )
+    )
+    lines.append("<b>📋 Kuzatuv</b> " + ", ".join(f"{k}: {v}" for k, v in watchlist.snapshot().items()))
+    lines.append("<b>🚨 Signallar</b> " + ", ".join(f"{k}: {v}" for k, v in alerts.snapshot().items()))
+    lines.append("<b>🧮 Hisoblagichlar</b> " + ", ".join(f"{k}: {v}" for k, v in view_counters.snapshot().items()))
+    lines.append("<b>👥 User kesh</b> " + ", ".join(f"{k}: {v}" for k, v in user_cache.snapshot().items()))
+    lines.append("<b>🧩 Render</b> " + ", ".join(f"{k}: {v}" for k, v in fragments.snapshot().items()))
+    state = price_state.snapshot()
+    lines.append(
+        f"<b>🗂 Narx holati</b> {state['users']} user × {state['coins']} coin | juftlar {state['pairs']} | "
+        f"{state['bytes'] / 1024:.1f} KB | {state['bytes_per_pair']} B/juft | evict {state['evicted_users']}/{state['evicted_coins']}"
+    )
+    out = sender.snapshot()
+    lines.append(
+        f"<b>📤 Sender</b> navbat {out['queue']} | sent {out['sent']} | failed {out['failed']} | "
+        f"retry {out['retried']} | flood {out['retry_after']} | p50 {out['p50_ms']}ms | p95 {out['p95_ms']}ms"
+    )
+    for lane, d in adb.snapshot().items():
+        if d is not None:
+            lines.append(
+                f"<b>🗄 DB {lane}</b> navbat {d['queue']} (max {d['max_queue']}) | so'rov {d['queries']} | "
+                f"xato {d['errors']} | kutish p95 {d['wait_p95_ms']}ms | p50 {d['p50_ms']}ms | p95 {d['p95_ms']}ms"
+            )
+    lines.append(
+        f"<b>💱 Kurslar</b> UZS {fiat_rates.get('uzs')} | RUB {fiat_rates.get('rub')} | "
+        + ", ".join(f"{k}: {v}" for k, v in fiat_rates.stats.items())
+    )
+    if shards.enabled:
+        cluster = shards.snapshot()
+        lines.append("")
+        lines.append("<b>🧩 Shardlar</b> leader: " + ", ".join(f"{k}: {v}" for k, v in cluster["leader"].items()))
+        for shard, st in cluster["shards"].items():
+            lines.append(
+                f"#{shard}: {st['users']} user | lag {st['lag']}s | max {st['max_lag']}s | tick {st['ticks']} | "
+                f"snapshot {st['snapshot_age']}s | navbat {st['queue']} | sent {st['sent']} | failed {st['failed']}"
+            )
+        if cluster["restarts"]:
+            lines.append("Qayta ishga tushirildi: " + ", ".join(f"{k}: {v}" for k, v in cluster["restarts"].items()))
+    if PRICE_STREAM_ENABLED:
+        stream = ticker_stream.stats()
+        lines.append("")
+        lines.append(f"<b>📡 Stream</b> symbols {stream['symbols']} | hits {stream['hits']}")
+        for name, f in stream["feeds"].items():
+            lines.append(
+                f"{name}: {'🟢' if f['connected'] else '🔴'} | sub {f['subscribed']} | "
+                f"msg {f['messages']} | reconnect {f['reconnects']}"
+            )
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
 @dp.callback_query(F.data.startswith("user_"))
 async def manage_user(callback: types.CallbackQuery):
     uid = int(callback.data.split("_")[1])
     # Select explicit columns to avoid confusion if DB schema changes
-    u = db.execute(
-        "SELECT id, full_name, phone, username, is_premium, premium_until, premium_plan_days, premium_given_at, last_payment_amount, last_payment_rate, interval_min, view_count FROM Users WHERE id=?",
-        (uid,), fetchone=True
-    )
+    u = await user_cache.get(uid)
 
     if not u:
         await callback.answer("User not found", show_alert=True)
         return
 
-    (user_id, full_name, phone, username, is_prem_flag, premium_until, premium_plan_days, premium_given_at, last_payment_amount, last_payment_rate, interval_min, view_count) = u
+    (user_id, full_name, phone, username, is_prem_flag, premium_until, premium_plan_days, premium_given_at, last_payment_amount, last_payment_rate, interval_min, view_count) = (
+        u[column] for column in (
+            "id", "full_name", "phone", "username", "is_premium", "premium_until", "premium_plan_days",
+            "premium_given_at", "last_payment_amount", "last_payment_rate", "interval_min", "view_count",
+        )
+    )
     username_display = username or "N/A"
     status = "💎 Premium" if is_prem_flag else "🆓 Oddiy"
 
@@ -537,27 +697,31 @@ async def accept_payment(callback: types.CallbackQuery):
     until = (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
     given_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    db.execute(
+    await adb.execute(
         "UPDATE Users SET is_premium=1, premium_until=?, premium_plan_days=?, premium_given_at=? WHERE id=?",
         (until, days, given_at, uid), commit=True
     )
-    await bot.send_message(uid, f"🎉 Premium faol ({days} kun)!")
+    user_cache.update(uid, is_premium=1, premium_until=until, premium_plan_days=days, premium_given_at=given_at)
+    watchlist.set_premium(uid, True)
+    await sender.send(uid, f"🎉 Premium faol ({days} kun)!")
     await callback.answer("✅ Tasdiqlandi")
     await callback.message.delete()
 
 @dp.callback_query(F.data.startswith("reject_"))
 async def reject_payment(callback: types.CallbackQuery):
     uid = int(callback.data.split("_")[1])
-    await bot.send_message(uid, "❌ Chek rad etildi! Iltimos, to'lovni qayta amalga oshiring. Yoki admin bilan bog'laning. @c0mrade_p2p")
+    await sender.send(uid, "❌ Chek rad etildi! Iltimos, to'lovni qayta amalga oshiring. Yoki admin bilan bog'laning. @c0mrade_p2p")
     await callback.message.delete()
 
 @dp.callback_query(F.data.startswith("take_"))
 async def take_premium(callback: types.CallbackQuery):
     uid = int(callback.data.split("_")[1])
     # Clear premium flags and metadata
-    db.execute("UPDATE Users SET is_premium=0, premium_until=NULL, premium_plan_days=NULL, premium_given_at=NULL WHERE id=?", (uid,), commit=True)
+    await adb.execute("UPDATE Users SET is_premium=0, premium_until=NULL, premium_plan_days=NULL, premium_given_at=NULL WHERE id=?", (uid,), commit=True)
+    user_cache.update(uid, is_premium=0, premium_until=None, premium_plan_days=None, premium_given_at=None)
+    watchlist.set_premium(uid, False)
     # Notify the user that admin will remove their premium
-    await bot.send_message(uid, "Admin sizdan premium obunasini olib qoydi😞")
+    await sender.send(uid, "Admin sizdan premium obunasini olib qoydi😞")
     await callback.answer("✅ Olib tashlandi")
     await callback.message.delete()
 
@@ -579,11 +743,14 @@ async def catch_all(message: types.Message):
 # ==================== MAIN ====================
 async def main():
     db.create_tables()
+    # Symbol indeksi va oxirgi fiat kurslarni diskdan yuklash (fonda yangilanadi)
+    symbol_registry.load()
+    fiat_rates.load()
+    # Kuzatuv indeksi - scheduler tickda DB o'qimaydi
+    watchlist.load(db)
+    alerts.load(db)
     
-    # Avto-xabardorlik schedulerni ishga tushirish
-    from utils.scheduler import start_scheduler
-    
-    # Ikkalasini parallel ishga tushirish
+    # Bot va avto-xabardorlik schedulerni parallel ishga tushirish
     async def run_bot():
         logger.info("🤖 Bot started!")
         await dp.start_polling(bot)
@@ -591,11 +758,38 @@ async def main():
     async def run_scheduler():
         await start_scheduler()
     
-    # Ikkalasini bir vaqtda ishga tushirish
-    await asyncio.gather(
-        run_bot(),
-        run_scheduler()
-    )
+    tasks = [run_bot(), symbol_registry.run(), fiat_rates.run(), watchlist.run(adb), view_counters.run(adb)]
+    if shards.enabled:
+        # Scheduler workerlar va narx leader alohida jarayonlarda - bu jarayon faqat polling
+        shards.start()
+        tasks.append(shards.run())
+    else:
+        # Oxirgi yuborilgan narxlar va muddatlar (restartdan keyin xabarlar to'lqini bo'lmasin)
+        price_state.load()
+        price_state.retain(watchlist)
+        tasks += [run_scheduler(), price_state.run()]
+        # WebSocket ticker oqimlari (ixtiyoriy)
+        if PRICE_STREAM_ENABLED:
+            tasks.append(ticker_stream.run(watched_symbols))
+    
+    # Barchasini bir vaqtda ishga tushirish
+    await sender.start()
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Navbatdagi xabarlar va pool'dagi HTTP ulanishlarni yopish
+        await sender.stop()
+        if shards.enabled:
+            await shards.stop()
+        else:
+            price_state.save()
+        await close_session()
+        # Yozilmagan view_count / daily_views
+        try:
+            await view_counters.flush(adb)
+        except Exception as e:
+            logger.error(f"Hisoblagichlar saqlanmadi: {e}")
+        adb.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Ticker oqimlari lokal stand-in WebSocket serverga qarshi: obuna, xatodan keyin
+qayta ulanish, eskirgan narx va Coinbase ishlamaganda Binance narxi
+Ishga tushirish: python -m pytest tests  (yoki python -m unittest tests.test_stream)
+"""
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from aiohttp import web
+
+from utils.api import stream
+from utils.api.stream import CoinbaseFeed, TickerStream
+
+
+class StandInServer:
+    """Bitta yo'lda WebSocket: har ulanish handler(server, ws, connection_no) ga beriladi"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = 0
+        self.received = []
+        self.runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self._ws)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"ws://{host}:{port}/"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        await self.handler(self, ws, self.connections)
+        return ws
+
+    async def next_message(self, ws):
+        message = await ws.receive_json()
+        self.received.append(message)
+        return message
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("shart bajarilmadi")
+        await asyncio.sleep(0.02)
+
+
+def coinbase_tick(coin, price):
+    return {"type": "ticker", "product_id": f"{coin}-USD", "price": str(price)}
+
+
+class StreamFeedTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # Qayta ulanish pauzasi testda qisqa (backoff * 0.5)
+        patcher = mock.patch.object(stream.random, "random", return_value=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tasks = []
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def start(self, coro):
+        self.tasks.append(asyncio.ensure_future(coro))
+
+    async def serve(self, handler):
+        # Cleanup asyncTearDown'dan keyin - avval klient tasklari to'xtaydi
+        server = await StandInServer(handler).start()
+        self.addAsyncCleanup(server.stop)
+        return server
+
+    async def test_subscribe_and_price(self):
+        async def handler(server, ws, _):
+            message = await server.next_message(ws)
+            for product in message["product_ids"]:
+                await ws.send_json(coinbase_tick(product[:-4], 50000))
+            await ws.receive()
+
+        server = await self.serve(handler)
+        table = {}
+        feed = CoinbaseFeed(server.url, table)
+        feed.set_symbols({"BTC"})
+        self.start(feed.run())
+
+        await wait_until(lambda: "BTC" in table)
+        self.assertEqual(server.received[0], {
+            "type": "subscribe", "product_ids": ["BTC-USD"], "channels": ["ticker"],
+        })
+        self.assertEqual(table["BTC"][:2], (50000.0, "Coinbase"))
+        self.assertEqual(feed.subscribed, {"BTC"})
+
+    async def test_reconnect_after_subscribe_error(self):
+        async def handler(server, ws, connection):
+            message = await server.next_message(ws)
+            if connection == 1:
+                # Noto'g'ri product - Coinbase xato yuborib ulanishni yopadi
+                await ws.send_json({
+                    "type": "error", "message": "Failed to subscribe",
+                    "reason": "NOPE-USD is not a valid product",
+                })
+                await ws.close()
+                return
+            for product in message["product_ids"]:
+                await ws.send_json(coinbase_tick(product[:-4], 3000))
+            await ws.receive()
+
+        server = await self.serve(handler)
+        table = {}
+        feed = CoinbaseFeed(server.url, table)
+        feed.set_symbols({"ETH", "NOPE"})
+        self.start(feed.run())
+
+        await wait_until(lambda: "ETH" in table)
+        self.assertEqual(server.connections, 2)
+        self.assertGreaterEqual(feed.reconnects, 1)
+        self.assertEqual(feed.rejected, {"NOPE"})
+        # Qayta ulanishda faqat mavjud product'ga obuna
+        self.assertEqual(server.received[-1]["product_ids"], ["ETH-USD"])
+
+    async def test_stale_price_expires(self):
+        async def handler(server, ws, _):
+            await server.next_message(ws)
+            await ws.send_json(coinbase_tick("BTC", 60000))
+            await ws.receive()
+
+        server = await self.serve(handler)
+        ticker = TickerStream(binance_url=server.url, coinbase_url=server.url)
+        ticker.feeds = ticker.feeds[:1]
+        self.start(ticker.run(lambda: {"BTC"}))
+
+        await wait_until(lambda: "BTC" in ticker.latest)
+        self.assertEqual(ticker.get("BTC", max_age=0.3), (60000.0, "Coinbase"))
+        await asyncio.sleep(0.4)
+        # Yangi tick kelmadi - narx eskirgan, REST'ga qaytiladi
+        self.assertIsNone(ticker.get("BTC", max_age=0.3))
+
+    async def test_binance_serves_when_coinbase_is_down(self):
+        async def binance(server, ws, _):
+            message = await server.next_message(ws)
+            for name in message["params"]:
+                symbol = name.split("@", 1)[0].upper()
+                await ws.send_json({"e": "24hrMiniTicker", "s": symbol, "c": "2.5"})
+            await ws.receive()
+
+        async def coinbase_down(server, ws, _):
+            await ws.close()
+
+        binance_server = await self.serve(binance)
+        coinbase_server = await self.serve(coinbase_down)
+        ticker = TickerStream(binance_url=binance_server.url, coinbase_url=coinbase_server.url)
+        self.start(ticker.run(lambda: {"ADA"}))
+
+        await wait_until(lambda: ticker.get("ADA") is not None)
+        self.assertEqual(ticker.get("ADA"), (2.5, "Binance"))
+        self.assertEqual(binance_server.received[0]["params"], ["adausdt@miniTicker"])
+        await wait_until(lambda: ticker.stats()["feeds"]["Coinbase"]["reconnects"] >= 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
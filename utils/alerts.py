@@ -0,0 +1,253 @@
+"""
+Narx signallari (alerts): "BTC > 70000", "TON < 5", "BTC 5% 60" (60 daqiqada ±5%)
+Har bir coin uchun chegaralar bisect bilan saralangan ro'yxatlarda -
+yangi narx kelganda faqat eski va yangi narx orasidagi chegaralar topiladi: O(log n + k)
+"""
+import logging
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+ALERTS_MAX_FREE = int(os.getenv("ALERTS_MAX_FREE", "3"))
+ALERTS_MAX_PREMIUM = int(os.getenv("ALERTS_MAX_PREMIUM", "20"))
+ALERT_DEFAULT_WINDOW_MIN = 60
+
+ABOVE = "above"
+BELOW = "below"
+WINDOW = "window"
+
+_NUMBER = r"([0-9]+(?:[.,][0-9]+)?)"
+_THRESHOLD_RE = re.compile(rf"^([A-Z0-9]{{2,15}})\s*([<>])\s*\$?{_NUMBER}$")
+_WINDOW_RE = re.compile(rf"^([A-Z0-9]{{2,15}})\s*±?\s*{_NUMBER}\s*%(?:\s+([0-9]+))?$")
+
+
+class Alert:
+    __slots__ = ("id", "user_id", "coin", "kind", "threshold", "window_min")
+
+    def __init__(self, id, user_id, coin, kind, threshold, window_min=None):
+        self.id = id
+        self.user_id = user_id
+        self.coin = coin
+        self.kind = kind
+        self.threshold = threshold
+        self.window_min = window_min
+
+    def describe(self):
+        if self.kind == ABOVE:
+            return f"{self.coin} > {self.threshold:g}"
+        if self.kind == BELOW:
+            return f"{self.coin} < {self.threshold:g}"
+        return f"{self.coin} ±{self.threshold:g}% / {self.window_min} daq"
+
+
+def parse_alert(text):
+    """
+    Foydalanuvchi matnidan (coin, kind, threshold, window_min) yoki None
+    """
+    text = text.strip().upper()
+    match = _THRESHOLD_RE.match(text)
+    if match:
+        coin, sign, value = match.groups()
+        threshold = float(value.replace(",", "."))
+        if threshold <= 0:
+            return None
+        return coin, ABOVE if sign == ">" else BELOW, threshold, None
+
+    match = _WINDOW_RE.match(text)
+    if match:
+        coin, value, window = match.groups()
+        percent = float(value.replace(",", "."))
+        window_min = int(window) if window else ALERT_DEFAULT_WINDOW_MIN
+        if not 0 < percent < 1000 or not 1 <= window_min <= 24 * 60:
+            return None
+        return coin, WINDOW, percent, window_min
+    return None
+
+
+class _Thresholds:
+    """Chegara bo'yicha saralangan (keys, alerts) juftligi"""
+
+    __slots__ = ("keys", "alerts")
+
+    def __init__(self):
+        self.keys = []
+        self.alerts = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, alert):
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.alerts.insert(i, alert)
+
+    def remove(self, key, alert):
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.alerts[i] is alert:
+                del self.keys[i]
+                del self.alerts[i]
+                return
+            i += 1
+
+
+class AlertEngine:
+    """
+    _above[coin]: eski < chegara <= yangi bo'lsa ishlaydi (bir martalik)
+    _below[coin]: yangi <= chegara < eski bo'lsa ishlaydi (bir martalik)
+    _windows[coin][window_min]: foiz bo'yicha saralangan, oyna boshidagi narxdan
+    |o'zgarish| >= foiz bo'lsa ishlaydi, keyin oyna davomida jim turadi
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_user = {}
+        self._above = {}
+        self._below = {}
+        self._windows = {}
+        self._last = {}
+        # {coin: ([timestamp], [narx])} - oynali signallar uchun tarix
+        self._history = {}
+        self._muted_until = {}
+        # listener(alert) - bir martalik signal ishlab, indeksdan chiqarildi
+        self.listeners = []
+        self.stats = {"updates": 0, "fired": 0}
+
+    # ---------- indeks ----------
+    def load(self, db, owns=None):
+        """Faol signallar; owns(user_id) - sharding rejimida faqat o'z foydalanuvchilari"""
+        rows = db.execute(
+            "SELECT id, user_id, coin_symbol, kind, threshold, window_min FROM PriceAlerts WHERE active=1",
+            fetchall=True,
+        ) or []
+        for row in rows:
+            if owns is None or owns(row[1]):
+                self.add(Alert(*row))
+        logger.info(f"🚨 Signallar yuklandi: {len(self._by_id)} ta, {len(self.coins())} coin")
+
+    def add(self, alert):
+        self._by_id[alert.id] = alert
+        self._by_user.setdefault(alert.user_id, set()).add(alert.id)
+        if alert.kind == ABOVE:
+            self._above.setdefault(alert.coin, _Thresholds()).add(alert.threshold, alert)
+        elif alert.kind == BELOW:
+            self._below.setdefault(alert.coin, _Thresholds()).add(alert.threshold, alert)
+        else:
+            windows = self._windows.setdefault(alert.coin, {})
+            windows.setdefault(alert.window_min, _Thresholds()).add(alert.threshold, alert)
+
+    def remove(self, alert_id):
+        alert = self._by_id.pop(alert_id, None)
+        if alert is None:
+            return None
+        self._muted_until.pop(alert_id, None)
+        user_ids = self._by_user[alert.user_id]
+        user_ids.discard(alert_id)
+        if not user_ids:
+            del self._by_user[alert.user_id]
+        if alert.kind == WINDOW:
+            windows = self._windows[alert.coin]
+            windows[alert.window_min].remove(alert.threshold, alert)
+            if not windows[alert.window_min]:
+                del windows[alert.window_min]
+            if not windows:
+                del self._windows[alert.coin]
+        else:
+            table = self._above if alert.kind == ABOVE else self._below
+            table[alert.coin].remove(alert.threshold, alert)
+            if not table[alert.coin]:
+                del table[alert.coin]
+        if not self.has_coin(alert.coin):
+            self._last.pop(alert.coin, None)
+            self._history.pop(alert.coin, None)
+        return alert
+
+    def get(self, alert_id):
+        return self._by_id.get(alert_id)
+
+    def active(self):
+        return self._by_id.values()
+
+    def user_alerts(self, user_id):
+        return [self._by_id[alert_id] for alert_id in sorted(self._by_user.get(user_id, ()))]
+
+    def coins(self):
+        return set(self._above) | set(self._below) | set(self._windows)
+
+    def has_coin(self, coin):
+        return coin in self._above or coin in self._below or coin in self._windows
+
+    # ---------- tekshirish ----------
+    def seed(self, coin, price):
+        """Yangi signal qo'yilganda joriy narx - keyingi narx bilan kesishish aniqlanadi"""
+        self._last.setdefault(coin, price)
+
+    def update(self, coin, price, now=None):
+        """
+        Yangi narx: ishlagan signallar ro'yxati [(alert, bazaviy narx)].
+        Bir martalik (above/below) signallar indeksdan chiqariladi
+        """
+        now = now or time.time()
+        self.stats["updates"] += 1
+        old = self._last.get(coin)
+        self._last[coin] = price
+        fired = []
+
+        if old is not None and price != old:
+            if price > old and coin in self._above:
+                thresholds = self._above[coin]
+                lo, hi = bisect_right(thresholds.keys, old), bisect_right(thresholds.keys, price)
+                fired.extend((alert, old) for alert in thresholds.alerts[lo:hi])
+            elif price < old and coin in self._below:
+                thresholds = self._below[coin]
+                lo, hi = bisect_left(thresholds.keys, price), bisect_left(thresholds.keys, old)
+                fired.extend((alert, old) for alert in thresholds.alerts[lo:hi])
+            for alert, _ in fired:
+                self.remove(alert.id)
+                for listener in self.listeners:
+                    listener(alert)
+
+        if coin in self._windows:
+            fired.extend(self._check_windows(coin, price, now))
+
+        self.stats["fired"] += len(fired)
+        return fired
+
+    def _check_windows(self, coin, price, now):
+        windows = self._windows[coin]
+        timestamps, prices = self._history.setdefault(coin, ([], []))
+        timestamps.append(now)
+        prices.append(price)
+
+        # Eng uzun oynadan eski tarix tashlanadi
+        cut = bisect_left(timestamps, now - max(windows) * 60)
+        if cut:
+            del timestamps[:cut]
+            del prices[:cut]
+
+        fired = []
+        for window_min, thresholds in windows.items():
+            start = bisect_left(timestamps, now - window_min * 60)
+            base = prices[start]
+            if not base:
+                continue
+            change = abs(price - base) / base * 100
+            for alert in thresholds.alerts[:bisect_right(thresholds.keys, change)]:
+                if self._muted_until.get(alert.id, 0) > now:
+                    continue
+                self._muted_until[alert.id] = now + window_min * 60
+                fired.append((alert, base))
+        return fired
+
+    def snapshot(self):
+        return {
+            "alerts": len(self._by_id),
+            "coins": len(self.coins()),
+            **self.stats,
+        }
+
+
+alerts = AlertEngine()
@@ -1,195 +1,555 @@
-import requests
+import asyncio
+import aiohttp
 import logging
-from datetime import datetime, timedelta
+import re
+import time
 import os
 
+from utils.api.router import ProviderRouter, HedgeBudget
+from utils.api.symbols import SymbolRegistry
+from utils.api.stream import ticker_stream, PRICE_STREAM_ENABLED
+from utils.api.fiat import fiat_rates
+from utils.api.ratelimit import quota_manager, current_lane, Lane, INTERACTIVE, BACKGROUND
+
 
 
 COINBASE_BASE_URL = os.getenv("COINBASE_BASE_URL")
 
+# Narx cache sozlamalari (soniya): TTL ichida yangi, undan keyin STALE oynasida
+# eski narx darhol qaytariladi va fonda bitta yangilash ishga tushadi
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "15"))
+PRICE_CACHE_STALE = float(os.getenv("PRICE_CACHE_STALE", "60"))
+
+# Hedging: asosiy manba o'z latency percentilidan kechiksa, keyingi manbaga
+# parallel so'rov yuboriladi - birinchi to'g'ri javob yutadi
+PRICE_HEDGE_ENABLED = os.getenv("PRICE_HEDGE_ENABLED", "0") == "1"
+PRICE_HEDGE_PERCENTILE = float(os.getenv("PRICE_HEDGE_PERCENTILE", "95"))
+PRICE_HEDGE_DEFAULT_DELAY = float(os.getenv("PRICE_HEDGE_DEFAULT_DELAY", "1.0"))
+
+# Hech bir manba topmagan symbollar shu muddat davomida qayta so'ralmaydi
+PRICE_NEGATIVE_TTL = float(os.getenv("PRICE_NEGATIVE_TTL", "300"))
+PRICE_NEGATIVE_MAX = int(os.getenv("PRICE_NEGATIVE_MAX", "10000"))
+
 logger = logging.getLogger(__name__)
 
-# Cache for exchange rates (30 seconds - real-time)
-_rate_cache = {
-    "uzs": {"rate": 12850, "updated": None},
-    "rub": {"rate": 95, "updated": None}
+# Process bo'yicha umumiy narx cache: {coin: {"data", "source", "updated"}}
+_price_cache = {}
+_cache_stats = {
+    "hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "flights": 0, "coalesced": 0,
+    "rejected": 0, "negative_hits": 0,
 }
+_refreshing = set()
+
+# Negative cache: {coin: expires_at} - barcha manbalar aniq "yo'q" degan symbollar
+# (kiritilish tartibida - to'lsa eng eskisi chiqariladi)
+_negative_cache = {}
+
+# Ma'lum symbollar to'plami. To'liq ro'yxat o'rnatilmaguncha (set_known_symbols)
+# faqat symbol shakli tekshiriladi
+_SYMBOL_RE = re.compile(r"[A-Z0-9]{2,15}")
+_known_symbols = set()
+_known_symbols_complete = False
+
+# Single-flight: {coin: task} - bir coin uchun bir vaqtda faqat bitta so'rov
+_inflight = {}
+_flight_lanes = {}
+_background_tasks = set()
 
-def get_real_prices(coins):
+# Umumiy HTTP sessiya (keep-alive ulanishlar va DNS cache qayta ishlatiladi)
+_session = None
+
+
+def _get_session():
+    """
+    Pool'langan aiohttp sessiyasini qaytarish (kerak bo'lsa yaratish)
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv("HTTP_POOL_SIZE", "100")),
+            limit_per_host=int(os.getenv("HTTP_POOL_PER_HOST", "20")),
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+
+    return _session
+
+
+async def close_session():
+    """Shutdown paytida HTTP sessiyani yopish"""
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_real_prices(coins, priority=INTERACTIVE, allow_stale=True):
     """
     Kripto narxlarini olish - Coinbase va boshqa ishonchli manbalardan
     Juda past narxlarni ham to'g'ri ko'rsatadi
+
+    Batch rejim: har bir manba hali topilmagan barcha coinlar uchun bir marta
+    so'raladi, faqat qolganlari keyingi manbaga o'tadi
+    priority: "interactive" (search, premium) yoki "background" (scheduler) - kvota navbati
+    allow_stale: False - eskirgan cache qaytarilmaydi, yangi narx kutiladi (scheduler tick);
+    eski narx faqat manbalar javob bermasa ishlatiladi
     """
-    results = []
+    current_lane.set(Lane(priority))
+    
+    symbols = [coin.upper().strip() for coin in coins]
     
-    # Real valyuta kurslarini yangilash
-    usd_to_uzs = get_uzs_rate()
-    usd_to_rub = get_rub_rate()
+    # Noto'g'ri va ma'lum bo'lmagan symbollar tarmoqsiz rad etiladi
+    lookup = [coin for coin in dict.fromkeys(symbols) if _should_lookup(coin)]
+    if not lookup:
+        return [None] * len(symbols)
+    
+    # Valyuta kurslari - fon xizmati yangilaydi, bu yerda faqat xotiradan
+    usd_to_uzs, usd_to_rub = get_uzs_rate(), get_rub_rate()
     
     logger.info(f"📊 Kurslar: 1 USD = {usd_to_uzs} UZS, {usd_to_rub} RUB")
     
+    found = await _get_cached_prices(lookup, allow_stale)
+    
+    results = []
+    for coin in symbols:
+        if coin in found:
+            price_data, source = found[coin]
+            results.append(_build_result(price_data, source, usd_to_uzs, usd_to_rub))
+        else:
+            results.append(None)
+    
+    return results
+
+
+def is_valid_symbol(coin):
+    """Symbol shakli to'g'rimi (A-Z, 0-9, 2-15 belgi)"""
+    return bool(_SYMBOL_RE.fullmatch(coin))
+
+
+def is_known_symbol(coin):
+    """To'liq ro'yxat o'rnatilgan bo'lsa - symbol unda bormi"""
+    return not _known_symbols_complete or coin in _known_symbols
+
+
+def set_known_symbols(symbols):
+    """Manbalarning to'liq coin ro'yxatini o'rnatish (tezkor rad etish uchun)"""
+    global _known_symbols, _known_symbols_complete
+    
+    _known_symbols = {symbol.upper() for symbol in symbols}
+    _known_symbols_complete = bool(_known_symbols)
+
+
+def _should_lookup(coin):
+    """
+    Tezkor tekshiruv: shakl va ma'lum symbollar (negative cache narx cache'dan keyin)
+    """
+    if not is_valid_symbol(coin) or not is_known_symbol(coin):
+        _cache_stats["rejected"] += 1
+        return False
+    return True
+
+
+def _is_negative(coin):
+    expires = _negative_cache.get(coin)
+    if expires is None:
+        return False
+    if time.monotonic() < expires:
+        _cache_stats["negative_hits"] += 1
+        return True
+    del _negative_cache[coin]
+    return False
+
+
+def _remember_missing(coin):
+    """Negative cache'ga yozish - hajm PRICE_NEGATIVE_MAX dan oshmaydi"""
+    now = time.monotonic()
+    _negative_cache.pop(coin, None)
+    if len(_negative_cache) >= PRICE_NEGATIVE_MAX:
+        for expired in [c for c, expires in _negative_cache.items() if expires <= now]:
+            del _negative_cache[expired]
+        while len(_negative_cache) >= PRICE_NEGATIVE_MAX:
+            del _negative_cache[next(iter(_negative_cache))]
+    _negative_cache[coin] = now + PRICE_NEGATIVE_TTL
+
+
+async def _get_cached_prices(coins, allow_stale=True):
+    """
+    Cache orqali narxlar: oqim (yoqilgan bo'lsa) → yangi - darhol,
+    eskirgan - darhol + fonda yangilash, yo'q - manbalardan olinadi.
+    allow_stale=False bo'lsa eskirgan coinlar ham manbalardan olinadi
+    (eski narx faqat so'rov natija bermasa qaytariladi)
+    """
+    now = time.monotonic()
+    found = {}
+    missing = []
+    stale = []
+    fallback = {}
+    
     for coin in coins:
-        coin = coin.upper().strip()
-        price_data = None
-        source = None
+        # WebSocket oqimidagi yangi narx - REST kerak emas
+        streamed = ticker_stream.get(coin) if PRICE_STREAM_ENABLED else None
+        if streamed:
+            price_usd, source = streamed
+            found[coin] = ({"usd": price_usd, "rub": None}, source)
+            continue
         
-        # 1. COINBASE (USD va RUB) - eng ishonchli
-        price_data, source = get_from_coinbase(coin)
+        entry = _price_cache.get(coin)
+        age = now - entry["updated"] if entry else None
         
-        # 2. COINMARKETCAP (ikkinchi tanlov) - API kalit bilan
-        if not price_data:
-            price_data, source = get_from_coinmarketcap(coin)
-            if price_data:
-                price_data = {"usd": price_data, "rub": None}
+        if age is not None and age < PRICE_CACHE_TTL:
+            _cache_stats["hits"] += 1
+            found[coin] = (entry["data"], entry["source"])
+        elif age is not None and age < PRICE_CACHE_TTL + PRICE_CACHE_STALE:
+            _cache_stats["stale"] += 1
+            if allow_stale:
+                found[coin] = (entry["data"], entry["source"])
+                stale.append(coin)
+            else:
+                fallback[coin] = (entry["data"], entry["source"])
+                missing.append(coin)
+        elif not _is_negative(coin):
+            _cache_stats["misses"] += 1
+            missing.append(coin)
+    
+    if stale:
+        _schedule_refresh(stale)
+    
+    if missing:
+        found.update(await _fetch_and_store(missing))
+        for coin, cached in fallback.items():
+            found.setdefault(coin, cached)
+    
+    return found
+
+
+async def _fetch_and_store(coins):
+    """
+    Single-flight: shu coin allaqachon so'ralayotgan bo'lsa, o'sha so'rov
+    natijasini kutamiz; qolganlari uchun bitta yangi so'rov ochiladi
+    """
+    flights = {}
+    own = []
+    
+    for coin in coins:
+        task = _inflight.get(coin)
+        if task is None:
+            own.append(coin)
+        else:
+            _cache_stats["coalesced"] += 1
+            flights.setdefault(task, []).append(coin)
+            # Interactive chaqiruvchi background so'rovni kutmasligi uchun
+            if current_lane.get().value == INTERACTIVE:
+                _flight_lanes[task].promote()
+    
+    if own:
+        _cache_stats["flights"] += 1
+        lane = Lane(current_lane.get().value)
+        task = asyncio.create_task(_fetch_flight(own, lane))
+        _flight_lanes[task] = lane
+        for coin in own:
+            _inflight[coin] = task
+        task.add_done_callback(lambda t, own=own: _land_flight(t, own))
+        flights[task] = own
+    
+    # shield: bitta chaqiruvchi bekor qilinsa ham umumiy so'rov davom etadi
+    results = await asyncio.gather(*(asyncio.shield(task) for task in flights))
+    
+    found = {}
+    for task_coins, result in zip(flights.values(), results):
+        for coin in task_coins:
+            if coin in result:
+                found[coin] = result[coin]
+    return found
+
+
+async def _fetch_flight(coins, lane):
+    """Manbalardan olish va cache'ga yozish (so'rovning o'z navbati bilan)"""
+    current_lane.set(lane)
+    found = await _fetch_prices(coins)
+    now = time.monotonic()
+    for coin, (price_data, source) in found.items():
+        _price_cache[coin] = {"data": price_data, "source": source, "updated": now}
+    return found
+
+
+def _land_flight(task, coins):
+    """Tugagan so'rovni in-flight ro'yxatidan olib tashlash"""
+    _flight_lanes.pop(task, None)
+    for coin in coins:
+        if _inflight.get(coin) is task:
+            del _inflight[coin]
+
+
+def _schedule_refresh(coins):
+    """
+    Eskirgan coinlar uchun fonda yangilash (har bir coin uchun faqat bittasi)
+    """
+    coins = [coin for coin in coins if coin not in _refreshing]
+    if not coins:
+        return
+    
+    _refreshing.update(coins)
+    _cache_stats["refreshes"] += 1
+    
+    async def refresh():
+        # Fon yangilash kvotadan faqat background navbatida foydalanadi
+        current_lane.set(Lane(BACKGROUND))
+        try:
+            await _fetch_and_store(coins)
+        except Exception as e:
+            logger.warning(f"Narx cache yangilashda xato: {e}")
+        finally:
+            _refreshing.difference_update(coins)
+    
+    task = asyncio.create_task(refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def get_cache_stats():
+    """Narx cache statistikasi (hits / misses / stale / refreshes / flights / coalesced / rejected)"""
+    return {
+        **_cache_stats,
+        "size": len(_price_cache),
+        "inflight": len(_inflight),
+        "negative": len(_negative_cache),
+    }
+
+
+async def _fetch_prices(coins):
+    """
+    Manbalarni ketma-ket so'rash: {coin: (price_data, source)}
+    Asl tartib: 1. Coinbase → 2. CoinMarketCap → 3. Binance → 4. CoinGecko,
+    router kuzatgan holatga qarab o'zgaradi
+    """
+    found = {}
+    unresolved = list(coins)
+    # Kamida bitta manba javob bermagan (xato, timeout, 429) coinlar - "yo'q" deb bo'lmaydi
+    inconclusive = set()
+    
+    # Tartib router bo'yicha: circuit ochiq manbalar o'tkazib yuboriladi
+    order = provider_router.order(list(PROVIDERS))
+    # Hedge byudjeti har bir qidiruvga bir marta to'ldiriladi (har bir bosqichga emas)
+    if PRICE_HEDGE_ENABLED:
+        hedge_budget.on_request()
+    skipped = False
+    i = 0
+    while unresolved and i < len(order):
+        source = order[i]
+        # Half-open probe o'rni faqat so'rov haqiqatan yuboriladigan paytda olinadi
+        if not provider_router.allow(source):
+            skipped = True
+            i += 1
+            continue
+        hedge = order[i + 1] if PRICE_HEDGE_ENABLED and i + 1 < len(order) else None
         
-        # 3. BINANCE (uchinchi tanlov)
-        if not price_data:
-            price_data, source = get_from_binance(coin)
-            if price_data:
-                price_data = {"usd": price_data, "rub": None}
+        if hedge:
+            answers, consumed = await _fetch_tier_hedged(order[i], hedge, unresolved)
+        else:
+            answers, consumed = [(source, await PROVIDERS[source](unresolved))], 1
+        i += consumed
         
-        # 4. COINGECKO (fallback)
-        if not price_data:
-            price_data, source = get_from_coingecko(coin)
-            if price_data:
-                price_data = {"usd": price_data, "rub": None}
+        for source, prices in answers:
+            for coin, price_data in prices.items():
+                if coin in found:
+                    continue
+                if price_data and price_data["usd"] and price_data["usd"] > 0:
+                    found[coin] = (price_data, source)
+                    logger.info(f"✅ {coin}: ${price_data['usd']:.8f} ({source})")
+                elif price_data is None:
+                    inconclusive.add(coin)
         
-        if price_data and price_data["usd"] and price_data["usd"] > 0:
-            price_usd = price_data["usd"]
-            
-            # RUB: Coinbase'dan yoki hisoblash
-            price_rub = price_data.get("rub")
-            if not price_rub:
-                price_rub = price_usd * usd_to_rub
-            
-            # Juda past narxlar uchun maxsus formatting
-            # Agar narx 0.01 dan kichik bo'lsa, ko'proq raqam ko'rsatamiz
-            usd_precision = 8 if price_usd < 0.01 else 4
-            
-            results.append({
-                "usd": price_usd,  # Raw qiymat
-                "usd_formatted": f"{price_usd:.{usd_precision}f}",  # Formatted string
-                "uzs": round(price_usd * usd_to_uzs, 2),
-                "rub": round(price_rub, 4),  # RUB uchun ham 4 raqam
-                "source": source
-            })
-            logger.info(f"✅ {coin}: ${price_usd:.8f} ({source})")
-        else:
-            logger.error(f"❌ {coin}: topilmadi")
-            results.append(None)
+        unresolved = [coin for coin in unresolved if coin not in found]
     
-    return results
+    # Barcha manbalar so'ralgan va hammasi aniq "yo'q" degan bo'lsa - negative cache'ga
+    for coin in unresolved:
+        logger.error(f"❌ {coin}: topilmadi")
+        if len(order) == len(PROVIDERS) and not skipped and coin not in inconclusive:
+            _remember_missing(coin)
+    
+    return found
+
+
+def _resolved_all(prices, coins):
+    return all(prices.get(coin) for coin in coins)
+
+
+async def _fetch_tier_hedged(primary, secondary, coins):
+    """
+    Asosiy manba kechiksa (o'z p95 latency'sidan ko'p), keyingi manbaga ham
+    so'rov yuboriladi. Javoblar birlashtiriladi: barcha coinlar topilishi bilan
+    qolgan so'rov bekor qilinadi. Qisman javobdan keyin ikkinchisi hedge manbaning
+    odatiy (p95) vaqti ichida kelmasa ham bekor qilinadi - uning coinlari "javobsiz" (None).
+    Qaytaradi: ([(source, prices)], consumed) - consumed: tartibdan nechta manba ishlatildi
+    """
+    primary_task = asyncio.ensure_future(PROVIDERS[primary](coins))
+    
+    delay = provider_router.latency_percentile(primary, PRICE_HEDGE_PERCENTILE)
+    delay = max(0.05, delay if delay is not None else PRICE_HEDGE_DEFAULT_DELAY)
+    
+    done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    if done or not provider_router.available(secondary) or not hedge_budget.try_spend():
+        return [(primary, await primary_task)], 1
+    
+    provider_router.allow(secondary)
+    hedge_budget.record_hedge(secondary)
+    logger.debug(f"Hedge: {primary} {delay:.2f}s dan kechikdi, {secondary} ham so'raldi")
+    loop = asyncio.get_running_loop()
+    expected = provider_router.latency_percentile(secondary, PRICE_HEDGE_PERCENTILE)
+    deadline = loop.time() + max(delay, expected if expected is not None else PRICE_HEDGE_DEFAULT_DELAY)
+    tasks = {primary_task: primary, asyncio.ensure_future(PROVIDERS[secondary](coins)): secondary}
+    
+    answers = []
+    covered = {}
+    pending = set(tasks)
+    timeout = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                prices = task.result()
+                answers.append((tasks[task], prices))
+                for coin, price_data in prices.items():
+                    if price_data:
+                        covered.setdefault(coin, tasks[task])
+            if _resolved_all(covered, coins):
+                break
+            # Qisman javob - ikkinchisi faqat deadline'gacha kutiladi
+            timeout = max(0.0, deadline - loop.time())
+    finally:
+        for task in pending:
+            task.cancel()
+    
+    # Vaqtida javob bermagan manba coinlari noaniq (negative cache'ga tushmaydi)
+    for task in pending:
+        answers.append((tasks[task], dict.fromkeys(coins)))
+    
+    # Yutgan manba - eng ko'p coin topgani (birinchi javob teng bo'lsa)
+    if covered:
+        winners = list(covered.values())
+        hedge_budget.record_win(max(dict.fromkeys(winners), key=winners.count))
+    return answers, 2
 
 
-def get_from_coinbase(coin):
+def _build_result(price_data, source, usd_to_uzs, usd_to_rub):
+    """
+    Natija dict'ini yig'ish (usd, usd_formatted, uzs, rub, source)
+    """
+    price_usd = price_data["usd"]
+    
+    # RUB: Coinbase'dan yoki hisoblash
+    price_rub = price_data.get("rub")
+    if not price_rub:
+        price_rub = price_usd * usd_to_rub
+    
+    # Juda past narxlar uchun maxsus formatting
+    # Agar narx 0.01 dan kichik bo'lsa, ko'proq raqam ko'rsatamiz
+    usd_precision = 8 if price_usd < 0.01 else 4
+    
+    return {
+        "usd": price_usd,  # Raw qiymat
+        "usd_formatted": f"{price_usd:.{usd_precision}f}",  # Formatted string
+        "uzs": round(price_usd * usd_to_uzs, 2),
+        "rub": round(price_rub, 4),  # RUB uchun ham 4 raqam
+        "source": source
+    }
+
+
+async def _get_json(url, timeout, provider=None, cost=1, **kwargs):
+    """
+    GET so'rov - (status, json) qaytaradi, JSON bo'lmasa data=None
+    provider berilsa: avval kvotadan token olinadi (cost - so'rov og'irligi),
+    latency va natija router'ga yoziladi
+    """
+    if provider:
+        await quota_manager.acquire(provider, cost)
+    
+    session = _get_session()
+    started = time.monotonic()
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            data = await response.json(content_type=None) if response.status == 200 else None
+    except Exception as e:
+        if provider:
+            provider_router.record(provider, time.monotonic() - started, error=e)
+        raise
+    
+    if provider:
+        provider_router.record(provider, time.monotonic() - started, status=response.status)
+        if response.status == 429:
+            quota_manager.drain(provider)
+    return response.status, data
+
+
+async def get_from_coinbase(coins):
     """
     Coinbase Spot Price API - USD, RUB va boshqa valyutalarda
     https://api.coinbase.com/v2/prices/{coin}-USD/spot
+
+    Coinbase'da ko'p symbolli spot endpoint yo'q - coinlar parallel so'raladi
+    """
+    results = await asyncio.gather(*(_get_coinbase_spot(coin) for coin in coins))
+    # {} - Coinbase aniq "yo'q" dedi (natijaga kirmaydi), None - javob olinmadi
+    return {coin: price_data or None for coin, price_data in zip(coins, results) if price_data != {}}
+
+
+async def _get_coinbase_spot(coin):
+    """
+    Bitta coin uchun Coinbase USD (va RUB) spot narxi.
+    {} - juftlik yo'q (200 narxsiz, 400, 404), None - xato / timeout / 429
     """
     try:
-        # USD narxini olamiz
-        url_usd = f"{COINBASE_BASE_URL}/{coin}-USD/spot"
-        response_usd = requests.get(url_usd, timeout=10)
+        status, data_usd = await _get_json(f"{COINBASE_BASE_URL}/{coin}-USD/spot", 10, "Coinbase")
         
-        if response_usd.status_code == 200:
-            data_usd = response_usd.json()
+        if data_usd and "data" in data_usd and "amount" in data_usd["data"]:
+            price_usd = float(data_usd["data"]["amount"])
             
-            if "data" in data_usd and "amount" in data_usd["data"]:
-                price_usd = float(data_usd["data"]["amount"])
-                
-                if price_usd > 0:
-                    # RUB narxini ham olamiz (Coinbase'ning o'z kursi)
-                    price_rub = None
-                    try:
-                        url_rub = f"{COINBASE_BASE_URL}/{coin}-RUB/spot"
-                        response_rub = requests.get(url_rub, timeout=5)
-                        if response_rub.status_code == 200:
-                            data_rub = response_rub.json()
-                            if "data" in data_rub and "amount" in data_rub["data"]:
-                                price_rub = float(data_rub["data"]["amount"])
-                    except:
-                        pass
-                    
-                    return {"usd": price_usd, "rub": price_rub}, "Coinbase"
+            if price_usd > 0:
+                # RUB faqat USD juftligi bor coinlar uchun so'raladi (topilmaganlar ikkinchi
+                # so'rov va kvota sarflamaydi); bekor qilinsa so'rov ham birga to'xtaydi
+                return {"usd": price_usd, "rub": await _get_coinbase_rub(coin)}
+        if status in (200, 400, 404):
+            return {}
         
     except Exception as e:
         logger.debug(f"Coinbase error for {coin}: {e}")
     
-    return None, None
+    return None
 
 
-def get_from_coinmarketcap(coin):
+async def _get_coinbase_rub(coin):
+    """Coinbase'ning o'z RUB kursi; olinmasa None (RUB USD kursidan hisoblanadi)"""
+    try:
+        _, data_rub = await _get_json(f"{COINBASE_BASE_URL}/{coin}-RUB/spot", 5, "Coinbase")
+        if data_rub and "data" in data_rub and "amount" in data_rub["data"]:
+            return float(data_rub["data"]["amount"])
+    except Exception:
+        pass
+    return None
+
+
+async def get_from_coinmarketcap(coins):
     """
     CoinMarketCap API - ikkinchi tanlov (CoinGecko o'rniga)
+    Barcha symbollar bitta so'rovda vergul bilan yuboriladi
     """
     try:
-        # Check for API key
+        # Check for API key (sozlanmagan manba "yo'q" deb hisoblanadi - vaqtinchalik xato emas)
         COINMARKETCAP_API_KEY = os.getenv("COINMARKETCAP_API_KEY")
         if not COINMARKETCAP_API_KEY:
             logger.debug("CoinMarketCap API key not found in environment variables")
-            return None, None
-        
-        # Kriptovalyuta symbol mapping
-        # Ba'zi tokenlar uchun symbol mapping kerak
-        SYMBOL_MAPPING = {
-            "NOT": "NOT",      # Notcoin
-            "POLY": "MATIC",   # Polygon (MATIC)
-            "RENDER": "RNDR",  # Render Token
-            "TON": "TON",      # The Open Network
-            "BTC": "BTC",
-            "ETH": "ETH", 
-            "SOL": "SOL",
-            "DOGE": "DOGE",
-            "XRP": "XRP",
-            "ADA": "ADA",
-            "BNB": "BNB",
-            "USDT": "USDT",
-            "USDC": "USDC",
-            "SHIB": "SHIB",
-            "TRX": "TRX",
-            "DOT": "DOT",
-            "MATIC": "MATIC",
-            "LINK": "LINK",
-            "UNI": "UNI",
-            "LTC": "LTC",
-            "BCH": "BCH",
-            "AVAX": "AVAX",
-            "XLM": "XLM",
-            "ATOM": "ATOM",
-            "ETC": "ETC",
-            "FIL": "FIL",
-            "HBAR": "HBAR",
-            "VET": "VET",
-            "ALGO": "ALGO",
-            "ICP": "ICP",
-            "NEAR": "NEAR",
-            "APT": "APT",
-            "SUI": "SUI",
-            "ARB": "ARB",
-            "OP": "OP",
-            "PEPE": "PEPE",
-            "WLD": "WLD",
-            "JUP": "JUP",
-            "BONK": "BONK",
-            "WIF": "WIF",
-            "PYTH": "PYTH",
-            "FLOKI": "FLOKI",
-            "RUNE": "RUNE",
-            "GRT": "GRT",
-            "IMX": "IMX",
-            "INJ": "INJ",
-            "TIA": "TIA",
-            "SEI": "SEI",
-            "FET": "FET",
-            "SAND": "SAND",
-            "MANA": "MANA",
-            "AXS": "AXS",
-            "XMR": "XMR",
-            "STX": "STX",
-        }
+            return {}
         
-        # Symbol mapping or original symbol
-        symbol = SYMBOL_MAPPING.get(coin, coin)
+        # Registry bo'yicha CMC symbol (CMC'da yo'q coinlar so'ralmaydi)
+        symbols = {coin: symbol_registry.cmc_symbol(coin) for coin in coins}
+        symbols = {coin: symbol for coin, symbol in symbols.items() if symbol}
+        if not symbols:
+            return {}
         
         # CoinMarketCap API endpoint
         COINMARKETCAP_URL = os.getenv("COINMARKETCAP_URL")
@@ -197,276 +557,226 @@ def get_from_coinmarketcap(coin):
             'Accepts': 'application/json',
             'X-CMC_PRO_API_KEY': COINMARKETCAP_API_KEY,
         }
-        params = {
-            'symbol': symbol,
-            'convert': 'USD'
-        }
         
-        logger.debug(f"CoinMarketCap: Requesting price for {coin} (symbol: {symbol})")
+        found = await _get_cmc_batch(COINMARKETCAP_URL, headers, symbols)
         
-        response = requests.get(COINMARKETCAP_URL, headers=headers, params=params, timeout=15)
+        # Agar symbol mapping bilan topilmasa, original symbol bilan urinib ko'ramiz
+        # (javob olinmagan - None - coinlar qayta so'ralmaydi)
+        retry = {coin: coin for coin, symbol in symbols.items() if coin not in found and symbol != coin}
+        if retry:
+            logger.debug(f"CoinMarketCap: {', '.join(retry)} original symbol bilan urinib ko'ramiz")
+            found.update(await _get_cmc_batch(COINMARKETCAP_URL, headers, retry))
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Debug uchun ma'lumot
-            logger.debug(f"CoinMarketCap response status: {response.status_code}")
-            
-            # Check if data exists
-            if 'data' in data and symbol in data['data']:
-                coin_data = data['data'][symbol]
-                
-                # Har doim birinchi elementni olish
-                if isinstance(coin_data, list) and len(coin_data) > 0:
-                    coin_info = coin_data[0]
-                    
-                    if 'quote' in coin_info and 'USD' in coin_info['quote']:
-                        price = coin_info['quote']['USD'].get('price')
-                        
-                        if price is not None and price > 0:
-                            logger.info(f"✅ CoinMarketCap: {coin} narxi: ${price}")
-                            return float(price), "CoinMarketCap"
-                        else:
-                            logger.debug(f"CoinMarketCap: {coin} uchun narx topilmadi yoki 0")
-            
-            # Agar symbol mapping bilan topilmasa, original symbol bilan urinib ko'ramiz
-            if symbol != coin:
-                logger.debug(f"CoinMarketCap: {symbol} bilan topilmadi, {coin} bilan urinib ko'ramiz")
-                params['symbol'] = coin
-                response = requests.get(COINMARKETCAP_URL, headers=headers, params=params, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if 'data' in data and coin in data['data']:
-                        coin_data = data['data'][coin]
-                        
-                        if isinstance(coin_data, list) and len(coin_data) > 0:
-                            coin_info = coin_data[0]
-                            
-                            if 'quote' in coin_info and 'USD' in coin_info['quote']:
-                                price = coin_info['quote']['USD'].get('price')
-                                
-                                if price is not None and price > 0:
-                                    logger.info(f"✅ CoinMarketCap: {coin} narxi: ${price}")
-                                    return float(price), "CoinMarketCap"
+        return found
+        
+    except Exception as e:
+        logger.debug(f"CoinMarketCap error for {', '.join(coins)}: {e}")
+    
+    return dict.fromkeys(coins)
+
+
+async def _get_cmc_batch(url, headers, symbols):
+    """
+    Bitta CoinMarketCap so'rovi - symbols: {coin: cmc_symbol}
+    200 va 400/404 - javobda yo'q coinlar aniq "topilmadi"; boshqa holatda {coin: None}
+    """
+    found = {}
+    joined = ",".join(sorted(set(symbols.values())))
+    params = {
+        'symbol': joined,
+        'convert': 'USD',
+        'skip_invalid': 'true'
+    }
+    
+    logger.debug(f"CoinMarketCap: Requesting prices for {joined}")
+    
+    try:
+        status, data = await _get_json(url, 15, "CoinMarketCap", headers=headers, params=params)
         
-        elif response.status_code == 400:
-            logger.debug(f"CoinMarketCap: Symbol {symbol} not found (400 error)")
-        elif response.status_code == 401:
+        if status == 200:
+            for coin, symbol in symbols.items():
+                price = _parse_cmc_price(data, symbol)
+                if price:
+                    found[coin] = {"usd": price, "rub": None}
+        elif status == 400:
+            logger.debug(f"CoinMarketCap: Symbols {joined} not found (400 error)")
+        elif status == 401:
             logger.warning("CoinMarketCap: Invalid API key (401 error)")
-        elif response.status_code == 429:
+            return dict.fromkeys(symbols)
+        elif status == 429:
             logger.debug("CoinMarketCap: Rate limit exceeded (429 error)")
-        elif response.status_code == 404:
-            logger.debug(f"CoinMarketCap: {symbol} not found (404 error)")
+            return dict.fromkeys(symbols)
+        elif status == 404:
+            logger.debug(f"CoinMarketCap: {joined} not found (404 error)")
         else:
-            logger.debug(f"CoinMarketCap: Unexpected status code {response.status_code}")
+            logger.debug(f"CoinMarketCap: Unexpected status code {status}")
+            return dict.fromkeys(symbols)
+    
+    except asyncio.TimeoutError:
+        logger.debug(f"CoinMarketCap timeout for {joined}")
+        return dict.fromkeys(symbols)
+    except aiohttp.ClientError as e:
+        logger.debug(f"CoinMarketCap request error for {joined}: {e}")
+        return dict.fromkeys(symbols)
+    
+    return found
+
+
+def _parse_cmc_price(data, symbol):
+    """
+    CoinMarketCap javobidan symbol narxini ajratib olish
+    """
+    # Check if data exists
+    if data and 'data' in data and symbol in data['data']:
+        coin_data = data['data'][symbol]
         
-    except requests.exceptions.Timeout:
-        logger.debug(f"CoinMarketCap timeout for {coin}")
-    except requests.exceptions.RequestException as e:
-        logger.debug(f"CoinMarketCap request error for {coin}: {e}")
-    except Exception as e:
-        logger.debug(f"CoinMarketCap error for {coin}: {e}")
+        # Har doim birinchi elementni olish
+        if isinstance(coin_data, list) and len(coin_data) > 0:
+            coin_info = coin_data[0]
+            
+            if 'quote' in coin_info and 'USD' in coin_info['quote']:
+                price = coin_info['quote']['USD'].get('price')
+                
+                if price is not None and price > 0:
+                    return float(price)
+                logger.debug(f"CoinMarketCap: {symbol} uchun narx topilmadi yoki 0")
     
-    return None, None
+    return None
 
 
-def get_from_binance(coin):
+async def get_from_binance(coins):
     """
     Binance Spot API - global bozor narxlari
+    Bir nechta coin uchun barcha tickerlar bitta so'rovda olinadi
     """
-    try:
-        BINANCE_URL = os.getenv("BINANCE_URL")
+    found = {}
+    BINANCE_URL = os.getenv("BINANCE_URL")
 
-        symbol = f"{coin}USDT"
-        
-        response = requests.get(BINANCE_URL, params={"symbol": symbol}, timeout=10)
+    # Registry bo'yicha savdoda bo'lgan juftliklar
+    wanted = {symbol_registry.binance_pair(coin): coin for coin in coins}
+    wanted.pop(None, None)
+    if not wanted:
+        return found
+
+    try:
+        if len(wanted) == 1:
+            status, data = await _get_json(BINANCE_URL, 10, "Binance", cost=2, params={"symbol": next(iter(wanted))})
+            # 400 - bunday juftlik yo'q (aniq javob)
+            if status not in (200, 400):
+                return dict.fromkeys(wanted.values())
+            data = [data] if status == 200 else []
+        else:
+            # symbol parametrisiz - barcha juftliklar (noto'g'ri symbol butun so'rovni buzmaydi)
+            status, data = await _get_json(BINANCE_URL, 10, "Binance", cost=4)
+            if status != 200:
+                return dict.fromkeys(wanted.values())
         
-        if response.status_code == 200:
-            data = response.json()
-            price = float(data.get("price", 0))
-            if price > 0:
-                return price, "Binance"
+        for ticker in data:
+            coin = wanted.get(ticker.get("symbol"))
+            if coin:
+                price = float(ticker.get("price", 0))
+                if price > 0:
+                    found[coin] = {"usd": price, "rub": None}
         
     except Exception as e:
-        logger.debug(f"Binance error for {coin}: {e}")
+        logger.debug(f"Binance error for {', '.join(coins)}: {e}")
+        return dict.fromkeys(wanted.values())
     
-    return None, None
+    return found
 
 
-def get_from_coingecko(coin):
+async def get_from_coingecko(coins):
     """
     CoinGecko API - fallback manba
+    ids= parametri orqali barcha coinlar bitta so'rovda
     """
     
-    # Coinlarning CoinGecko ID mapping
-    COIN_IDS = {
-        "BTC": "bitcoin",
-        "ETH": "ethereum",
-        "BNB": "binancecoin",
-        "SOL": "solana",
-        "XRP": "ripple",
-        "ADA": "cardano",
-        "DOGE": "dogecoin",
-        "DOT": "polkadot",
-        "MATIC": "matic-network",
-        "POLY": "matic-network",
-        "TRX": "tron",
-        "TON": "the-open-network",
-        "NOT": "notcoin",
-        "USDT": "tether",
-        "USDC": "usd-coin",
-        "SHIB": "shiba-inu",
-        "AVAX": "avalanche-2",
-        "LINK": "chainlink",
-        "UNI": "uniswap",
-        "LTC": "litecoin",
-        "BCH": "bitcoin-cash",
-        "PEPE": "pepe",
-        "ARB": "arbitrum",
-        "OP": "optimism",
-        "NEAR": "near",
-        "APT": "aptos",
-        "SUI": "sui",
-        "STX": "blockstack",
-        "INJ": "injective-protocol",
-        "TIA": "celestia",
-        "SEI": "sei-network",
-        "FET": "fetch-ai",
-        "RENDER": "render-token",
-        "RNDR": "render-token",
-        "GRT": "the-graph",
-        "IMX": "immutable-x",
-        "RUNE": "thorchain",
-        "ATOM": "cosmos",
-        "FIL": "filecoin",
-        "HBAR": "hedera-hashgraph",
-        "VET": "vechain",
-        "ALGO": "algorand",
-        "ICP": "internet-computer",
-        "SAND": "the-sandbox",
-        "MANA": "decentraland",
-        "AXS": "axie-infinity",
-        "XLM": "stellar",
-        "XMR": "monero",
-        "ETC": "ethereum-classic",
-        "WLD": "worldcoin-wld",
-        "JUP": "jupiter-exchange-solana",
-        "BONK": "bonk",
-        "WIF": "dogwifcoin",
-        "PYTH": "pyth-network",
-        "FLOKI": "floki",
-    }
-    
-    coin_id = COIN_IDS.get(coin, coin.lower())
+    coin_ids = {coin: symbol_registry.coingecko_id(coin) for coin in coins}
+    # Takroriy symbol (ID tanlanmagan) - CoinGecko "topilmadi" demagan, javob noaniq
+    found = {coin: None for coin, coin_id in coin_ids.items() if not coin_id and coin in symbol_registry.coingecko}
+    coin_ids = {coin: coin_id for coin, coin_id in coin_ids.items() if coin_id}
+    if not coin_ids:
+        return found
     
     try:
         COINGECKO_URL = os.getenv("COINGECKO_URL")
 
         params = {
-            "ids": coin_id,
+            "ids": ",".join(sorted(set(coin_ids.values()))),
             "vs_currencies": "usd",
             "include_24hr_change": "false"
         }
 
-        response = requests.get(COINGECKO_URL, params=params, timeout=10)
+        status, data = await _get_json(COINGECKO_URL, 10, "CoinGecko", params=params)
 
-        if response.status_code == 200:
-            data = response.json()
-            
+        if status != 200:
+            return {**found, **dict.fromkeys(coin_ids)}
+        for coin, coin_id in coin_ids.items():
             if coin_id in data and "usd" in data[coin_id]:
                 price = float(data[coin_id]["usd"])
                 if price > 0:
-                    return price, "CoinGecko"
+                    found[coin] = {"usd": price, "rub": None}
         
     except Exception as e:
-        logger.debug(f"CoinGecko error for {coin}: {e}")
+        logger.debug(f"CoinGecko error for {', '.join(coins)}: {e}")
+        return {**found, **dict.fromkeys(coin_ids)}
     
-    return None, None
+    return found
+
+
+# Manbalar ketma-ketligi (asl fallback tartibi). Har bir manba qaytaradi:
+# {coin: price_data} - topildi, {coin: None} - javob olinmadi (xato, timeout, 429),
+# natijada yo'q coin - manba aniq "topilmadi" dedi (negative cache faqat shunda)
+PROVIDERS = {
+    "Coinbase": get_from_coinbase,
+    "CoinMarketCap": get_from_coinmarketcap,
+    "Binance": get_from_binance,
+    "CoinGecko": get_from_coingecko,
+}
+
+provider_router = ProviderRouter(
+    list(PROVIDERS),
+    failure_threshold=int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "5")),
+    open_seconds=float(os.getenv("PROVIDER_OPEN_SECONDS", "30")),
+)
+
+
+# Symbol → provider-id indeksi (startupda main.py yuklaydi)
+symbol_registry = SymbolRegistry(on_update=set_known_symbols, session=_get_session)
+
+hedge_budget = HedgeBudget(
+    ratio=float(os.getenv("PRICE_HEDGE_BUDGET", "0.1")),
+)
+
+
+def get_router_stats():
+    """Manbalar holati (circuit, latency, xatolar, hedge, kvota) - ops uchun"""
+    return {
+        "order": sorted(provider_router.providers, key=provider_router.score),
+        "providers": provider_router.snapshot(),
+        "hedge": {"enabled": PRICE_HEDGE_ENABLED, **hedge_budget.snapshot()},
+        "quota": quota_manager.snapshot(),
+    }
 
 
 def get_uzs_rate():
     """
-    Real-time USD → UZS kursi (O'zbekiston Markaziy Banki)
-    Cache: 30 soniya (har 30 soniyada yangilanadi - REAL-TIME)
+    USD → UZS kursi (O'zbekiston Markaziy Banki)
+    utils/api/fiat.py fonda yangilaydi - bu yerda tarmoq so'rovi yo'q
     """
-    global _rate_cache
-    
-    now = datetime.now()
-    cache = _rate_cache["uzs"]
-    
-    # Cache mavjud va 30 soniyadan kam bo'lsa
-    if cache["updated"] and (now - cache["updated"]) < timedelta(seconds=30):
-        return cache["rate"]
-    
-    try:
-        # CBU rasmiy API
-        UZS_RATE_URL = os.getenv("UZS_RATE_URL")
-        response = requests.get(UZS_RATE_URL, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            for currency in data:
-                if currency.get("Ccy") == "USD":
-                    rate = float(currency.get("Rate", 12850))
-                    
-                    # Cache'ni yangilash
-                    _rate_cache["uzs"] = {"rate": rate, "updated": now}
-                    logger.info(f"✅ UZS kurs yangilandi: {rate}")
-                    return rate
-    
-    except Exception as e:
-        logger.warning(f"UZS kurs olishda xato: {e}")
-    
-    # Default qiymat
-    return cache["rate"]
+    return fiat_rates.get("uzs")
 
 
 def get_rub_rate():
     """
-    Real-time USD → RUB kursi (Rossiya Markaziy Banki)
-    Cache: 30 soniya (har 30 soniyada yangilanadi - REAL-TIME)
+    USD → RUB kursi (Rossiya Markaziy Banki)
+    utils/api/fiat.py fonda yangilaydi - bu yerda tarmoq so'rovi yo'q
     """
-    global _rate_cache
-    
-    now = datetime.now()
-    cache = _rate_cache["rub"]
-    
-    # Cache mavjud va 30 soniyadan kam bo'lsa
-    if cache["updated"] and (now - cache["updated"]) < timedelta(seconds=30):
-        return cache["rate"]
-    
-    try:
-        # CBR rasmiy API
-        RUB_RATE_URL = os.getenv("RUB_RATE_URL")
-        response = requests.get(RUB_RATE_URL, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if "Valute" in data and "USD" in data["Valute"]:
-                rate = float(data["Valute"]["USD"]["Value"])
-                
-                # Cache'ni yangilash
-                _rate_cache["rub"] = {"rate": rate, "updated": now}
-                logger.info(f"✅ RUB kurs yangilandi: {rate}")
-                return rate
-    
-    except Exception as e:
-        logger.warning(f"RUB kurs olishda xato: {e}")
-    
-    # Default qiymat
-    return cache["rate"]
+    return fiat_rates.get("rub")
 
 
 # TEST FUNCTION
-if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    
+async def _main():
     print("="*60)
     print("🚀 CRYPTO PRICE CHECKER - MULTI-SOURCE INTEGRATION")
     print("="*60)
@@ -487,7 +797,11 @@ if __name__ == "__main__":
     print("Ketma-ketlik: 1. Coinbase → 2. CoinMarketCap → 3. Binance → 4. CoinGecko")
     print()
     
-    results = get_real_prices(test_coins)
+    try:
+        await fiat_rates.refresh()
+        results = await get_real_prices(test_coins)
+    finally:
+        await close_session()
     
     print("\n" + "="*60)
     print("📊 NATIJALAR:")
@@ -504,4 +818,13 @@ if __name__ == "__main__":
         else:
             print(f"❌ {coin}: TOPILMADI\n")
     
-    print("="*60)
\ No newline at end of file
+    print("="*60)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
+    asyncio.run(_main())
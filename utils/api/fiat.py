@@ -0,0 +1,153 @@
+"""
+Fiat kurslar xizmati - USD → UZS / RUB (va ixtiyoriy boshqa valyutalar)
+Fonda o'z jadvali bo'yicha yangilanadi (ETag / Last-Modified bilan),
+oxirgi yaxshi kurslar diskka yoziladi - narx yo'li faqat xotiradan o'qiydi
+"""
+import asyncio
+import aiohttp
+import json
+import logging
+import os
+import time
+
+from utils.files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+FIAT_RATES_PATH = os.getenv("FIAT_RATES_PATH", "data/fiat_rates.json")
+FIAT_REFRESH_SECONDS = float(os.getenv("FIAT_REFRESH_SECONDS", "1800"))
+# CBU ro'yxatidan qo'shimcha valyutalar (masalan: EUR,KZT)
+FIAT_EXTRA_CURRENCIES = [c.strip().upper() for c in os.getenv("FIAT_EXTRA_CURRENCIES", "").split(",") if c.strip()]
+
+# Birinchi ishga tushirishda (disk bo'sh bo'lsa) ishlatiladigan qiymatlar
+DEFAULT_RATES = {"uzs": 12850, "rub": 95}
+
+
+class FiatRates:
+    """
+    {valyuta: 1 USD qiymati} xotirada; har bir manba uchun ETag / Last-Modified saqlanadi
+    """
+
+    def __init__(self, path=FIAT_RATES_PATH):
+        self.path = path
+        self.rates = dict(DEFAULT_RATES)
+        self.updated = {}
+        self.validators = {}
+        self.stats = {"fetches": 0, "not_modified": 0, "errors": 0}
+
+    def get(self, currency):
+        """1 USD necha birlik (faqat xotiradan)"""
+        return self.rates.get(currency.lower())
+
+    def load(self):
+        """Oxirgi yaxshi kurslarni diskdan yuklash (restartdan keyin real qiymatlar)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Fiat kurslarni o'qishda xato: {e}")
+            return False
+
+        self.rates.update(data.get("rates", {}))
+        self.updated = data.get("updated", {})
+        self.validators = data.get("validators", {})
+        logger.info(f"💱 Fiat kurslar diskdan yuklandi: {self.rates}")
+        return True
+
+    def save(self):
+        data = {"rates": self.rates, "updated": self.updated, "validators": self.validators}
+        write_json_atomic(self.path, data)
+
+    async def refresh(self):
+        """CBU va CBR dan kurslarni olish (o'zgarmagan bo'lsa 304)"""
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            changed = await asyncio.gather(
+                self._refresh_source(session, "cbu", os.getenv("UZS_RATE_URL"), self._parse_cbu),
+                self._refresh_source(session, "cbr", os.getenv("RUB_RATE_URL"), self._parse_cbr),
+            )
+        if any(changed):
+            self.save()
+
+    async def run(self):
+        """Fonda davriy yangilash"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Fiat kurs xizmati xatosi: {e}")
+            await asyncio.sleep(FIAT_REFRESH_SECONDS)
+
+    async def _refresh_source(self, session, source, url, parse):
+        if not url:
+            return False
+
+        headers = {}
+        validators = self.validators.get(source, {})
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    self.stats["not_modified"] += 1
+                    return False
+                if response.status != 200:
+                    self.stats["errors"] += 1
+                    logger.warning(f"{source.upper()} kurs: {response.status}")
+                    return False
+                data = await response.json(content_type=None)
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"{source.upper()} kurs olishda xato: {e}")
+            return False
+
+        rates = parse(data)
+        if not rates:
+            self.stats["errors"] += 1
+            return False
+
+        self.stats["fetches"] += 1
+        self.rates.update(rates)
+        self.validators[source] = validators
+        self.updated[source] = time.time()
+        logger.info(f"✅ {source.upper()} kurslar yangilandi: {rates}")
+        return True
+
+    def _parse_cbu(self, data):
+        """CBU: har bir valyuta uchun 1 birlik = Rate so'm (Nominal hisobga olinadi)"""
+        per_unit = {}
+        for currency in data:
+            try:
+                nominal = float(currency.get("Nominal") or 1)
+                per_unit[currency.get("Ccy")] = float(currency.get("Rate")) / nominal
+            except (TypeError, ValueError):
+                continue
+
+        usd = per_unit.get("USD")
+        if not usd:
+            return {}
+
+        rates = {"uzs": usd}
+        for code in FIAT_EXTRA_CURRENCIES:
+            if code not in ("UZS", "RUB", "USD") and per_unit.get(code):
+                rates[code.lower()] = usd / per_unit[code]
+        return rates
+
+    def _parse_cbr(self, data):
+        """CBR: Valute.USD.Value - 1 USD necha rubl"""
+        try:
+            return {"rub": float(data["Valute"]["USD"]["Value"])}
+        except (KeyError, TypeError, ValueError):
+            return {}
+
+
+fiat_rates = FiatRates()
@@ -0,0 +1,149 @@
+"""
+Manbalar bo'yicha so'rov byudjeti - token bucket, ikki navbat (lane):
+- interactive: search_coin va premium foydalanuvchilar - birinchi navbatda
+- background: scheduler yangilashlari - faqat qolgan sig'imdan, kvota tugasa kutadi
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class Lane:
+    """
+    O'zgaruvchan navbat: background so'rovga interactive chaqiruvchi qo'shilsa,
+    kutayotgan so'rov interactive'ga ko'tariladi
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value=INTERACTIVE):
+        self.value = value
+
+    def promote(self):
+        self.value = INTERACTIVE
+
+
+# Joriy so'rov navbati (get_real_prices o'rnatadi, ichki tasklar meros oladi)
+current_lane = contextvars.ContextVar("price_lane", default=Lane(INTERACTIVE))
+
+# Standart limitlar: "so'rovlar/soniya" (API tarif rejasiga moslang)
+DEFAULT_LIMITS = {
+    "Coinbase": "10000/3600",
+    "CoinMarketCap": "30/60",
+    "Binance": "6000/60",      # request weight
+    "CoinGecko": "30/60",
+}
+
+# Sig'imning shu qismi faqat interactive navbat uchun saqlanadi
+INTERACTIVE_RESERVE = float(os.getenv("RATE_LIMIT_INTERACTIVE_RESERVE", "0.3"))
+
+
+def _parse_limit(value):
+    requests, seconds = value.split("/")
+    return float(requests), float(seconds)
+
+
+class ProviderQuota:
+    """Bitta manba uchun token bucket"""
+
+    def __init__(self, name, requests, seconds, reserve=INTERACTIVE_RESERVE):
+        self.name = name
+        self.capacity = requests
+        self.rate = requests / seconds
+        self.reserve = requests * reserve
+        self.tokens = requests
+        self.updated = time.monotonic()
+        self.interactive_waiting = 0
+        self.stats = {
+            "granted": {INTERACTIVE: 0, BACKGROUND: 0},
+            "throttled": {INTERACTIVE: 0, BACKGROUND: 0},
+            "waited_seconds": 0.0,
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _can_take(self, lane, cost):
+        if lane == INTERACTIVE:
+            return self.tokens >= cost
+        # background: rezervga tegmaydi va interactive kutayotganda navbat bermaydi
+        return self.interactive_waiting == 0 and self.tokens - cost >= self.reserve
+
+    async def acquire(self, lane, cost=1.0):
+        started = time.monotonic()
+        throttled = False
+        while True:
+            self._refill()
+            # lane.value har aylanishda o'qiladi - kutish paytida ko'tarilishi mumkin
+            kind = lane.value
+            if self._can_take(kind, cost):
+                self.tokens -= cost
+                self.stats["granted"][kind] += 1
+                break
+
+            if not throttled:
+                throttled = True
+                self.stats["throttled"][kind] += 1
+
+            floor = cost if kind == INTERACTIVE else cost + self.reserve
+            if kind == INTERACTIVE:
+                self.interactive_waiting += 1
+            try:
+                await asyncio.sleep(max(0.05, (floor - self.tokens) / self.rate))
+            finally:
+                if kind == INTERACTIVE:
+                    self.interactive_waiting -= 1
+
+        if throttled:
+            self.stats["waited_seconds"] += time.monotonic() - started
+
+    def drain(self):
+        """Manba 429 qaytardi - bucket bo'shatiladi"""
+        self._refill()
+        self.tokens = 0.0
+
+    def snapshot(self):
+        self._refill()
+        return {
+            "remaining": round(self.tokens, 1),
+            "capacity": self.capacity,
+            "granted": dict(self.stats["granted"]),
+            "throttled": dict(self.stats["throttled"]),
+            "waited_seconds": round(self.stats["waited_seconds"], 1),
+        }
+
+
+class QuotaManager:
+    """Manbalar kvotalari; limitlar RATE_LIMIT_<MANBA>=so'rov/soniya env orqali"""
+
+    def __init__(self, limits=None):
+        self.quotas = {}
+        for name, default in (limits or DEFAULT_LIMITS).items():
+            value = os.getenv(f"RATE_LIMIT_{name.upper()}", default)
+            requests, seconds = _parse_limit(value)
+            self.quotas[name] = ProviderQuota(name, requests, seconds)
+
+    async def acquire(self, name, cost=1.0):
+        quota = self.quotas.get(name)
+        if quota is not None:
+            await quota.acquire(current_lane.get(), cost)
+
+    def drain(self, name):
+        quota = self.quotas.get(name)
+        if quota is not None:
+            quota.drain()
+
+    def snapshot(self):
+        return {name: quota.snapshot() for name, quota in self.quotas.items()}
+
+
+quota_manager = QuotaManager()
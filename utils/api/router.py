@@ -0,0 +1,218 @@
+"""
+Narx manbalari uchun adaptiv marshrutlash - circuit breaker va latency bo'yicha tartib
+"""
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    """Bitta manbaning oxirgi so'rovlari bo'yicha holati"""
+
+    def __init__(self, name, rank, window):
+        self.name = name
+        self.rank = rank
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_for = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.auth_errors = 0
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency_percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q / 100 * len(ordered)))
+        return ordered[index]
+
+
+class ProviderRouter:
+    """
+    Manbalar holatini kuzatish:
+    - rolling latency va xatolik foizi
+    - 429 / 401 javoblar
+    - ketma-ket xatolarda circuit ochiladi, keyin half-open probe
+    - tartib: sog'lom va tez manbalar birinchi
+    """
+
+    def __init__(self, providers, window=50, failure_threshold=5, error_rate_threshold=0.5,
+                 open_seconds=30.0, auth_open_seconds=600.0, rank_weight=0.25):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.auth_open_seconds = auth_open_seconds
+        self.rank_weight = rank_weight
+        self.providers = {
+            name: ProviderHealth(name, rank, window) for rank, name in enumerate(providers)
+        }
+
+    def record(self, name, latency, status=None, error=None):
+        """
+        So'rov natijasini yozish. 200/400/404 - manba ishlayapti (coin topilmasligi xato emas),
+        timeout, ulanish xatosi, 5xx, 429, 401/403 - xato
+        """
+        health = self.providers.get(name)
+        if health is None:
+            return
+
+        health.requests += 1
+        health.latencies.append(latency)
+
+        ok = error is None and status is not None and status < 500 and status not in (401, 403, 429)
+        health.outcomes.append(ok)
+
+        if ok:
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                logger.info(f"🟢 {name}: circuit yopildi")
+            health.state = CLOSED
+            health.probing = False
+            return
+
+        health.errors += 1
+        health.consecutive_failures += 1
+
+        if status == 429:
+            health.rate_limited += 1
+            self._open(health, self.open_seconds)
+        elif status in (401, 403):
+            health.auth_errors += 1
+            self._open(health, self.auth_open_seconds)
+        elif health.state == HALF_OPEN:
+            self._open(health, self.open_seconds)
+        elif health.consecutive_failures >= self.failure_threshold or (
+            len(health.outcomes) >= 10 and health.error_rate >= self.error_rate_threshold
+        ):
+            self._open(health, self.open_seconds)
+
+    def _open(self, health, seconds):
+        if health.state != OPEN:
+            logger.warning(f"🔴 {health.name}: circuit ochildi ({seconds:.0f}s)")
+        health.state = OPEN
+        health.opened_at = time.monotonic()
+        health.open_for = seconds
+        health.probing = False
+
+    def available(self, name):
+        """Holatni o'zgartirmasdan: manbaga hozir so'rov yuborsa bo'ladimi"""
+        health = self.providers.get(name)
+        if health is None or health.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if health.state == OPEN and now - health.opened_at < health.open_for:
+            return False
+        # Javobsiz qolgan probe open_for dan keyin qayta ruxsat beriladi
+        return not (health.state == HALF_OPEN and health.probing and now - health.probe_started < health.open_for)
+
+    def allow(self, name):
+        """
+        So'rov yuborishdan bevosita oldin: open - yo'q, half-open - faqat bitta probe
+        (ruxsat berilsa probe o'rni band qilinadi)
+        """
+        if not self.available(name):
+            return False
+        health = self.providers.get(name)
+        if health is None or health.state == CLOSED:
+            return True
+
+        if health.state == OPEN:
+            health.state = HALF_OPEN
+        health.probing = True
+        health.probe_started = time.monotonic()
+        return True
+
+    def score(self, name):
+        """Kichikroq - yaxshiroq: median latency xatolik foiziga ko'paytiriladi + asl tartib"""
+        health = self.providers[name]
+        latency = health.latency_percentile(50) or 0.0
+        return latency * (1 + 4 * health.error_rate) + health.rank * self.rank_weight
+
+    def order(self, names):
+        """
+        Hozir ishlatsa bo'ladigan manbalar, holati bo'yicha saralangan.
+        Probe o'rni band qilinmaydi - u allow() bilan so'rov oldidan olinadi
+        """
+        available = [name for name in names if self.available(name)]
+        return sorted(available, key=self.score)
+
+    def latency_percentile(self, name, q):
+        health = self.providers.get(name)
+        return health.latency_percentile(q) if health else None
+
+    def snapshot(self):
+        """Ops uchun holat"""
+        result = {}
+        for name, health in self.providers.items():
+            p50 = health.latency_percentile(50)
+            p95 = health.latency_percentile(95)
+            result[name] = {
+                "state": health.state,
+                "requests": health.requests,
+                "errors": health.errors,
+                "error_rate": round(health.error_rate, 3),
+                "rate_limited": health.rate_limited,
+                "auth_errors": health.auth_errors,
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            }
+        return result
+
+
+class HedgeBudget:
+    """
+    Hedge so'rovlar uchun byudjet: har bir asosiy so'rov `ratio` token qo'shadi,
+    har bir hedge bitta token sarflaydi (upstream kvotalarini himoya qilish)
+    """
+
+    def __init__(self, ratio=0.1, burst=5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.hedges = {}
+        self.wins = {}
+        self.denied = 0
+
+    def on_request(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self):
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.denied += 1
+        return False
+
+    def record_hedge(self, name):
+        self.hedges[name] = self.hedges.get(name, 0) + 1
+
+    def record_win(self, name):
+        self.wins[name] = self.wins.get(name, 0) + 1
+
+    def snapshot(self):
+        return {
+            "tokens": round(self.tokens, 2),
+            "denied": self.denied,
+            "hedges": dict(self.hedges),
+            "wins": dict(self.wins),
+        }
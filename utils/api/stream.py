@@ -0,0 +1,242 @@
+"""
+WebSocket ticker oqimlari (Binance, Coinbase) - REST polling o'rniga ixtiyoriy rejim
+Faqat kuzatuvdagi coinlarga obuna bo'linadi, oxirgi narxlar xotiradagi jadvalda
+"""
+import asyncio
+import aiohttp
+import json
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+PRICE_STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "0") == "1"
+PRICE_STREAM_MAX_AGE = float(os.getenv("PRICE_STREAM_MAX_AGE", "30"))
+PRICE_STREAM_SYNC_SECONDS = float(os.getenv("PRICE_STREAM_SYNC_SECONDS", "60"))
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443/ws")
+COINBASE_WS_URL = os.getenv("COINBASE_WS_URL", "wss://ws-feed.exchange.coinbase.com")
+
+
+class _Feed:
+    """
+    Bitta WebSocket manbasi: ulanish, obuna, qayta ulanish (exponential backoff)
+    """
+
+    name = None
+
+    def __init__(self, url, table):
+        self.url = url
+        self.table = table
+        self.wanted = set()
+        self.subscribed = set()
+        self.rejected = set()
+        self.ws = None
+        self.reconnects = 0
+        self.messages = 0
+        self._changed = asyncio.Event()
+
+    def set_symbols(self, symbols):
+        symbols = set(symbols) - self.rejected
+        if symbols != self.wanted:
+            self.wanted = symbols
+            self._changed.set()
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            if not self.wanted:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, heartbeat=30) as ws:
+                        self.ws = ws
+                        self.subscribed = set()
+                        logger.info(f"🔌 {self.name} WS ulandi")
+                        backoff = 1.0
+                        await self._session_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.name} WS xato: {e}")
+            finally:
+                self.ws = None
+
+            self.reconnects += 1
+            delay = backoff * (0.5 + random.random())
+            logger.info(f"{self.name} WS {delay:.1f}s dan keyin qayta ulanadi")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _session_loop(self, ws):
+        await self._sync_subscriptions(ws)
+        receiver = asyncio.ensure_future(ws.receive())
+        changed = asyncio.ensure_future(self._changed.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait({receiver, changed}, return_when=asyncio.FIRST_COMPLETED)
+
+                if changed in done:
+                    self._changed.clear()
+                    await self._sync_subscriptions(ws)
+                    changed = asyncio.ensure_future(self._changed.wait())
+
+                if receiver in done:
+                    msg = receiver.result()
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        # CLOSE / ERROR - qayta ulanish
+                        return
+                    self.messages += 1
+                    self._handle(json.loads(msg.data))
+                    receiver = asyncio.ensure_future(ws.receive())
+        finally:
+            receiver.cancel()
+            changed.cancel()
+
+    async def _sync_subscriptions(self, ws):
+        add = self.wanted - self.subscribed
+        remove = self.subscribed - self.wanted
+        if remove:
+            await ws.send_json(self._unsubscribe_message(sorted(remove)))
+        if add:
+            await ws.send_json(self._subscribe_message(sorted(add)))
+        self.subscribed = set(self.wanted)
+
+    def _update(self, coin, price):
+        if price > 0:
+            self.table[coin] = (price, self.name, time.monotonic())
+
+    def _subscribe_message(self, coins):
+        raise NotImplementedError
+
+    def _unsubscribe_message(self, coins):
+        raise NotImplementedError
+
+    def _handle(self, data):
+        raise NotImplementedError
+
+
+class BinanceFeed(_Feed):
+    """Binance <symbol>usdt@miniTicker oqimi"""
+
+    name = "Binance"
+
+    def __init__(self, url, table):
+        super().__init__(url, table)
+        self._request_id = 0
+
+    def _streams(self, coins):
+        return [f"{coin.lower()}usdt@miniTicker" for coin in coins]
+
+    def _subscribe_message(self, coins):
+        self._request_id += 1
+        return {"method": "SUBSCRIBE", "params": self._streams(coins), "id": self._request_id}
+
+    def _unsubscribe_message(self, coins):
+        self._request_id += 1
+        return {"method": "UNSUBSCRIBE", "params": self._streams(coins), "id": self._request_id}
+
+    def _handle(self, data):
+        symbol = data.get("s", "")
+        if data.get("e") == "24hrMiniTicker" and symbol.endswith("USDT"):
+            self._update(symbol[:-4], float(data.get("c", 0)))
+
+
+class CoinbaseFeed(_Feed):
+    """Coinbase Exchange ticker kanali (<COIN>-USD)"""
+
+    name = "Coinbase"
+
+    def _subscribe_message(self, coins):
+        return {"type": "subscribe", "product_ids": [f"{coin}-USD" for coin in coins], "channels": ["ticker"]}
+
+    def _unsubscribe_message(self, coins):
+        return {"type": "unsubscribe", "product_ids": [f"{coin}-USD" for coin in coins], "channels": ["ticker"]}
+
+    def _handle(self, data):
+        kind = data.get("type")
+        if kind == "ticker":
+            product = data.get("product_id", "")
+            if product.endswith("-USD"):
+                self._update(product[:-4], float(data.get("price", 0)))
+        elif kind == "error":
+            # Noto'g'ri product butun obunani buzadi - uni chiqarib, qayta obuna bo'lamiz
+            reason = data.get("reason", "")
+            product = reason.split(" ", 1)[0]
+            if product.endswith("-USD"):
+                coin = product[:-4]
+                logger.info(f"Coinbase WS: {coin} mavjud emas, obunadan chiqarildi")
+                self.rejected.add(coin)
+                self.subscribed.discard(coin)
+                self.set_symbols(self.wanted)
+            else:
+                logger.warning(f"Coinbase WS xato: {data.get('message')} {reason}")
+
+
+class TickerStream:
+    """
+    Oqimlardan kelgan oxirgi narxlar jadvali: {coin: (usd, source, updated)}
+    """
+
+    def __init__(self, binance_url=BINANCE_WS_URL, coinbase_url=COINBASE_WS_URL):
+        self.latest = {}
+        self.feeds = [
+            CoinbaseFeed(coinbase_url, self.latest),
+            BinanceFeed(binance_url, self.latest),
+        ]
+        self.hits = 0
+
+    def get(self, coin, max_age=PRICE_STREAM_MAX_AGE):
+        """Yangi (max_age ichida) narx yoki None"""
+        entry = self.latest.get(coin)
+        if entry and time.monotonic() - entry[2] < max_age:
+            self.hits += 1
+            return entry[0], entry[1]
+        return None
+
+    def set_symbols(self, symbols):
+        """Obunalarni kuzatuvdagi coinlar to'plamiga moslash"""
+        symbols = {symbol.upper() for symbol in symbols}
+        for feed in self.feeds:
+            feed.set_symbols(symbols)
+        for coin in set(self.latest) - symbols:
+            del self.latest[coin]
+
+    async def run(self, symbol_source):
+        """
+        Oqimlarni ishga tushirish. symbol_source() - kuzatuvdagi coinlar to'plami,
+        har PRICE_STREAM_SYNC_SECONDS da qayta o'qiladi
+        """
+        logger.info("📡 Ticker stream rejimi yoqildi")
+        tasks = [asyncio.ensure_future(feed.run()) for feed in self.feeds]
+        try:
+            while True:
+                try:
+                    self.set_symbols(symbol_source())
+                except Exception as e:
+                    logger.error(f"Stream symbol sync xato: {e}")
+                await asyncio.sleep(PRICE_STREAM_SYNC_SECONDS)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "symbols": len(self.latest),
+            "hits": self.hits,
+            "feeds": {
+                feed.name: {
+                    "connected": feed.ws is not None,
+                    "subscribed": len(feed.subscribed),
+                    "messages": feed.messages,
+                    "reconnects": feed.reconnects,
+                }
+                for feed in self.feeds
+            },
+        }
+
+
+ticker_stream = TickerStream()
@@ -0,0 +1,359 @@
+"""
+Symbol registry - manbalarning to'liq coin ro'yxatlari (CoinGecko, Binance, CoinMarketCap)
+Diskdagi ixcham indeksdan startupda bir marta yuklanadi, fonda yangilanadi
+"""
+import asyncio
+import aiohttp
+import json
+import logging
+import os
+import time
+
+from utils.api.ratelimit import quota_manager, current_lane, Lane, BACKGROUND
+from utils.files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", "data/symbols.json")
+SYMBOL_REFRESH_HOURS = float(os.getenv("SYMBOL_REFRESH_HOURS", "24"))
+# /coins/markets sahifalari (250 tadan, market cap bo'yicha) - takroriy symbollar uchun rank
+COINGECKO_MARKETS_PAGES = int(os.getenv("COINGECKO_MARKETS_PAGES", "4"))
+# Ro'yxatlar katta - umumiy sessiyada har bir so'rov uchun alohida timeout
+_TIMEOUT = aiohttp.ClientTimeout(total=60)
+# Binance exchangeInfo request weight
+_BINANCE_EXCHANGE_INFO_WEIGHT = 20
+
+# CoinMarketCap'da boshqa symbol bilan turgan tokenlar
+CMC_SYMBOL_OVERRIDES = {
+    "POLY": "MATIC",   # Polygon (MATIC)
+    "RENDER": "RNDR",  # Render Token
+}
+
+# CoinGecko'da bir symbol bir nechta coin'ga tegishli bo'lishi mumkin -
+# mashhur coinlar uchun aniq ID
+COINGECKO_ID_OVERRIDES = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "BNB": "binancecoin",
+    "SOL": "solana",
+    "XRP": "ripple",
+    "ADA": "cardano",
+    "DOGE": "dogecoin",
+    "DOT": "polkadot",
+    "MATIC": "matic-network",
+    "POLY": "matic-network",
+    "TRX": "tron",
+    "TON": "the-open-network",
+    "NOT": "notcoin",
+    "USDT": "tether",
+    "USDC": "usd-coin",
+    "SHIB": "shiba-inu",
+    "AVAX": "avalanche-2",
+    "LINK": "chainlink",
+    "UNI": "uniswap",
+    "LTC": "litecoin",
+    "BCH": "bitcoin-cash",
+    "PEPE": "pepe",
+    "ARB": "arbitrum",
+    "OP": "optimism",
+    "NEAR": "near",
+    "APT": "aptos",
+    "SUI": "sui",
+    "STX": "blockstack",
+    "INJ": "injective-protocol",
+    "TIA": "celestia",
+    "SEI": "sei-network",
+    "FET": "fetch-ai",
+    "RENDER": "render-token",
+    "RNDR": "render-token",
+    "GRT": "the-graph",
+    "IMX": "immutable-x",
+    "RUNE": "thorchain",
+    "ATOM": "cosmos",
+    "FIL": "filecoin",
+    "HBAR": "hedera-hashgraph",
+    "VET": "vechain",
+    "ALGO": "algorand",
+    "ICP": "internet-computer",
+    "SAND": "the-sandbox",
+    "MANA": "decentraland",
+    "AXS": "axie-infinity",
+    "XLM": "stellar",
+    "XMR": "monero",
+    "ETC": "ethereum-classic",
+    "WLD": "worldcoin-wld",
+    "JUP": "jupiter-exchange-solana",
+    "BONK": "bonk",
+    "WIF": "dogwifcoin",
+    "PYTH": "pyth-network",
+    "FLOKI": "floki",
+}
+
+
+class SymbolRegistry:
+    """
+    symbol → provider-id O(1) qidiruv:
+    - coingecko: {SYMBOL: coin_id yoki None - bir nechta coin, rank bilan ajratib bo'lmadi}
+    - cmc: {SYMBOL: cmc_id}
+    - binance: {SYMBOL} - USDT juftligi savdoda bo'lgan base assetlar
+    """
+
+    def __init__(self, path=SYMBOL_INDEX_PATH, on_update=None, session=None):
+        self.path = path
+        self.on_update = on_update
+        # session() - narx so'rovlari bilan umumiy pool'langan aiohttp sessiyasi
+        self.session = session
+        self.coingecko = {}
+        self.cmc = {}
+        self.binance = set()
+        self.updated = 0.0
+
+    @property
+    def loaded(self):
+        return bool(self.coingecko or self.cmc or self.binance)
+
+    def coingecko_id(self, coin):
+        """CoinGecko ID (override → indeks → coin.lower() taxmini indeks yo'q bo'lsa)"""
+        if coin in COINGECKO_ID_OVERRIDES:
+            return COINGECKO_ID_OVERRIDES[coin]
+        if self.coingecko:
+            return self.coingecko.get(coin)
+        return coin.lower()
+
+    def cmc_symbol(self, coin):
+        """CoinMarketCap symbol yoki None (CMC ro'yxatida yo'q bo'lsa)"""
+        symbol = CMC_SYMBOL_OVERRIDES.get(coin, coin)
+        if self.cmc and symbol not in self.cmc:
+            # Override eskirgan bo'lishi mumkin (token qayta nomlangan) - asl symbol
+            return coin if coin in self.cmc else None
+        return symbol
+
+    def binance_pair(self, coin):
+        """Binance USDT juftligi yoki None (savdoda bo'lmasa)"""
+        if self.binance and coin not in self.binance:
+            return None
+        return f"{coin}USDT"
+
+    def known_symbols(self):
+        """Barcha manbalarda ma'lum symbollar"""
+        return (
+            set(self.coingecko) | set(self.cmc) | self.binance
+            | set(COINGECKO_ID_OVERRIDES) | set(CMC_SYMBOL_OVERRIDES)
+        )
+
+    def load(self):
+        """Diskdagi indeksni yuklash (startupda bir marta)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"Symbol indeksi topilmadi: {self.path}")
+            return False
+        except Exception as e:
+            logger.warning(f"Symbol indeksini o'qishda xato: {e}")
+            return False
+
+        self.coingecko = data.get("coingecko", {})
+        self.cmc = data.get("cmc", {})
+        self.binance = set(data.get("binance", []))
+        self.updated = data.get("updated", 0.0)
+        logger.info(
+            f"📚 Symbol indeksi yuklandi: CoinGecko {len(self.coingecko)}, "
+            f"CMC {len(self.cmc)}, Binance {len(self.binance)}"
+        )
+        self._notify()
+        return True
+
+    def save(self):
+        """Indeksni ixcham JSON sifatida atomik yozish"""
+        data = {
+            "updated": self.updated,
+            "coingecko": self.coingecko,
+            "cmc": self.cmc,
+            "binance": sorted(self.binance),
+        }
+        write_json_atomic(self.path, data)
+
+    async def refresh(self):
+        """
+        Manbalardan to'liq ro'yxatlarni olish (bir nechta katta so'rov).
+        Narx so'rovlari bilan bir kvotadan, background navbatida
+        """
+        current_lane.set(Lane(BACKGROUND))
+        if self.session is not None:
+            coingecko, cmc, binance = await self._fetch_all(self.session())
+        else:
+            async with aiohttp.ClientSession() as session:
+                coingecko, cmc, binance = await self._fetch_all(session)
+
+        # Olinmagan ro'yxat uchun eskisi saqlanadi
+        self.coingecko = coingecko or self.coingecko
+        self.cmc = cmc or self.cmc
+        self.binance = binance or self.binance
+
+        if not (coingecko or cmc or binance):
+            logger.warning("Symbol ro'yxatlari yangilanmadi")
+            return False
+
+        self.updated = time.time()
+        self.save()
+        logger.info(
+            f"✅ Symbol indeksi yangilandi: CoinGecko {len(self.coingecko)}, "
+            f"CMC {len(self.cmc)}, Binance {len(self.binance)}"
+        )
+        self._notify()
+        return True
+
+    async def run(self):
+        """Fonda davriy yangilash"""
+        interval = SYMBOL_REFRESH_HOURS * 3600
+        while True:
+            age = time.time() - self.updated
+            if age >= interval:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.error(f"Symbol registry xatosi: {e}")
+                age = 0
+            await asyncio.sleep(max(60.0, interval - age))
+
+    async def _fetch_all(self, session):
+        return await asyncio.gather(
+            self._fetch_coingecko(session),
+            self._fetch_cmc(session),
+            self._fetch_binance(session),
+        )
+
+    def _notify(self):
+        """
+        Tezkor rad etish faqat CoinGecko ro'yxati bilan yoqiladi - faqat CMC/Binance
+        ro'yxatlari bilan mavjud coinlar "noma'lum" bo'lib qolishi mumkin
+        """
+        if self.on_update:
+            self.on_update(self.known_symbols() if self.coingecko else set())
+
+    async def _fetch_coingecko(self, session):
+        """
+        CoinGecko /coins/list. Bir symbol bir nechta coin'ga tegishli bo'lsa market cap
+        rank bo'yicha eng yuqorisi tanlanadi; rank topilmasa ID tanlanmaydi (None) -
+        bunday coinlar uchun faqat COINGECKO_ID_OVERRIDES ishlatiladi
+        """
+        url = os.getenv("COINGECKO_LIST_URL")
+        if not url:
+            return {}
+        try:
+            await quota_manager.acquire("CoinGecko")
+            async with session.get(url, timeout=_TIMEOUT) as response:
+                if response.status != 200:
+                    logger.warning(f"CoinGecko coins/list: {response.status}")
+                    return {}
+                coins = await response.json(content_type=None)
+        except Exception as e:
+            logger.warning(f"CoinGecko coins/list xato: {e}")
+            return {}
+
+        candidates = {}
+        for coin in coins:
+            symbol = (coin.get("symbol") or "").upper()
+            coin_id = coin.get("id")
+            if not symbol or not coin_id:
+                continue
+            candidates.setdefault(symbol, []).append(coin_id)
+
+        ranks = {}
+        if any(len(ids) > 1 for ids in candidates.values()):
+            ranks = await self._fetch_coingecko_ranks(session)
+
+        index = {}
+        ambiguous = 0
+        for symbol, ids in candidates.items():
+            if len(ids) == 1:
+                index[symbol] = ids[0]
+                continue
+            ranked = [coin_id for coin_id in ids if coin_id in ranks]
+            if ranked:
+                index[symbol] = min(ranked, key=ranks.get)
+            else:
+                index[symbol] = None
+                ambiguous += 1
+        if ambiguous:
+            logger.info(f"CoinGecko: {ambiguous} ta takroriy symbol uchun ID tanlanmadi (rank yo'q)")
+        return index
+
+    async def _fetch_coingecko_ranks(self, session):
+        """CoinGecko /coins/markets (market_cap_desc) - {coin_id: market_cap_rank}"""
+        url = os.getenv("COINGECKO_MARKETS_URL")
+        if not url:
+            return {}
+        ranks = {}
+        for page in range(1, COINGECKO_MARKETS_PAGES + 1):
+            params = {"vs_currency": "usd", "order": "market_cap_desc", "per_page": 250, "page": page}
+            try:
+                await quota_manager.acquire("CoinGecko")
+                async with session.get(url, params=params, timeout=_TIMEOUT) as response:
+                    if response.status != 200:
+                        logger.warning(f"CoinGecko coins/markets: {response.status}")
+                        break
+                    coins = await response.json(content_type=None)
+            except Exception as e:
+                logger.warning(f"CoinGecko coins/markets xato: {e}")
+                break
+            for coin in coins:
+                rank = coin.get("market_cap_rank")
+                if coin.get("id") and rank:
+                    ranks[coin["id"]] = rank
+            if len(coins) < 250:
+                break
+        return ranks
+
+    async def _fetch_cmc(self, session):
+        """CoinMarketCap /cryptocurrency/map - bir symbol uchun eng yuqori rank"""
+        url = os.getenv("COINMARKETCAP_MAP_URL")
+        api_key = os.getenv("COINMARKETCAP_API_KEY")
+        if not url or not api_key:
+            return {}
+        try:
+            headers = {"Accepts": "application/json", "X-CMC_PRO_API_KEY": api_key}
+            await quota_manager.acquire("CoinMarketCap")
+            async with session.get(url, headers=headers, params={"listing_status": "active"}, timeout=_TIMEOUT) as response:
+                if response.status != 200:
+                    logger.warning(f"CoinMarketCap map: {response.status}")
+                    return {}
+                data = await response.json(content_type=None)
+        except Exception as e:
+            logger.warning(f"CoinMarketCap map xato: {e}")
+            return {}
+
+        index = {}
+        ranks = {}
+        for coin in data.get("data", []):
+            symbol = (coin.get("symbol") or "").upper()
+            if not symbol:
+                continue
+            rank = coin.get("rank") or float("inf")
+            if symbol not in index or rank < ranks[symbol]:
+                index[symbol] = coin.get("id")
+                ranks[symbol] = rank
+        return index
+
+    async def _fetch_binance(self, session):
+        """Binance exchangeInfo - USDT juftligi savdoda bo'lgan base assetlar"""
+        url = os.getenv("BINANCE_EXCHANGE_INFO_URL")
+        if not url:
+            return set()
+        try:
+            await quota_manager.acquire("Binance", _BINANCE_EXCHANGE_INFO_WEIGHT)
+            async with session.get(url, timeout=_TIMEOUT) as response:
+                if response.status != 200:
+                    logger.warning(f"Binance exchangeInfo: {response.status}")
+                    return set()
+                data = await response.json(content_type=None)
+        except Exception as e:
+            logger.warning(f"Binance exchangeInfo xato: {e}")
+            return set()
+
+        return {
+            s["baseAsset"].upper()
+            for s in data.get("symbols", [])
+            if s.get("quoteAsset") == "USDT" and s.get("status") == "TRADING"
+        }
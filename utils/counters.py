@@ -0,0 +1,120 @@
+"""
+Write-behind hisoblagichlar: view_count va daily_views xotirada yangilanadi,
+DB'ga har VIEW_FLUSH_SECONDS da bitta executemany bilan yoziladi (va to'xtashda)
+Kunlik limit shu jarayon ichida aniq - tekshiruv xotiradagi qiymatdan o'qiladi
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_SECONDS = float(os.getenv("VIEW_FLUSH_SECONDS", "5"))
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class ViewCounters:
+    """
+    _views: {user_id: view_count ga qo'shiladigan delta}
+    _daily: {user_id: (sana, daily_views)} - shu jarayonda ko'rilgan foydalanuvchilar,
+    _dirty: DB'ga yozilmagan kunlik qiymatlar (mutlaq qiymat yoziladi)
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._daily = {}
+        self._dirty = set()
+        self.stats = {"increments": 0, "flushes": 0, "rows": 0, "commits": 0, "errors": 0}
+
+    # ---------- view_count ----------
+    def add_view(self, user_id):
+        self._views[user_id] = self._views.get(user_id, 0) + 1
+        self.stats["increments"] += 1
+
+    def pending_views(self, user_id):
+        """Hali DB'ga yozilmagan ko'rishlar (profil va admin panelda qo'shib ko'rsatiladi)"""
+        return self._views.get(user_id, 0)
+
+    # ---------- daily_views ----------
+    def daily_views(self, user_id, today, db_views, db_date):
+        """
+        Bugungi ko'rishlar soni. Birinchi murojaatda DB qatoridan olinadi,
+        keyin faqat xotiradagi qiymat ishlatiladi; sana o'zgarsa 0 dan boshlanadi
+        """
+        entry = self._daily.get(user_id)
+        if entry is not None and entry[0] == today:
+            return entry[1]
+        if entry is None and db_date == today:
+            count = db_views or 0
+        else:
+            count = 0
+            self._dirty.add(user_id)
+        self._daily[user_id] = (today, count)
+        return count
+
+    def add_daily(self, user_id, today):
+        date, count = self._daily.get(user_id, (today, 0))
+        self._daily[user_id] = (today, count + 1 if date == today else 1)
+        self._dirty.add(user_id)
+        self.stats["increments"] += 1
+
+    def release_daily(self, user_id, today):
+        """add_daily bilan band qilingan ko'rishni qaytarish (qidiruv natija bermadi)"""
+        date, count = self._daily.get(user_id, (today, 0))
+        if date == today and count > 0:
+            self._daily[user_id] = (today, count - 1)
+            self._dirty.add(user_id)
+            self.stats["increments"] -= 1
+
+    # ---------- DB ----------
+    async def flush(self, adb):
+        """Buferni almashtirib yozish; xato bo'lsa o'zgarishlar keyingi flush'ga qaytadi"""
+        views, self._views = self._views, {}
+        dirty, self._dirty = self._dirty, set()
+        view_rows = [(delta, user_id) for user_id, delta in views.items()]
+        daily_rows = [(self._daily[user_id][1], self._daily[user_id][0], user_id) for user_id in dirty]
+        try:
+            if view_rows:
+                await adb.executemany("UPDATE Users SET view_count = view_count + ? WHERE id=?", view_rows)
+                self.stats["commits"] += 1
+                view_rows = []
+            if daily_rows:
+                await adb.executemany("UPDATE Users SET daily_views=?, last_view_date=? WHERE id=?", daily_rows)
+                self.stats["commits"] += 1
+        except Exception:
+            self.stats["errors"] += 1
+            for delta, user_id in view_rows:
+                self._views[user_id] = self._views.get(user_id, 0) + delta
+            self._dirty |= dirty
+            raise
+        self.stats["flushes"] += 1
+        self.stats["rows"] += len(views) + len(dirty)
+
+    def prune(self, today):
+        """Kechagi (yozib bo'lingan) kunlik yozuvlarni tashlash"""
+        for user_id in [u for u, (date, _) in self._daily.items() if date != today and u not in self._dirty]:
+            del self._daily[user_id]
+
+    async def run(self, adb):
+        while True:
+            await asyncio.sleep(VIEW_FLUSH_SECONDS)
+            try:
+                await self.flush(adb)
+                self.prune(_today())
+            except Exception as e:
+                logger.error(f"Hisoblagichlarni yozishda xato: {e}")
+
+    def snapshot(self):
+        return {
+            "pending_views": len(self._views),
+            "pending_daily": len(self._dirty),
+            "daily_users": len(self._daily),
+            **self.stats,
+        }
+
+
+view_counters = ViewCounters()
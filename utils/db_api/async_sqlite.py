@@ -0,0 +1,145 @@
+"""
+Asinxron DB qatlami - handlerlar va scheduler event loop'ni bloklamaydi
+- yozuvlar (commit, insert, executemany): bitta yozuvchi thread, asosiy Database ulanishi orqali navbat bilan
+- o'qishlar: alohida thread'lar, har birida o'z WAL ulanishi - yozuv yoki lock kutilayotganda ham
+  o'qishlar davom etadi. Yozuv await qilingandan keyin commit bo'lgan, keyingi o'qish uni ko'radi
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.db_api.sqlite import Database
+
+SQLITE_READER_THREADS = int(os.getenv("SQLITE_READER_THREADS", "2"))
+_LATENCY_SAMPLES = 1024
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+
+
+class _Lane:
+    """Executor va uning metrikalari: navbat chuqurligi, kutish va umumiy kechikish"""
+
+    def __init__(self, name, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"db-{name}")
+        self.pending = 0
+        self.stats = {"queries": 0, "errors": 0, "max_queue": 0}
+        self._waits = deque(maxlen=_LATENCY_SAMPLES)
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._waits.append(started - queued)
+                self._latencies.append(time.perf_counter() - queued)
+
+        self.pending += 1
+        self.stats["max_queue"] = max(self.stats["max_queue"], self.pending)
+        try:
+            return await loop.run_in_executor(self.executor, job)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.pending -= 1
+            self.stats["queries"] += 1
+
+    def snapshot(self):
+        latencies = list(self._latencies)
+        return {
+            "queue": self.pending,
+            **self.stats,
+            "wait_p95_ms": _percentile(list(self._waits), 0.95),
+            "p50_ms": _percentile(latencies, 0.5),
+            "p95_ms": _percentile(latencies, 0.95),
+        }
+
+
+class AsyncDatabase:
+    """
+    Database ustidan await qilinadigan execute / fetchone / fetchall / executemany.
+    Sinxron db (create_tables, startup yuklashlar) loop ishga tushishidan oldin ishlatilishi mumkin
+    """
+
+    def __init__(self, db: Database, readers=SQLITE_READER_THREADS):
+        self.db = db
+        self.writer = _Lane("write", 1)
+        # In-memory baza ulanishlar orasida bo'linmaydi - o'qishlar ham yozuvchi thread'da
+        if readers > 0 and db.path_to_db != ":memory:":
+            self.reader = _Lane("read", readers)
+        else:
+            self.reader = self.writer
+        self._local = threading.local()
+        self._reader_dbs = []
+        self._reader_lock = threading.Lock()
+
+    def _reader_db(self):
+        """Har bir o'quvchi thread'ning o'z ulanishi"""
+        if self.reader is self.writer:
+            return self.db
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = Database(path_to_db=self.db.path_to_db)
+            with self._reader_lock:
+                self._reader_dbs.append(db)
+        return db
+
+    def _read(self, fn, args):
+        return fn(self._reader_db(), *args)
+
+    # ---------- umumiy ----------
+    async def read(self, fn, *args):
+        """fn(db, *args) o'quvchi thread'da (masalan, watchlist.fetch_rows)"""
+        return await self.reader.run(self._read, fn, args)
+
+    async def write(self, fn, *args):
+        """fn(db, *args) yozuvchi thread'da"""
+        return await self.writer.run(fn, self.db, *args)
+
+    # ---------- Database bilan bir xil interfeys ----------
+    async def execute(self, sql: str, parameters: tuple = None, fetchone=False, fetchall=False, commit=False):
+        if (fetchone or fetchall) and not commit:
+            return await self.read(Database.execute, sql, parameters, fetchone, fetchall)
+        return await self.writer.run(self.db.execute, sql, parameters, fetchone, fetchall, commit)
+
+    async def fetchone(self, sql: str, parameters: tuple = None):
+        return await self.execute(sql, parameters, fetchone=True)
+
+    async def fetchall(self, sql: str, parameters: tuple = None):
+        return await self.execute(sql, parameters, fetchall=True)
+
+    async def executemany(self, sql: str, seq_of_parameters):
+        return await self.writer.run(self.db.executemany, sql, list(seq_of_parameters))
+
+    async def insert(self, sql: str, parameters: tuple = None):
+        return await self.writer.run(self.db.insert, sql, parameters)
+
+    def close(self):
+        """Navbatdagi so'rovlar bajarilib bo'lgach ulanishlarni yopish"""
+        self.writer.executor.shutdown(wait=True)
+        if self.reader is not self.writer:
+            self.reader.executor.shutdown(wait=True)
+        with self._reader_lock:
+            for db in self._reader_dbs:
+                db.close()
+            self._reader_dbs = []
+        self.db.close()
+
+    def snapshot(self):
+        return {
+            "write": self.writer.snapshot(),
+            "read": self.reader.snapshot() if self.reader is not self.writer else None,
+        }
@@ -0,0 +1,93 @@
+"""
+Database micro-benchmark: har so'rovda yangi ulanish (eski) va doimiy WAL ulanish (yangi)
+Ishga tushirish: python -m utils.db_api.bench [so'rovlar_soni]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from utils.db_api.sqlite import Database
+
+
+class PerCallDatabase(Database):
+    """Eski xatti-harakat: har execute() uchun sqlite3.connect + close"""
+
+    def execute(self, sql, parameters=None, fetchone=False, fetchall=False, commit=False):
+        connection = sqlite3.connect(self.path_to_db)
+        cursor = connection.cursor()
+        data = None
+        cursor.execute(sql, parameters or ())
+        if commit:
+            connection.commit()
+        if fetchall:
+            data = cursor.fetchall()
+        if fetchone:
+            data = cursor.fetchone()
+        connection.close()
+        return data
+
+    def create_tables(self):
+        """Eski sxema oddiy sqlite3.connect bilan - migratsiya va WAL pragmasisiz"""
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS Users (
+                id INTEGER PRIMARY KEY,
+                phone TEXT,
+                username TEXT,
+                full_name TEXT,
+                is_premium BOOLEAN DEFAULT 0,
+                premium_until DATETIME,
+                interval_min INTEGER DEFAULT 40,
+                view_count INTEGER DEFAULT 0,
+                daily_views INTEGER DEFAULT 0,
+                last_view_date TEXT
+            )
+        """, commit=True)
+        self.execute("CREATE TABLE IF NOT EXISTS CryptoPreferences (user_id INTEGER, coin_symbol TEXT)", commit=True)
+
+
+def _seed(db, users=1000):
+    db.create_tables()
+    for user_id in range(1, users + 1):
+        db.execute(
+            "INSERT INTO Users (id, phone, username, full_name, interval_min, is_premium, view_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, "998", "user", f"User {user_id}", 40, user_id % 10 == 0, 0), commit=True
+        )
+        db.execute("INSERT INTO CryptoPreferences (user_id, coin_symbol) VALUES (?, ?)", (user_id, "BTC"), commit=True)
+
+
+def _run(db, n, users=1000):
+    """search_coin'ga o'xshash aralash yuklama: 3 ta o'qish + 1 ta yozish"""
+    reads = writes = 0
+    started = time.perf_counter()
+    for i in range(n):
+        user_id = i % users + 1
+        db.execute("SELECT 1 FROM Users WHERE id=?", (user_id,), fetchone=True)
+        db.execute("SELECT is_premium, daily_views, last_view_date FROM Users WHERE id=?", (user_id,), fetchone=True)
+        db.execute("SELECT coin_symbol FROM CryptoPreferences WHERE user_id=?", (user_id,), fetchall=True)
+        reads += 3
+        if i % 4 == 0:
+            db.execute("UPDATE Users SET view_count = view_count + 1 WHERE id=?", (user_id,), commit=True)
+            writes += 1
+    elapsed = time.perf_counter() - started
+    return (reads + writes) / elapsed, reads / elapsed, writes / elapsed
+
+
+def main(n=5000):
+    with tempfile.TemporaryDirectory() as directory:
+        for name, cls in (("per-call connection", PerCallDatabase), ("persistent WAL", Database)):
+            db = cls(path_to_db=os.path.join(directory, f"{cls.__name__}.db"))
+            _seed(db)
+            if cls is PerCallDatabase:
+                # WAL fayl darajasida saqlanadi - eski bazada u yoqilmagan bo'lishi shart
+                mode = db.execute("PRAGMA journal_mode", fetchone=True)[0]
+                if mode != "delete":
+                    raise RuntimeError(f"per-call baza journal_mode={mode}, 'delete' kutilgan")
+            total, reads, writes = _run(db, n)
+            print(f"{name:22s} {total:10.0f} q/s  (read {reads:.0f}/s, write {writes:.0f}/s)")
+            db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,131 @@
+"""
+Versiyali sxema migratsiyalari. Joriy versiya schema_version jadvalida saqlanadi,
+har bir migratsiya o'z tranzaksiyasida versiya bilan birga qo'llanadi.
+Sxema joriy bo'lsa startup bitta SELECT bilan tugaydi - DDL bajarilmaydi
+"""
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Users ustunlari: eski bazalarda bo'lmasligi mumkin (avval ALTER TABLE ... try/except edi)
+_USERS_COLUMNS = {
+    "daily_views": "INTEGER DEFAULT 0",
+    "last_view_date": "TEXT",
+    "premium_plan_days": "INTEGER",
+    "premium_given_at": "DATETIME",
+    "last_payment_amount": "TEXT",
+    "last_payment_rate": "TEXT",
+    # Live ticker (bitta pin qilingan xabarni tahrirlash)
+    "live_ticker": "INTEGER DEFAULT 0",
+    "ticker_message_id": "INTEGER",
+}
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+
+
+def _baseline(connection):
+    """1: Users, CryptoPreferences, PriceAlerts - yangi va eski bazalar bir xil holatga keladi"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS Users (
+            id INTEGER PRIMARY KEY,
+            phone TEXT,
+            username TEXT,
+            full_name TEXT,
+            is_premium BOOLEAN DEFAULT 0,
+            premium_until DATETIME,
+            interval_min INTEGER DEFAULT 40,
+            view_count INTEGER DEFAULT 0
+        )
+    """)
+    existing = _columns(connection, "Users")
+    for column, definition in _USERS_COLUMNS.items():
+        if column not in existing:
+            connection.execute(f"ALTER TABLE Users ADD COLUMN {column} {definition}")
+
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS CryptoPreferences (
+            user_id INTEGER,
+            coin_symbol TEXT
+        )
+    """)
+    # Narx signallari (above / below / window)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS PriceAlerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            coin_symbol TEXT,
+            kind TEXT,
+            threshold REAL,
+            window_min INTEGER,
+            active BOOLEAN DEFAULT 1,
+            created_at DATETIME
+        )
+    """)
+
+
+def _preferences_key(connection):
+    """2: CryptoPreferences (user_id, coin_symbol) kaliti, takrorlar tozalanadi, coin indeksi"""
+    before = connection.execute("SELECT COUNT(*) FROM CryptoPreferences").fetchone()[0]
+    connection.execute("""
+        CREATE TABLE CryptoPreferences_new (
+            user_id INTEGER NOT NULL,
+            coin_symbol TEXT NOT NULL,
+            PRIMARY KEY (user_id, coin_symbol)
+        ) WITHOUT ROWID
+    """)
+    connection.execute("""
+        INSERT OR IGNORE INTO CryptoPreferences_new (user_id, coin_symbol)
+        SELECT user_id, coin_symbol FROM CryptoPreferences
+        WHERE user_id IS NOT NULL AND coin_symbol IS NOT NULL
+    """)
+    after = connection.execute("SELECT COUNT(*) FROM CryptoPreferences_new").fetchone()[0]
+    connection.execute("DROP TABLE CryptoPreferences")
+    connection.execute("ALTER TABLE CryptoPreferences_new RENAME TO CryptoPreferences")
+    # coin → obunachilar so'rovlari uchun
+    connection.execute("CREATE INDEX idx_preferences_coin ON CryptoPreferences (coin_symbol)")
+    if before != after:
+        logger.info(f"🧹 CryptoPreferences: {before - after} ta takror yoki bo'sh qator o'chirildi")
+
+
+# (versiya, tavsif, funksiya) - faqat oxiriga qo'shiladi, mavjudlari o'zgartirilmaydi
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "CryptoPreferences primary key", _preferences_key),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(connection):
+    try:
+        row = connection.execute("SELECT version FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def migrate(connection):
+    """Yetishmayotgan migratsiyalarni qo'llash; qo'llangan migratsiyalar soni"""
+    version = current_version(connection)
+    if version >= SCHEMA_VERSION:
+        return 0
+
+    applied = 0
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version:
+            continue
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            upgrade(connection)
+            connection.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            connection.execute("DELETE FROM schema_version")
+            connection.execute("INSERT INTO schema_version (version) VALUES (?)", (number,))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        applied += 1
+        logger.info(f"🗃 Migratsiya {number}: {description}")
+    return applied
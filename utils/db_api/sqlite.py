@@ -1,81 +1,104 @@
+import os
 import sqlite3
+import threading
+
+from utils.db_api.migrations import migrate
+
+# SQLite sozlamalari: WAL - o'quvchilar yozuvchini kutmaydi
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+
 
 class Database:
     def __init__(self, path_to_db="main.db"):
         self.path_to_db = path_to_db
+        self._connection = None
+        # Bitta doimiy ulanish - thread'lar (asyncio.to_thread) navbat bilan ishlatadi
+        self._lock = threading.RLock()
 
     @property
     def connection(self):
-        return sqlite3.connect(self.path_to_db)
+        """Doimiy ulanish (birinchi murojaatda ochiladi, pragmalar bir marta)"""
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path_to_db,
+                check_same_thread=False,
+                cached_statements=SQLITE_CACHED_STATEMENTS,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            connection.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+            connection.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+            connection.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            connection.execute("PRAGMA temp_store=MEMORY")
+            self._connection = connection
+        return self._connection
 
     def execute(self, sql: str, parameters: tuple = None, fetchone=False, fetchall=False, commit=False):
         if not parameters:
             parameters = ()
-        connection = self.connection
-        cursor = connection.cursor()
-        data = None
-        cursor.execute(sql, parameters)
+        with self._lock:
+            connection = self.connection
+            cursor = connection.cursor()
+            data = None
+            try:
+                cursor.execute(sql, parameters)
+
+                if commit:
+                    connection.commit()
+                if fetchall:
+                    data = cursor.fetchall()
+                if fetchone:
+                    data = cursor.fetchone()
+            finally:
+                cursor.close()
+                # Avvalgidek: commit qilinmagan o'zgarish saqlanmaydi (ulanish yopilganday)
+                if connection.in_transaction:
+                    connection.rollback()
+            return data
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def insert(self, sql: str, parameters: tuple = None):
+        """INSERT va yangi qatorning id'si (lastrowid)"""
+        with self._lock:
+            connection = self.connection
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, parameters or ())
+                connection.commit()
+                return cursor.lastrowid
+            finally:
+                cursor.close()
+                if connection.in_transaction:
+                    connection.rollback()
 
-        if commit:
-            connection.commit()
-        if fetchall:
-            data = cursor.fetchall()
-        if fetchone:
-            data = cursor.fetchone()
-        connection.close()
-        return data
+    def executemany(self, sql: str, seq_of_parameters, commit=True):
+        """Bir nechta qator bitta tranzaksiyada (batch yozuvlar uchun)"""
+        with self._lock:
+            connection = self.connection
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(sql, seq_of_parameters)
+                if commit:
+                    connection.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
+                if connection.in_transaction:
+                    connection.rollback()
 
     def create_tables(self):
-        # Users jadvalini yaratish
-        sql_users = """
-        CREATE TABLE IF NOT EXISTS Users (
-            id INTEGER PRIMARY KEY,
-            phone TEXT,
-            username TEXT,
-            full_name TEXT,
-            is_premium BOOLEAN DEFAULT 0,
-            premium_until DATETIME,
-            interval_min INTEGER DEFAULT 40,
-            view_count INTEGER DEFAULT 0
-        );
-        """
-        self.execute(sql_users, commit=True)
-        # Add daily tracking columns if they do not exist (for existing DBs)
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN daily_views INTEGER DEFAULT 0", commit=True)
-        except Exception:
-            pass
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN last_view_date TEXT", commit=True)
-        except Exception:
-            pass
-        # Add premium metadata columns for new installs or existing DBs
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN premium_plan_days INTEGER", commit=True)
-        except Exception:
-            pass
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN premium_given_at DATETIME", commit=True)
-        except Exception:
-            pass
-        # Track last payment amount and exchange rate for admin view
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN last_payment_amount TEXT", commit=True)
-        except Exception:
-            pass
-        try:
-            self.execute("ALTER TABLE Users ADD COLUMN last_payment_rate TEXT", commit=True)
-        except Exception:
-            pass
-        
-        # CryptoPreferences jadvalini yaratish
-        sql_prefs = """
-        CREATE TABLE IF NOT EXISTS CryptoPreferences (
-            user_id INTEGER,
-            coin_symbol TEXT
-        );
-        """
-        self.execute(sql_prefs, commit=True)
+        """Sxemani joriy versiyaga keltirish (utils/db_api/migrations.py)"""
+        with self._lock:
+            return migrate(self.connection)
 
     def clear_user_preferences(self, user_id):
         sql = "DELETE FROM CryptoPreferences WHERE user_id=?"
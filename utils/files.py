@@ -0,0 +1,26 @@
+"""
+Diskka xavfsiz yozish: vaqtinchalik fayl → flush + fsync → os.replace.
+Yozish yoki quvvat uzilishi o'rtasida eski fayl butun qoladi, yarim yozilgan JSON qolmaydi
+"""
+import json
+import os
+
+
+def write_json_atomic(path, data):
+    """data ni ixcham JSON sifatida path ga atomik yozish"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,228 @@
+"""
+Scheduler holati - har bir foydalanuvchi uchun oxirgi yuborilgan narxlar va keyingi muddat
+Ixcham saqlash: foydalanuvchi → slot, ommabop coinlar uchun array('d') ustun (NaN = yo'q),
+kam kuzatiladigan coinlar uchun {slot: narx} (ustun hamma slotlarga joy oladi).
+Diskka davriy snapshot - restartdan keyin "birinchi marta" xabarlar to'lqini bo'lmaydi
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+from array import array
+
+from utils.files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+PRICE_STATE_PATH = os.getenv("PRICE_STATE_PATH", "data/price_state.json")
+PRICE_STATE_SNAPSHOT_SECONDS = float(os.getenv("PRICE_STATE_SNAPSHOT_SECONDS", "60"))
+
+NAN = float("nan")
+# Coin obunachilari slotlarning 1/_DENSE_RATIO qismidan oshsa, dict → ustun
+# (dict yozuvi + float obyekti ~ 8 baytli ustun katagidan ~6 barobar katta)
+_DENSE_RATIO = 6
+
+
+def _value(x):
+    return None if math.isnan(x) else x
+
+
+class PriceState:
+    """
+    Ustunli jadval: _users[slot] - user_id, _next_due[slot] - unix timestamp,
+    _columns[coin][slot] yoki _sparse[coin][slot] - oxirgi USD narx.
+    Bo'shagan slotlar qayta ishlatiladi
+    """
+
+    def __init__(self, path=PRICE_STATE_PATH):
+        self.path = path
+        self._slots = {}
+        self._free = []
+        self._users = array("q")
+        self._next_due = array("d")
+        self._columns = {}
+        self._sparse = {}
+        self.stats = {"evicted_users": 0, "evicted_coins": 0, "saves": 0}
+
+    def _slot(self, user_id):
+        slot = self._slots.get(user_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self._users[slot] = user_id
+        else:
+            slot = len(self._users)
+            self._users.append(user_id)
+            self._next_due.append(NAN)
+            for column in self._columns.values():
+                column.append(NAN)
+        self._slots[user_id] = slot
+        return slot
+
+    # ---------- oxirgi narxlar ----------
+    def get(self, user_id, coin):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return None
+        column = self._columns.get(coin)
+        if column is not None:
+            return _value(column[slot])
+        return self._sparse.get(coin, {}).get(slot)
+
+    def set(self, user_id, coin, price):
+        slot = self._slot(user_id)
+        column = self._columns.get(coin)
+        if column is not None:
+            column[slot] = price
+            return
+        sparse = self._sparse.setdefault(coin, {})
+        sparse[slot] = price
+        if len(sparse) * _DENSE_RATIO >= len(self._users):
+            self._densify(coin)
+
+    def _densify(self, coin):
+        column = self._columns[coin] = array("d", [NAN]) * len(self._users)
+        for slot, price in self._sparse.pop(coin).items():
+            column[slot] = price
+
+    # ---------- keyingi muddat ----------
+    def next_due(self, user_id):
+        slot = self._slots.get(user_id)
+        return None if slot is None else _value(self._next_due[slot])
+
+    def set_next_due(self, user_id, due):
+        self._next_due[self._slot(user_id)] = due
+
+    def scheduled(self):
+        """(user_id, due) - rejadagi barcha foydalanuvchilar"""
+        for user_id, slot in self._slots.items():
+            due = self._next_due[slot]
+            if not math.isnan(due):
+                yield user_id, due
+
+    # ---------- tozalash ----------
+    def evict_user(self, user_id):
+        slot = self._slots.pop(user_id, None)
+        if slot is None:
+            return
+        self._users[slot] = 0
+        self._next_due[slot] = NAN
+        for column in self._columns.values():
+            column[slot] = NAN
+        for sparse in self._sparse.values():
+            sparse.pop(slot, None)
+        self._free.append(slot)
+        self.stats["evicted_users"] += 1
+
+    def retain_user(self, user_id, coins):
+        """Foydalanuvchi endi kuzatmaydigan coinlar narxini o'chirish"""
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return
+        for coin, column in self._columns.items():
+            if coin not in coins:
+                column[slot] = NAN
+        for coin, sparse in self._sparse.items():
+            if coin not in coins:
+                sparse.pop(slot, None)
+
+    def retain(self, watchlist):
+        """Kuzatuvdan chiqqan foydalanuvchilar va hech kim kuzatmaydigan coinlarni tashlash"""
+        for user_id in [u for u in self._slots if not watchlist.coins_of(u)]:
+            self.evict_user(user_id)
+        for table in (self._columns, self._sparse):
+            for coin in [c for c in table if not watchlist.subscribers(c)]:
+                del table[coin]
+                self.stats["evicted_coins"] += 1
+
+    # ---------- disk ----------
+    def _dump(self):
+        """Faqat band slotlar, zich tartibda (restore'da slotlar ixchamlashadi)"""
+        users = list(self._slots.items())
+        prices = {
+            coin: [_value(column[slot]) for _, slot in users]
+            for coin, column in self._columns.items()
+        }
+        for coin, sparse in self._sparse.items():
+            prices[coin] = [sparse.get(slot) for _, slot in users]
+        return {
+            "users": [user_id for user_id, _ in users],
+            "next_due": [_value(self._next_due[slot]) for _, slot in users],
+            "prices": prices,
+        }
+
+    def _write(self, data):
+        write_json_atomic(self.path, data)
+
+    def save(self):
+        self._write(self._dump())
+        self.stats["saves"] += 1
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Narx holatini o'qishda xato: {e}")
+            return False
+
+        users = data.get("users", [])
+        self._slots = {user_id: slot for slot, user_id in enumerate(users)}
+        self._free = []
+        self._users = array("q", users)
+        self._next_due = array("d", (NAN if x is None else x for x in data.get("next_due", [])))
+        if len(self._next_due) != len(users):
+            self._next_due = array("d", [NAN]) * len(users)
+        self._columns = {}
+        self._sparse = {}
+        for coin, values in data.get("prices", {}).items():
+            if len(values) != len(users):
+                continue
+            self._sparse[coin] = {slot: x for slot, x in enumerate(values) if x is not None}
+            if len(self._sparse[coin]) * _DENSE_RATIO >= len(users):
+                self._densify(coin)
+        logger.info(
+            f"🗂 Narx holati diskdan yuklandi: {len(users)} foydalanuvchi, "
+            f"{len(self._columns) + len(self._sparse)} coin"
+        )
+        return True
+
+    async def run(self):
+        """Davriy snapshot: holat loop ichida olinadi, yozish thread'da"""
+        while True:
+            await asyncio.sleep(PRICE_STATE_SNAPSHOT_SECONDS)
+            try:
+                await asyncio.to_thread(self._write, self._dump())
+                self.stats["saves"] += 1
+            except Exception as e:
+                logger.error(f"Narx holatini saqlashda xato: {e}")
+
+    def snapshot(self):
+        pairs = sum(
+            1 for column in self._columns.values() for value in column if not math.isnan(value)
+        ) + sum(len(sparse) for sparse in self._sparse.values())
+        memory = (
+            sys.getsizeof(self._slots) + sys.getsizeof(self._columns) + sys.getsizeof(self._sparse)
+            + sys.getsizeof(self._users) + sys.getsizeof(self._next_due)
+            + sum(sys.getsizeof(column) for column in self._columns.values())
+            # float obyektlari (24 bayt) ham hisobga olinadi
+            + sum(sys.getsizeof(sparse) + 24 * len(sparse) for sparse in self._sparse.values())
+        )
+        return {
+            "users": len(self._slots),
+            "coins": len(self._columns) + len(self._sparse),
+            "dense_coins": len(self._columns),
+            "pairs": pairs,
+            "slots": len(self._users),
+            "bytes": memory,
+            "bytes_per_pair": round(memory / pairs, 1) if pairs else None,
+            **self.stats,
+        }
+
+
+price_state = PriceState()
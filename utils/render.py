@@ -0,0 +1,180 @@
+"""
+Narx xabarlarini formatlash - coin bloklari bir marta formatlanadi va keshlanadi
+Kalit: (blok turi, coin, narx versiyasi, til). Bitta tickda bir coin minglab
+foydalanuvchiga bir xil - faqat o'zgarish foizi qatori har xil
+"""
+import os
+
+from utils.alerts import ABOVE, BELOW
+
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "20000"))
+DEFAULT_LOCALE = "uz"
+
+LABELS = {
+    "uz": {
+        "changes": "📊 <b>Narx o'zgarishlari</b>\n\n",
+        "next_check": "🕒 <i>Keyingi tekshirish: {interval}s</i>",
+        "ticker": "📌 <b>Live narxlar</b>\n\n",
+        "ticker_footer": "🕒 <i>Yangilandi: {time} · har {interval}s</i>",
+        "uzs": "so'm",
+    },
+}
+
+
+def format_price(value, currency='USD'):
+    """Format small prices with adaptive precision to avoid 0.0000 output.
+    currency: 'USD', 'RUB', or 'UZS'
+    """
+    try:
+        v = float(value)
+    except Exception:
+        return "N/A"
+
+    # USD formatting
+    if currency == 'USD':
+        if v >= 1:
+            return f"${v:,.2f}"
+        if v >= 0.01:
+            return f"${v:,.4f}"
+        if v >= 0.0001:
+            return f"${v:,.6f}"
+        return f"${v:.8f}"
+
+    # RUB formatting
+    if currency == 'RUB':
+        if v >= 1:
+            return f"{v:,.2f} ₽"
+        if v >= 0.01:
+            return f"{v:,.4f} ₽"
+        return f"{v:.6f} ₽"
+
+    # UZS formatting (show integer part if large)
+    if currency == 'UZS':
+        if v >= 1:
+            return f"{int(round(v)): ,d} so'm".replace(' ,', ',')
+        return f"{v:.2f} so'm"
+
+    return str(value)
+
+
+def price_version(price):
+    """Narx dict'ining versiyasi - qiymatlar o'zgarmasa, formatlangan matn ham o'zgarmaydi"""
+    return price['usd'], price.get('uzs'), price.get('rub')
+
+
+def _watch_block(coin, price, locale):
+    """Scheduler xabari uchun: (emoji'dan keyingi sarlavha + USD, fiat qatorlar)"""
+    usd = price['usd']
+    # Juda kichik narxlarni to'g'ri ko'rsatish
+    if usd < 0.01:
+        usd_str = f"${usd:.8f}"
+    elif usd < 1:
+        usd_str = f"${usd:.6f}"
+    else:
+        usd_str = f"${usd:,.4f}"
+
+    head = f" <b>{coin}</b>\n   💵 {usd_str}\n"
+    fiat = f"   🇺🇿 {price['uzs']:,.2f} {LABELS[locale]['uzs']}\n   🇷🇺 {price['rub']:,.4f} ₽\n\n"
+    return head, fiat
+
+
+def _search_card(coin, price, locale):
+    usd_str = format_price(price.get('usd', 0), 'USD')
+    rub_str = format_price(price.get('rub', 0), 'RUB')
+    uzs_str = format_price(price.get('uzs', 0), 'UZS')
+    return f"💰 <b>{coin}</b>\n\n💵 USD: <code>{usd_str}</code>\n🇷🇺 RUB: <code>{rub_str}</code>\n🇺🇿 UZS: <code>{uzs_str}</code>"
+
+
+class FragmentCache:
+    """
+    Formatlangan bloklar keshi. new_tick() oldingi tickda ishlatilmagan
+    bloklarni tashlaydi - eski narx versiyalari yig'ilib qolmaydi
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def new_tick(self):
+        self._entries = {
+            key: entry for key, entry in self._entries.items() if entry[0] == self._generation
+        }
+        self._generation += 1
+
+    def get(self, build, coin, price, locale=DEFAULT_LOCALE):
+        key = (build.__name__, coin, price_version(price), locale)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            if entry[0] != self._generation:
+                self._entries[key] = (self._generation, entry[1])
+            return entry[1]
+
+        self.stats["misses"] += 1
+        if len(self._entries) >= self.max_entries:
+            self.new_tick()
+        value = build(coin, price, locale)
+        self._entries[key] = (self._generation, value)
+        return value
+
+    def snapshot(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else None,
+        }
+
+
+fragments = FragmentCache()
+
+
+def _render_lines(parts, message_lines, locale):
+    for line in message_lines:
+        head, fiat = fragments.get(_watch_block, line['coin'], line['price'], locale)
+        parts.append(line['emoji'])
+        parts.append(head)
+        if line['change'] is not None:
+            parts.append(f"   📊 {line['sign']}{line['change']:.2f}%\n")
+        parts.append(fiat)
+
+
+def render_price_message(message_lines, interval_sec, locale=DEFAULT_LOCALE):
+    """O'zgarishlar xabarini keshlangan bloklardan yig'ish"""
+    labels = LABELS[locale]
+    parts = [labels["changes"]]
+    _render_lines(parts, message_lines, locale)
+    parts.append(labels["next_check"].format(interval=interval_sec))
+    return "".join(parts)
+
+
+def render_ticker(message_lines, interval_sec, updated, locale=DEFAULT_LOCALE):
+    """Live ticker: foydalanuvchining barcha coinlari (o'zgarganlari foiz bilan)"""
+    labels = LABELS[locale]
+    parts = [labels["ticker"]]
+    _render_lines(parts, message_lines, locale)
+    parts.append(labels["ticker_footer"].format(time=updated, interval=interval_sec))
+    return "".join(parts)
+
+
+def render_search_card(coin, price, locale=DEFAULT_LOCALE):
+    """search_coin javobi (USD / RUB / UZS)"""
+    return fragments.get(_search_card, coin, price, locale)
+
+
+def render_alert(alert, price, base):
+    """Ishlagan signal xabari"""
+    if alert.kind == ABOVE:
+        head = f"🚀 <b>{alert.coin}</b> {format_price(alert.threshold)} dan oshdi!"
+    elif alert.kind == BELOW:
+        head = f"🔻 <b>{alert.coin}</b> {format_price(alert.threshold)} dan tushdi!"
+    else:
+        change = (price - base) / base * 100
+        sign = "+" if change > 0 else ""
+        head = (
+            f"⚡ <b>{alert.coin}</b> {alert.window_min} daqiqada {sign}{change:.2f}%\n"
+            f"   {format_price(base)} → {format_price(price)}"
+        )
+    return f"{head}\n\n💵 Hozir: <code>{format_price(price)}</code>\n🔔 <i>{alert.describe()}</i>"
@@ -2,16 +2,146 @@
 Avto-xabardorlik tizimi - FAQAT narx o'zgarganda yuboradi
 """
 import asyncio
+import heapq
 import logging
-from datetime import datetime, timedelta
-from loader import bot, db
+import os
+import time
+from datetime import datetime
+from aiogram.exceptions import TelegramBadRequest
+from loader import adb, sender
 from utils.api.crypto import get_real_prices
+from utils.api.ratelimit import INTERACTIVE, BACKGROUND
+from utils.watchlist import watchlist
+from utils.price_state import price_state
+from utils.render import fragments, render_price_message, render_alert, render_ticker
+from utils.alerts import alerts, WINDOW
 
 logger = logging.getLogger(__name__)
 
-# Har bir foydalanuvchi uchun oxirgi narxlar
-user_last_prices = {}
-user_next_send = {}
+# Bir-biriga yaqin (shu oyna ichidagi) muddatlar bitta tickda birlashtiriladi
+SCHEDULER_BATCH_WINDOW = float(os.getenv("SCHEDULER_BATCH_WINDOW", "1"))
+# Rejani kuzatuv indeksi bilan solishtirish davri (faqat xotirada)
+SCHEDULER_RECONCILE_SECONDS = float(os.getenv("SCHEDULER_RECONCILE_SECONDS", "60"))
+# Narx signallarini tekshirish davri
+ALERT_CHECK_SECONDS = float(os.getenv("ALERT_CHECK_SECONDS", "15"))
+
+# Oxirgi narxlar va keyingi tekshirish vaqtlari (unix timestamp) - price_state'da
+
+# Min-heap: (due, user_id). Eskirgan yozuvlar price_state bilan solishtirib tashlanadi
+_due_heap = []
+_wakeup = asyncio.Event()
+
+scheduler_stats = {
+    "ticks": 0, "users": 0, "skipped": 0, "lag": 0.0, "max_lag": 0.0,
+    "messages": 0, "ticker_edits": 0, "ticker_messages": 0,
+}
+
+# Live ticker: {user_id: task} - tahrirlash / yangi xabar hali tugamagan foydalanuvchilar
+_ticker_pending = {}
+
+# Narx manbasi: None - get_real_prices; sharding rejimida leader snapshotlari
+_price_source = None
+
+
+def watched_symbols():
+    """Kuzatuvdagi va signal qo'yilgan barcha coinlar (ticker stream obunalari uchun)"""
+    return watchlist.coins() | alerts.coins()
+
+
+def _schedule(user_id, due):
+    price_state.set_next_due(user_id, due)
+    heapq.heappush(_due_heap, (due, user_id))
+
+
+def schedule_user(user_id):
+    """Kuzatuv ro'yxati o'zgardi - rejada bo'lmasa darhol tekshirish"""
+    if price_state.next_due(user_id) is None:
+        _schedule(user_id, time.time())
+        _wakeup.set()
+
+
+def update_user_interval(user_id, interval_sec):
+    """Interval o'zgardi - yangi interval eskisidan oldin tugasa, muddat yaqinlashadi"""
+    due = time.time() + interval_sec
+    current = price_state.next_due(user_id)
+    if current is None or due < current:
+        _schedule(user_id, due)
+        _wakeup.set()
+
+
+def _on_watchlist_change(user_id):
+    """
+    Indeks o'zgardi: yangi kuzatuvchi rejaga qo'shiladi, yangi coin qo'shilgan bo'lsa
+    darhol tekshiriladi, interval qisqargan bo'lsa muddat yaqinlashadi,
+    coinlari qolmagani chiqariladi
+    """
+    coins = watchlist.coins_of(user_id)
+    if coins:
+        price_state.retain_user(user_id, coins)
+        if price_state.next_due(user_id) is None:
+            schedule_user(user_id)
+        elif any(price_state.get(user_id, coin) is None for coin in coins):
+            # Oxirgi narxi yo'q coin - navbatdagi muddatni kutmasdan
+            _schedule(user_id, time.time())
+            _wakeup.set()
+        else:
+            update_user_interval(user_id, watchlist.interval(user_id))
+    else:
+        price_state.evict_user(user_id)
+
+
+def set_price_source(source):
+    """source(coins, premium_coins) -> {coin: narx} (awaitable); None - to'g'ridan-to'g'ri API"""
+    global _price_source
+    _price_source = source
+
+
+def _pop_due(now):
+    """Muddati kelgan (va oyna ichidagi) foydalanuvchilar: {user_id: due}"""
+    due_users = {}
+    while _due_heap and _due_heap[0][0] <= now + SCHEDULER_BATCH_WINDOW:
+        due, user_id = heapq.heappop(_due_heap)
+        if price_state.next_due(user_id) == due:
+            due_users[user_id] = due
+    return due_users
+
+
+def _reschedule_unprocessed(due_users):
+    """
+    Tick yarmida xato bo'lsa (snapshot, signallar) - heap'dan olingan, lekin qayta
+    rejalashtirilmagan foydalanuvchilar interval bilan orqaga qaytariladi
+    """
+    now = time.time()
+    for user_id, due in due_users.items():
+        if price_state.next_due(user_id) != due:
+            continue
+        if watchlist.coins_of(user_id):
+            _schedule(user_id, now + watchlist.interval(user_id))
+        else:
+            price_state.evict_user(user_id)
+
+
+def reconcile_users():
+    """Kuzatuvda coin bor foydalanuvchilarni reja bilan solishtirish (indeks bo'yicha)"""
+    watching = watchlist.watching_users()
+    scheduled = dict(price_state.scheduled())
+    now = time.time()
+    
+    for user_id in watching - scheduled.keys():
+        _schedule(user_id, now)
+    # Muddati bor, lekin heap'da mos yozuvi yo'q foydalanuvchilar ham tiklanadi
+    queued = {user_id for due, user_id in _due_heap if scheduled.get(user_id) == due}
+    for user_id in scheduled.keys() - queued:
+        if user_id in watching:
+            _schedule(user_id, max(now, scheduled[user_id]))
+    # Ketgan foydalanuvchilar va hech kim kuzatmaydigan coinlar holatdan chiqariladi
+    price_state.retain(watchlist)
+
+
+def restore_schedule():
+    """Diskdan tiklangan muddatlarni heap'ga qo'yish (warm restart)"""
+    for user_id, due in price_state.scheduled():
+        heapq.heappush(_due_heap, (due, user_id))
 
 
 def calculate_price_change(old_price, new_price):
@@ -25,147 +155,278 @@ def calculate_price_change(old_price, new_price):
     return abs(change)
 
 
+async def fetch_snapshot(coins, premium_coins):
+    """
+    Tick uchun narxlar: har bir coin bir marta so'raladi.
+    Premium foydalanuvchilar kuzatadigan coinlar interactive navbatda
+    """
+    if _price_source is not None:
+        return await _price_source(coins, premium_coins)
+    
+    premium = sorted(coins & premium_coins)
+    regular = sorted(coins - premium_coins)
+    
+    premium_prices, regular_prices = await asyncio.gather(
+        # Tick intervali cache TTL'dan uzun - eskirgan narx bir interval kechikib xabar beradi
+        get_real_prices(premium, priority=INTERACTIVE, allow_stale=False) if premium else asyncio.sleep(0, []),
+        get_real_prices(regular, priority=BACKGROUND, allow_stale=False) if regular else asyncio.sleep(0, []),
+    )
+    
+    snapshot = dict(zip(premium, premium_prices))
+    snapshot.update(zip(regular, regular_prices))
+    return snapshot
+
+
+def diff_user_prices(user_id, coin_list, snapshot):
+    """
+    Umumiy snapshot bo'yicha foydalanuvchining o'zgarishlari (oxirgi narxlar yangilanadi)
+    """
+    message_lines = []
+    
+    for coin in coin_list:
+        price = snapshot.get(coin)
+        if not price:
+            continue
+        
+        new_price = price['usd']
+        old_price = price_state.get(user_id, coin)
+        
+        # Narx o'zgarishini hisoblash (minimal 0.01% o'zgarish)
+        if old_price:
+            change_percent = calculate_price_change(old_price, new_price)
+            
+            # 0.01% dan katta o'zgarish bo'lsa
+            if change_percent >= 0.01:
+                price_diff = new_price - old_price
+                message_lines.append({
+                    'coin': coin,
+                    'emoji': "📈" if price_diff > 0 else "📉",
+                    'price': price,
+                    'change': change_percent,
+                    'diff': price_diff,
+                    'sign': "+" if price_diff > 0 else ""
+                })
+        else:
+            # Birinchi marta - har doim yuborish
+            message_lines.append({
+                'coin': coin,
+                'emoji': "💰",
+                'price': price,
+                'change': None,
+                'diff': None,
+                'sign': ""
+            })
+        
+        # Oxirgi narxni saqlash
+        price_state.set(user_id, coin, new_price)
+    
+    return message_lines
+
+
 async def send_price_updates():
     """
-    Narxlarni doimiy tekshirish va o'zgarishda xabar yuborish
+    Narxlarni tekshirish va o'zgarishda xabar yuborish.
+    Muddatlar min-heap'da: eng yaqin muddatgacha uxlaydi, handlerlar
+    (kuzatuv / interval o'zgarishi) erta uyg'otadi
     """
+    last_reconcile = 0.0
+    restore_schedule()
+    
     while True:
+        _wakeup.clear()
         try:
-            # Kuzatuvda coin bor foydalanuvchilarni olish
-            users = db.execute(
-                "SELECT id, interval_min FROM Users WHERE id IN (SELECT DISTINCT user_id FROM CryptoPreferences)",
-                fetchall=True
-            )
-            
-            if not users:
-                await asyncio.sleep(20)
-                continue
+            now = time.time()
+            if now - last_reconcile >= SCHEDULER_RECONCILE_SECONDS:
+                reconcile_users()
+                last_reconcile = now
             
-            current_time = datetime.now()
-            
-            for user in users:
-                user_id = user[0]
-                interval_sec = user[1]
-                
-                # Keyingi tekshirish vaqtini sozlash
-                if user_id not in user_next_send:
-                    user_next_send[user_id] = current_time
-                
-                # Vaqt yetib kelganmi?
-                if current_time >= user_next_send[user_id]:
-                    try:
-                        # Coinlarni olish
-                        coins = db.execute(
-                            "SELECT coin_symbol FROM CryptoPreferences WHERE user_id=?",
-                            (user_id,),
-                            fetchall=True
-                        )
-                        
-                        if not coins:
-                            continue
-                        
-                        coin_list = [c[0] for c in coins]
-                        
-                        # Yangi narxlarni olish
-                        new_prices = get_real_prices(coin_list)
-                        
-                        # Foydalanuvchining oxirgi narxlarini olish
-                        if user_id not in user_last_prices:
-                            user_last_prices[user_id] = {}
-                        
-                        # O'zgarishlarni tekshirish
-                        changes_detected = []
-                        message_lines = []
-                        
-                        for i, coin in enumerate(coin_list):
-                            if not new_prices[i]:
-                                continue
-                            
-                            new_price = new_prices[i]['usd']
-                            old_price = user_last_prices[user_id].get(coin)
-                            
-                            # Narx o'zgarishini hisoblash (minimal 0.01% o'zgarish)
-                            if old_price:
-                                change_percent = calculate_price_change(old_price, new_price)
-                                
-                                # 0.01% dan katta o'zgarish bo'lsa
-                                if change_percent >= 0.01:
-                                    price_diff = new_price - old_price
-                                    emoji = "📈" if price_diff > 0 else "📉"
-                                    sign = "+" if price_diff > 0 else ""
-                                    
-                                    changes_detected.append(coin)
-                                    message_lines.append({
-                                        'coin': coin,
-                                        'emoji': emoji,
-                                        'price': new_prices[i],
-                                        'change': change_percent,
-                                        'diff': price_diff,
-                                        'sign': sign
-                                    })
-                            else:
-                                # Birinchi marta - har doim yuborish
-                                changes_detected.append(coin)
-                                message_lines.append({
-                                    'coin': coin,
-                                    'emoji': "💰",
-                                    'price': new_prices[i],
-                                    'change': None,
-                                    'diff': None,
-                                    'sign': ""
-                                })
-                            
-                            # Oxirgi narxni saqlash
-                            user_last_prices[user_id][coin] = new_price
-                        
-                        # Agar o'zgarish bo'lsa - xabar yuborish
-                        if changes_detected:
-                            message_text = "📊 <b>Narx o'zgarishlari</b>\n\n"
-                            
-                            for line in message_lines:
-                                p = line['price']
-                                
-                                # Juda kichik narxlarni to'g'ri ko'rsatish
-                                if p['usd'] < 0.01:
-                                    usd_str = f"${p['usd']:.8f}"
-                                elif p['usd'] < 1:
-                                    usd_str = f"${p['usd']:.6f}"
-                                else:
-                                    usd_str = f"${p['usd']:,.4f}"
-                                
-                                message_text += f"{line['emoji']} <b>{line['coin']}</b>\n"
-                                message_text += f"   💵 {usd_str}\n"
-                                
-                                if line['change'] is not None:
-                                    message_text += f"   📊 {line['sign']}{line['change']:.2f}%\n"
-                                
-                                message_text += f"   🇺🇿 {p['uzs']:,.2f} so'm\n"
-                                message_text += f"   🇷🇺 {p['rub']:,.4f} ₽\n\n"
-                            
-                            message_text += f"🕒 <i>Keyingi tekshirish: {interval_sec}s</i>"
-                            
-                            await bot.send_message(user_id, message_text, parse_mode="HTML")
-                            logger.info(f"✅ Sent {len(changes_detected)} price changes to user {user_id}")
-                        else:
-                            # O'zgarish yo'q - silent log
-                            logger.debug(f"No changes for user {user_id}")
-                        
-                        # Keyingi tekshirish vaqti
-                        user_next_send[user_id] = current_time + timedelta(seconds=interval_sec)
-                        
-                    except Exception as e:
-                        logger.error(f"Error for user {user_id}: {e}")
-                        user_next_send[user_id] = current_time + timedelta(minutes=5)
+            due_users = _pop_due(now)
+            if due_users:
+                try:
+                    await process_due_users(due_users)
+                finally:
+                    _reschedule_unprocessed(due_users)
             
         except Exception as e:
             logger.error(f"Scheduler error: {e}")
         
-        # Har 20 soniyada tekshirish
-        await asyncio.sleep(20)
+        # Keyingi eng yaqin muddat (yoki reconcile) gacha uxlash
+        timeout = last_reconcile + SCHEDULER_RECONCILE_SECONDS - time.time()
+        if _due_heap:
+            timeout = min(timeout, _due_heap[0][0] - time.time())
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def process_due_users(due_users):
+    """
+    Vaqti kelgan foydalanuvchilar uchun bitta snapshot va xabarlar
+    """
+    now = time.time()
+    scheduler_stats["ticks"] += 1
+    # Tickdagi eng kechikkan muddat
+    scheduler_stats["lag"] = max(0.0, now - min(due_users.values()))
+    
+    # Kuzatuv ro'yxatlari xotiradagi indeksdan - tickda DB o'qilmaydi
+    user_coins = {}
+    coins = set()
+    premium_coins = set()
+    for user_id in due_users:
+        coin_list = sorted(watchlist.coins_of(user_id))
+        if not coin_list:
+            continue
+        user_coins[user_id] = coin_list
+        coins.update(coin_list)
+        if watchlist.is_premium(user_id):
+            premium_coins.update(coin_list)
+    
+    # Har bir coin bir marta
+    snapshot = await fetch_snapshot(coins, premium_coins)
+    # Yangi snapshot - o'zgargan coinlar bloklari bir marta qayta formatlanadi
+    fragments.new_tick()
+    await dispatch_alerts(snapshot)
+    logger.info(f"📊 Tick: {len(due_users)} foydalanuvchi, {len(coins)} coin")
+    
+    for user_id, due in due_users.items():
+        coin_list = user_coins.get(user_id)
+        if not coin_list:
+            # Endi kuzatmaydi - rejadan chiqarish
+            price_state.evict_user(user_id)
+            continue
+        
+        interval_sec = watchlist.interval(user_id)
+        scheduler_stats["users"] += 1
+        scheduler_stats["max_lag"] = max(scheduler_stats["max_lag"], now - due)
+        
+        try:
+            live_message = watchlist.ticker_message(user_id)
+            if live_message is not None:
+                # Live ticker - oldingi tahrirlash tugamagan bo'lsa, bu tick o'tkaziladi
+                if user_id not in _ticker_pending:
+                    message_lines = diff_user_prices(user_id, coin_list, snapshot)
+                    if message_lines or not live_message:
+                        text = render_ticker(
+                            ticker_lines(coin_list, message_lines, snapshot),
+                            interval_sec, datetime.now().strftime("%H:%M:%S")
+                        )
+                        _start_ticker_update(user_id, live_message, text)
+            else:
+                message_lines = diff_user_prices(user_id, coin_list, snapshot)
+                
+                # Agar o'zgarish bo'lsa - xabar yuborish
+                if message_lines:
+                    message_text = render_price_message(message_lines, interval_sec)
+                    await sender.send(user_id, message_text, parse_mode="HTML")
+                    scheduler_stats["messages"] += 1
+                    logger.info(f"✅ Queued {len(message_lines)} price changes for user {user_id}")
+                else:
+                    # O'zgarish yo'q - silent log
+                    logger.debug(f"No changes for user {user_id}")
+            
+            # Keyingi tekshirish vaqti - kechikkan tickler yig'ilmaydi, o'tkazib yuboriladi
+            next_due = due + interval_sec
+            if next_due <= time.time():
+                scheduler_stats["skipped"] += 1
+                next_due = time.time() + interval_sec
+            _schedule(user_id, next_due)
+            
+        except Exception as e:
+            logger.error(f"Error for user {user_id}: {e}")
+            _schedule(user_id, time.time() + 300)
+
+
+def ticker_lines(coin_list, message_lines, snapshot):
+    """Ticker uchun barcha coinlar: o'zgarganlari diff qatori bilan, qolganlari oddiy"""
+    changed = {line['coin']: line for line in message_lines}
+    lines = []
+    for coin in coin_list:
+        line = changed.get(coin)
+        if line is None and snapshot.get(coin):
+            line = {'coin': coin, 'emoji': "💰", 'price': snapshot[coin], 'change': None, 'diff': None, 'sign': ""}
+        if line is not None:
+            lines.append(line)
+    return lines
+
+
+def _start_ticker_update(user_id, message_id, text):
+    task = asyncio.create_task(_ticker_update(user_id, message_id, text))
+    _ticker_pending[user_id] = task
+
+    def done(task):
+        _ticker_pending.pop(user_id, None)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Live ticker {user_id}: {task.exception()}")
+
+    task.add_done_callback(done)
+
+
+async def _ticker_update(user_id, message_id, text):
+    """
+    Pin qilingan xabarni tahrirlash; xabar o'chirilgan bo'lsa yangisini yuborib pin qilish
+    """
+    if message_id:
+        try:
+            await (await sender.submit(
+                user_id, "edit_message_text", message_id=message_id, text=text, parse_mode="HTML"
+            ))
+            scheduler_stats["ticker_edits"] += 1
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                return
+            if "message to edit not found" not in e.message and "message can't be edited" not in e.message:
+                raise
+
+    message = await (await sender.send(user_id, text, parse_mode="HTML"))
+    scheduler_stats["ticker_messages"] += 1
+    await sender.submit(user_id, "pin_chat_message", message_id=message.message_id, disable_notification=True)
+    watchlist.set_ticker_message(user_id, message.message_id)
+    await adb.execute("UPDATE Users SET ticker_message_id=? WHERE id=?", (message.message_id, user_id), commit=True)
+
+
+async def dispatch_alerts(snapshot):
+    """
+    Snapshot narxlarini signal indeksidan o'tkazish - faqat chegarasi kesib o'tilganlar yuboriladi
+    """
+    finished = []
+    for coin, price in snapshot.items():
+        if not price or not alerts.has_coin(coin):
+            continue
+        for alert, base in alerts.update(coin, price['usd']):
+            if alert.kind != WINDOW:
+                finished.append((alert.id,))
+            try:
+                await sender.send(alert.user_id, render_alert(alert, price['usd'], base), parse_mode="HTML")
+                logger.info(f"🚨 Alert {alert.id} ({alert.describe()}) → {alert.user_id}")
+            except Exception as e:
+                logger.error(f"Alert {alert.id} yuborilmadi: {e}")
+
+    # Bir martalik signallar o'chiriladi
+    if finished:
+        await adb.executemany("UPDATE PriceAlerts SET active=0 WHERE id=?", finished)
+
+
+async def check_alerts():
+    """Signal qo'yilgan coinlarni har ALERT_CHECK_SECONDS da tekshirish"""
+    while True:
+        try:
+            coins = alerts.coins()
+            if coins:
+                premium_coins = {
+                    alert.coin for alert in alerts.active() if watchlist.is_premium(alert.user_id)
+                }
+                snapshot = await fetch_snapshot(coins, premium_coins)
+                await dispatch_alerts(snapshot)
+        except Exception as e:
+            logger.error(f"Alert check error: {e}")
+        await asyncio.sleep(ALERT_CHECK_SECONDS)
 
 
 async def start_scheduler():
     """Scheduler'ni ishga tushirish"""
     logger.info("🚀 Smart price notification system started!")
     logger.info("📊 Will notify ONLY when prices change (≥0.01%)")
-    await send_price_updates()
\ No newline at end of file
+    watchlist.listeners.append(_on_watchlist_change)
+    await asyncio.gather(send_price_updates(), check_alerts())
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+Chiquvchi Telegram xabarlar pipeline'i - cheklangan navbat va N ta sender worker
+Global (~30 xabar/s) va har bir chat uchun limit, TelegramRetryAfter hisobga olinadi
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+SENDER_WORKERS = int(os.getenv("SENDER_WORKERS", "8"))
+SENDER_QUEUE_SIZE = int(os.getenv("SENDER_QUEUE_SIZE", "5000"))
+SENDER_GLOBAL_RATE = float(os.getenv("SENDER_GLOBAL_RATE", "30"))
+SENDER_CHAT_INTERVAL = float(os.getenv("SENDER_CHAT_INTERVAL", "1.0"))
+SENDER_MAX_ATTEMPTS = int(os.getenv("SENDER_MAX_ATTEMPTS", "5"))
+
+
+class _Job:
+    __slots__ = ("chat_id", "method", "kwargs", "future", "attempts", "enqueued")
+
+    def __init__(self, chat_id, method, kwargs, future):
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.enqueued = time.monotonic()
+
+
+class _RateLimiter:
+    """Oddiy token bucket (soniyasiga rate ta)"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _consume_exception(future):
+    # Natijasi kutilmagan future'lar uchun "exception was never retrieved" ogohlantirishi bo'lmasin
+    if not future.cancelled():
+        future.exception()
+
+
+class MessagePipeline:
+    """
+    submit(chat_id, method, **kwargs) - bot.<method>(chat_id=..., **kwargs) ni navbatga qo'yadi
+    va natija uchun future qaytaradi (kutish shart emas)
+    """
+
+    def __init__(self, bot, workers=SENDER_WORKERS, queue_size=SENDER_QUEUE_SIZE,
+                 global_rate=SENDER_GLOBAL_RATE, chat_interval=SENDER_CHAT_INTERVAL,
+                 max_attempts=SENDER_MAX_ATTEMPTS):
+        self.bot = bot
+        self.workers = workers
+        self.queue_size = queue_size
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self._queue = None
+        self._limiter = None
+        self._tasks = []
+        self._chat_next = {}
+        self._paused_until = 0.0
+        self._latencies = deque(maxlen=500)
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "retry_after": 0}
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._limiter = _RateLimiter(self.global_rate)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"📤 Sender pipeline: {self.workers} worker, {self.global_rate:.0f} msg/s")
+
+    async def stop(self, timeout=10.0):
+        """Navbatdagi xabarlarni yuborib bo'lishga urinish, keyin workerlarni to'xtatish"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Sender: {self._queue.qsize()} ta xabar yuborilmay qoldi")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def submit(self, chat_id, method="send_message", **kwargs):
+        """Navbatga qo'yish (navbat to'la bo'lsa kutadi) - future qaytaradi"""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        await self._queue.put(_Job(chat_id, method, kwargs, future))
+        return future
+
+    async def send(self, chat_id, text, **kwargs):
+        """bot.send_message uchun qisqa yo'l"""
+        return await self.submit(chat_id, "send_message", text=text, **kwargs)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Sender worker xatosi: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _wait_turn(self, chat_id):
+        # RetryAfter paytida hamma kutadi
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        # Bitta chatga chat_interval da bittadan ko'p emas
+        now = time.monotonic()
+        ready = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, ready) + self.chat_interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+
+        await self._limiter.acquire()
+
+        if len(self._chat_next) > 10000:
+            now = time.monotonic()
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+
+    async def _process(self, job):
+        while True:
+            await self._wait_turn(job.chat_id)
+            job.attempts += 1
+            try:
+                result = await getattr(self.bot, job.method)(chat_id=job.chat_id, **job.kwargs)
+            except TelegramRetryAfter as e:
+                self.stats["retry_after"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"Sender: flood limit, {e.retry_after}s kutiladi")
+                if job.attempts < self.max_attempts:
+                    continue
+                return self._fail(job, e)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if job.attempts < self.max_attempts:
+                    self.stats["retried"] += 1
+                    await asyncio.sleep(min(30.0, 2 ** job.attempts) * (0.5 + random.random()))
+                    continue
+                return self._fail(job, e)
+            except Exception as e:
+                # Forbidden (bot bloklangan), BadRequest va h.k. - qayta urinilmaydi
+                return self._fail(job, e)
+
+            self.stats["sent"] += 1
+            self._latencies.append(time.monotonic() - job.enqueued)
+            if not job.future.done():
+                job.future.set_result(result)
+            return
+
+    def _fail(self, job, error):
+        self.stats["failed"] += 1
+        logger.debug(f"Sender: {job.method} {job.chat_id} yuborilmadi: {error}")
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def snapshot(self):
+        latencies = sorted(self._latencies)
+
+        def pct(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))] * 1000)
+
+        return {
+            "queue": self._queue.qsize() if self._queue else 0,
+            **self.stats,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+        }
@@ -0,0 +1,430 @@
+"""
+Ko'p jarayonli rejim (SCHEDULER_SHARDS=N, N >= 2):
+- bot jarayoni: faqat polling va handlerlar, o'zgarishlarni tegishli shardga uzatadi
+- leader jarayoni: narxlarni oladi va har bir workerga snapshot yuboradi
+- N ta scheduler worker: user_id % N bo'yicha o'z foydalanuvchilari, o'z Bot va sender pipeline'i
+Aloqa - multiprocessing navbatlari (tashqi broker kerak emas)
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_SHARDS = int(os.getenv("SCHEDULER_SHARDS", "0"))
+# Leader snapshot davri va workerlar coin ro'yxatini / metrikalarni yuborish davri
+SHARD_SNAPSHOT_SECONDS = float(os.getenv("SHARD_SNAPSHOT_SECONDS", "5"))
+SHARD_SYNC_SECONDS = float(os.getenv("SHARD_SYNC_SECONDS", "2"))
+SHARD_STATS_SECONDS = float(os.getenv("SHARD_STATS_SECONDS", "5"))
+# Yangi coin narxi uchun leader snapshotini kutish (birinchi xabar interval kutmasin)
+SHARD_FIRST_PRICE_WAIT = float(os.getenv("SHARD_FIRST_PRICE_WAIT", "3"))
+# Jarayonlar holatini tekshirish davri va qayta ishga tushirishlar orasidagi eng uzun pauza
+SHARD_SUPERVISE_SECONDS = float(os.getenv("SHARD_SUPERVISE_SECONDS", "5"))
+SHARD_RESTART_MAX_BACKOFF = float(os.getenv("SHARD_RESTART_MAX_BACKOFF", "60"))
+
+STOP = ("stop",)
+
+
+async def _queue_reader(queue, handle):
+    """Bloklovchi mp navbatini thread'da o'qish; STOP kelsa tugaydi"""
+    while True:
+        message = await asyncio.to_thread(queue.get)
+        if message == STOP:
+            return
+        try:
+            handle(message)
+        except Exception as e:
+            logger.error(f"Shard xabari xatosi {message[0]}: {e}")
+
+
+async def _serve(inbox, handle, tasks):
+    """
+    Navbatni STOP gacha o'qish. Fon tasklaridan biri tugab qolsa (kutilmagan xato)
+    jarayon xato bilan chiqadi - ShardCoordinator.supervise uni qayta ishga tushiradi
+    """
+    reader = asyncio.ensure_future(_queue_reader(inbox, handle))
+    done, _ = await asyncio.wait({reader, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+    if reader in done:
+        return reader.result()
+
+    failed = done.pop()
+    # O'quvchi thread queue.get da turibdi - STOP bilan bo'shatiladi
+    inbox.put(STOP)
+    await reader
+    name = failed.get_coro().__qualname__
+    error = None if failed.cancelled() else failed.exception()
+    logger.error(f"💥 Shard tasksi to'xtadi: {name}: {error!r}")
+    raise RuntimeError(f"{name} to'xtadi") from error
+
+
+# ==================== LEADER ====================
+def _leader_main(inbox, worker_inboxes, to_bot):
+    asyncio.run(_run_leader(inbox, worker_inboxes, to_bot))
+
+
+async def _run_leader(inbox, worker_inboxes, to_bot):
+    from utils.api.crypto import symbol_registry, close_session
+    from utils.api.fiat import fiat_rates
+    from utils.api.stream import ticker_stream, PRICE_STREAM_ENABLED
+    from utils.scheduler import fetch_snapshot
+
+    symbol_registry.load()
+    fiat_rates.load()
+
+    wanted = {}
+    changed = asyncio.Event()
+    stats = {"snapshots": 0, "coins": 0, "fetch_ms": 0, "errors": 0}
+
+    def handle(message):
+        # ("coins", shard, coins, premium_coins)
+        _, shard, coins, premium = message
+        wanted[shard] = (set(coins), set(premium))
+        changed.set()
+
+    def all_coins():
+        return set().union(*(coins for coins, _ in wanted.values())) if wanted else set()
+
+    async def publish():
+        while True:
+            changed.clear()
+            coins = all_coins()
+            if coins:
+                try:
+                    premium = set().union(*(p for _, p in wanted.values()))
+                    started = time.monotonic()
+                    snapshot = await fetch_snapshot(coins, premium)
+                    stats["fetch_ms"] = round((time.monotonic() - started) * 1000)
+                    stats["snapshots"] += 1
+                    stats["coins"] = len(coins)
+                    now = time.time()
+                    # Har bir workerga faqat o'zi kuzatadigan coinlar
+                    for shard, (shard_coins, _) in wanted.items():
+                        part = {coin: snapshot.get(coin) for coin in shard_coins}
+                        worker_inboxes[shard].put(("snapshot", now, part))
+                    to_bot.put(("leader", dict(stats)))
+                except Exception:
+                    stats["errors"] += 1
+                    logger.exception("Leader snapshot xatosi")
+            try:
+                await asyncio.wait_for(changed.wait(), SHARD_SNAPSHOT_SECONDS)
+                # Yangi coinlar - biroz kutib, bir nechta o'zgarishni birlashtirish
+                await asyncio.sleep(0.2)
+            except asyncio.TimeoutError:
+                pass
+
+    tasks = [
+        asyncio.ensure_future(publish()),
+        asyncio.ensure_future(symbol_registry.run()),
+        asyncio.ensure_future(fiat_rates.run()),
+    ]
+    if PRICE_STREAM_ENABLED:
+        tasks.append(asyncio.ensure_future(ticker_stream.run(all_coins)))
+    logger.info(f"👑 Narx leader ishga tushdi ({len(worker_inboxes)} shard)")
+    try:
+        await _serve(inbox, handle, tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await close_session()
+
+
+# ==================== WORKER ====================
+def _worker_main(shard, shards, inbox, to_leader, to_bot):
+    asyncio.run(_run_worker(shard, shards, inbox, to_leader, to_bot))
+
+
+async def _run_worker(shard, shards, inbox, to_leader, to_bot):
+    from loader import db, adb, sender
+    from utils import scheduler
+    from utils.alerts import alerts, Alert
+    from utils.api.crypto import close_session
+    from utils.api.fiat import fiat_rates
+    from utils.price_state import price_state
+    from utils.watchlist import watchlist
+
+    watchlist.partition = (shard, shards)
+    watchlist.load(db)
+    alerts.load(db, owns=watchlist.owns)
+    fiat_rates.load()
+    price_state.path = f"{os.path.splitext(price_state.path)[0]}.shard{shard}.json"
+    price_state.load()
+    price_state.retain(watchlist)
+    # Telegram global limiti bitta token uchun - shardlar orasida bo'linadi
+    sender.global_rate = sender.global_rate / shards
+
+    latest = {}
+    state = {"snapshot_at": 0.0, "reported": None}
+    snapshot_ready = asyncio.Event()
+
+    def wanted_coins():
+        coins = watchlist.coins() | alerts.coins()
+        premium = {
+            coin for user_id, user_coins in watchlist.user_coins.items()
+            if watchlist.is_premium(user_id) for coin in user_coins
+        }
+        premium.update(alert.coin for alert in alerts.active() if watchlist.is_premium(alert.user_id))
+        return coins, premium
+
+    def report_coins(force=False):
+        coins, premium = wanted_coins()
+        if force or (coins, premium) != state["reported"]:
+            state["reported"] = (coins, premium)
+            to_leader.put(("coins", shard, coins, premium))
+
+    async def leader_prices(coins, premium_coins):
+        missing = [coin for coin in coins if coin not in latest]
+        if missing:
+            report_coins()
+            # Yangi coinlar - leader ularni keyingi snapshotga qo'shguncha qisqa kutish
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + SHARD_FIRST_PRICE_WAIT
+            while any(coin not in latest for coin in missing):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                snapshot_ready.clear()
+                try:
+                    await asyncio.wait_for(snapshot_ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        return {coin: latest.get(coin) for coin in coins}
+
+    def handle(message):
+        kind = message[0]
+        if kind == "snapshot":
+            _, at, part = message
+            latest.update(part)
+            state["snapshot_at"] = at
+            snapshot_ready.set()
+        elif kind == "user_state":
+            _, user_id, coins, interval, is_premium, live = message
+            watchlist.set_user_state(user_id, coins, interval, is_premium, live)
+        elif kind == "user_states":
+            # Qayta ishga tushgandan keyin bot jarayonidagi joriy holat
+            for user_id, coins, interval, is_premium, live in message[1]:
+                watchlist.set_user_state(user_id, coins, interval, is_premium, live)
+        elif kind == "resend":
+            # Leader qayta ishga tushdi - coin ro'yxati qaytadan yuboriladi
+            report_coins(force=True)
+        elif kind == "alert_add":
+            _, row, price = message
+            alerts.add(Alert(*row))
+            alerts.seed(row[2], price)
+        elif kind == "alert_remove":
+            alerts.remove(message[1])
+
+    async def sync_loop():
+        while True:
+            try:
+                report_coins()
+                # Kuzatilmay qolgan coinlar narxi tashlanadi
+                for coin in set(latest) - state["reported"][0]:
+                    del latest[coin]
+            except Exception:
+                logger.exception(f"Shard {shard} sync xatosi")
+            await asyncio.sleep(SHARD_SYNC_SECONDS)
+
+    async def stats_loop():
+        while True:
+            try:
+                out = sender.snapshot()
+                to_bot.put(("stats", shard, {
+                    "users": len(watchlist.user_coins),
+                    "lag": round(scheduler.scheduler_stats["lag"], 2),
+                    "max_lag": round(scheduler.scheduler_stats["max_lag"], 2),
+                    "ticks": scheduler.scheduler_stats["ticks"],
+                    "snapshot_age": round(time.time() - state["snapshot_at"], 1) if state["snapshot_at"] else None,
+                    "queue": out["queue"],
+                    "sent": out["sent"],
+                    "failed": out["failed"],
+                    "pid": os.getpid(),
+                }))
+            except Exception:
+                logger.exception(f"Shard {shard} stats xatosi")
+            await asyncio.sleep(SHARD_STATS_SECONDS)
+
+    # Bir martalik signal ishladi - bot jarayonidagi menyu indeksi ham yangilansin
+    alerts.listeners.append(lambda alert: to_bot.put(("alert_done", alert.id)))
+    scheduler.set_price_source(leader_prices)
+    report_coins(force=True)
+
+    await sender.start()
+    tasks = [
+        asyncio.ensure_future(scheduler.start_scheduler()),
+        asyncio.ensure_future(watchlist.run(adb)),
+        asyncio.ensure_future(price_state.run()),
+        asyncio.ensure_future(fiat_rates.run()),
+        asyncio.ensure_future(sync_loop()),
+        asyncio.ensure_future(stats_loop()),
+    ]
+    logger.info(f"🧩 Shard {shard}/{shards} ishga tushdi: {len(watchlist.user_coins)} foydalanuvchi")
+    try:
+        await _serve(inbox, handle, tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await sender.stop()
+        price_state.save()
+        await close_session()
+        adb.close()
+
+
+# ==================== BOT JARAYONI ====================
+class ShardCoordinator:
+    """
+    Bot jarayoni tomoni: leader va workerlarni ishga tushiradi, handler o'zgarishlarini
+    tegishli shardga uzatadi va shard metrikalarini yig'adi
+    """
+
+    def __init__(self, shards=SCHEDULER_SHARDS):
+        self.shards = shards
+        self._ctx = None
+        # {nom: Process}; nom bo'yicha qayta ishga tushirish uchun target va argumentlar
+        self.processes = {}
+        self._specs = {}
+        self._restarts = {}
+        self._stopping = False
+        self.worker_inboxes = []
+        self.leader_inbox = None
+        self.to_bot = None
+        self.shard_stats = {}
+        self.leader_stats = {}
+
+    @property
+    def enabled(self):
+        return self.shards >= 2
+
+    def start(self):
+        from utils.watchlist import watchlist
+
+        ctx = self._ctx = multiprocessing.get_context("spawn")
+        self.leader_inbox = ctx.Queue()
+        self.to_bot = ctx.Queue()
+        self.worker_inboxes = [ctx.Queue() for _ in range(self.shards)]
+
+        self._specs["price-leader"] = (_leader_main, (self.leader_inbox, self.worker_inboxes, self.to_bot))
+        for shard in range(self.shards):
+            self._specs[f"scheduler-{shard}"] = (
+                _worker_main,
+                (shard, self.shards, self.worker_inboxes[shard], self.leader_inbox, self.to_bot),
+            )
+        for name in self._specs:
+            self._spawn(name)
+
+        watchlist.listeners.append(self.forward_user)
+        logger.info(f"🧩 Sharding: {self.shards} worker + leader")
+
+    def _spawn(self, name):
+        target, args = self._specs[name]
+        process = self._ctx.Process(target=target, name=name, args=args, daemon=True)
+        process.start()
+        self.processes[name] = process
+
+    # ---------- nazorat ----------
+    async def supervise(self):
+        """
+        O'lgan leader/workerni qayta ishga tushirish (navbatlar o'sha-o'sha qoladi).
+        Ketma-ket yiqilishda pauza ikki baravar oshadi (SHARD_RESTART_MAX_BACKOFF gacha)
+        """
+        backoff = {}
+        next_try = {}
+        while not self._stopping:
+            await asyncio.sleep(SHARD_SUPERVISE_SECONDS)
+            now = time.monotonic()
+            for name, process in list(self.processes.items()):
+                if self._stopping or process.is_alive():
+                    continue
+                if now < next_try.get(name, 0.0):
+                    continue
+                logger.error(f"💀 {name} jarayoni to'xtadi (exitcode={process.exitcode}), qayta ishga tushirilmoqda")
+                delay = backoff.get(name, 0.0)
+                backoff[name] = min(max(delay * 2, SHARD_SUPERVISE_SECONDS), SHARD_RESTART_MAX_BACKOFF)
+                next_try[name] = now + backoff[name]
+                try:
+                    self._spawn(name)
+                except Exception as e:
+                    logger.error(f"{name} ni ishga tushirishda xato: {e}")
+                    continue
+                self._restarts[name] = self._restarts.get(name, 0) + 1
+                self._resend(name)
+            # Barqaror ishlayotganlarning pauzasi qaytadan boshlanadi
+            for name in [n for n, t in next_try.items() if now - t > SHARD_RESTART_MAX_BACKOFF]:
+                backoff.pop(name, None)
+                next_try.pop(name, None)
+
+    def _resend(self, name):
+        """Qayta ishga tushgan jarayonga joriy holatni yuborish"""
+        from utils.watchlist import watchlist
+
+        if name == "price-leader":
+            # Leaderning coin ro'yxati bo'sh - workerlar o'z coinlarini qaytadan yuboradi
+            for inbox in self.worker_inboxes:
+                inbox.put(("resend",))
+            return
+        shard = int(name.rsplit("-", 1)[1])
+        states = [
+            (user_id, *watchlist.state_of(user_id))
+            for user_id in list(watchlist.user_interval)
+            if user_id % self.shards == shard
+        ]
+        self.worker_inboxes[shard].put(("user_states", states))
+
+    def _inbox(self, user_id):
+        return self.worker_inboxes[user_id % self.shards]
+
+    # ---------- handler o'zgarishlari ----------
+    def forward_user(self, user_id):
+        from utils.watchlist import watchlist
+
+        self._inbox(user_id).put(("user_state", user_id, *watchlist.state_of(user_id)))
+
+    def forward_alert_add(self, alert, price):
+        if self.enabled:
+            row = (alert.id, alert.user_id, alert.coin, alert.kind, alert.threshold, alert.window_min)
+            self._inbox(alert.user_id).put(("alert_add", row, price))
+
+    def forward_alert_remove(self, alert):
+        if self.enabled:
+            self._inbox(alert.user_id).put(("alert_remove", alert.id))
+
+    # ---------- metrikalar ----------
+    def _handle(self, message):
+        from utils.alerts import alerts
+
+        kind = message[0]
+        if kind == "stats":
+            self.shard_stats[message[1]] = message[2]
+        elif kind == "leader":
+            self.leader_stats = message[1]
+        elif kind == "alert_done":
+            alerts.remove(message[1])
+
+    async def run(self):
+        await asyncio.gather(_queue_reader(self.to_bot, self._handle), self.supervise())
+
+    async def stop(self, timeout=15.0):
+        """Workerlar navbatdagi xabarlarni yuborib, holatni saqlab chiqadi"""
+        self._stopping = True
+        for inbox in self.worker_inboxes:
+            inbox.put(STOP)
+        if self.leader_inbox is not None:
+            self.leader_inbox.put(STOP)
+        if self.to_bot is not None:
+            self.to_bot.put(STOP)
+        for process in self.processes.values():
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = {}
+
+    def snapshot(self):
+        return {
+            "leader": self.leader_stats,
+            "shards": dict(sorted(self.shard_stats.items())),
+            "restarts": dict(self._restarts),
+        }
+
+
+shards = ShardCoordinator()
@@ -0,0 +1,129 @@
+"""
+Users jadvali oldidagi read-through kesh: bitta update davomida foydalanuvchi qatori
+ko'pi bilan bir marta o'qiladi. Handlerlardagi har bir yozuv keshni ham yangilaydi,
+TTL esa tashqi (qo'lda) o'zgarishlarni vaqt o'tib tortib oladi
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from loader import adb
+from utils.counters import view_counters
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+COLUMNS = (
+    "id", "phone", "username", "full_name", "is_premium", "premium_until",
+    "premium_plan_days", "premium_given_at", "last_payment_amount", "last_payment_rate",
+    "interval_min", "view_count", "daily_views", "last_view_date",
+)
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM Users WHERE id=?"
+# Ro'yxatdan o'tishda DB default qiymatlari
+_DEFAULTS = {"is_premium": 0, "view_count": 0, "daily_views": 0}
+
+
+class UserCache:
+    """
+    {user_id: (muddat, yozuv yoki None)} - LRU tartibida. None - ro'yxatdan o'tmagan
+    (registratsiya put() bilan darhol almashtiradi). Bir foydalanuvchi uchun
+    parallel so'rovlar bitta DB o'qishini kutadi
+    """
+
+    def __init__(self, max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # O'qish davomida yozilgan foydalanuvchilar - eski qator keshga tushmasin
+        self._stale = set()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+
+    async def get(self, user_id):
+        """Foydalanuvchi yozuvi (dict) yoki None"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["expired"] += 1
+
+        future = self._inflight.get(user_id)
+        if future is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(future)
+
+        self.stats["misses"] += 1
+        future = self._inflight[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            row = await adb.execute(_SELECT, (user_id,), fetchone=True)
+            record = self._record(row) if row else None
+            if user_id not in self._stale:
+                self._store(user_id, record)
+            future.set_result(record)
+            return record
+        except Exception as e:
+            future.set_exception(e)
+            # Kutayotganlar bo'lmasa "exception was never retrieved" ogohlantirishi chiqmasin
+            future.exception()
+            raise
+        finally:
+            del self._inflight[user_id]
+            self._stale.discard(user_id)
+
+    @staticmethod
+    def _record(row):
+        record = dict(zip(COLUMNS, row))
+        # view_count yozilmagan write-behind ko'rishlar bilan (keyin increment() bilan yuritiladi)
+        record["view_count"] = (record["view_count"] or 0) + view_counters.pending_views(record["id"])
+        return record
+
+    def _store(self, user_id, record):
+        self._entries[user_id] = (time.monotonic() + self.ttl, record)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # ---------- yozuvlar ----------
+    def _written(self, user_id):
+        if user_id in self._inflight:
+            self._stale.add(user_id)
+        self.stats["writes"] += 1
+
+    def put(self, user_id, **fields):
+        """Yangi ro'yxatdan o'tgan foydalanuvchi"""
+        record = dict.fromkeys(COLUMNS)
+        record.update(_DEFAULTS)
+        record.update(fields, id=user_id)
+        self._written(user_id)
+        self._store(user_id, record)
+
+    def update(self, user_id, **fields):
+        """DB'ga yozilgan ustunlar - keshdagi yozuv bo'lsa yangilanadi"""
+        self._written(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] is not None:
+            entry[1].update(fields)
+
+    def increment(self, user_id, column, delta=1):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] is not None:
+            entry[1][column] = (entry[1][column] or 0) + delta
+
+    def invalidate(self, user_id):
+        self._written(user_id)
+        self._entries.pop(user_id, None)
+
+    def snapshot(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else None,
+        }
+
+
+user_cache = UserCache()
@@ -0,0 +1,226 @@
+"""
+Xotiradagi kuzatuv indeksi - CryptoPreferences va Users bilan sinxron
+user → coinlar, coin → obunachilar, user → interval / premium / live ticker xabari
+"""
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 40
+# Indeksni DB bilan to'liq solishtirish davri (qo'lda qilingan DB o'zgarishlari uchun)
+WATCHLIST_RECONCILE_SECONDS = float(os.getenv("WATCHLIST_RECONCILE_SECONDS", "900"))
+
+
+class WatchlistIndex:
+    """
+    Startupda bir marta yuklanadi, handlerlar orqali qisman yangilanadi,
+    davriy ravishda DB bilan solishtiriladi (reconcile)
+    """
+
+    def __init__(self):
+        self.user_coins = {}
+        self.coin_users = {}
+        self.user_interval = {}
+        self.user_premium = {}
+        # Live ticker yoqilganlar: {user_id: pin qilingan xabar id (0 - hali yuborilmagan)}
+        self.user_live = {}
+        # listener(user_id) - foydalanuvchi kuzatuvi yoki intervali o'zgardi
+        self.listeners = []
+        # Sharding rejimida (shard, shards): faqat user_id % shards == shard foydalanuvchilar
+        self.partition = None
+        # Handler o'zgarishlari hisoblagichi - reconcile paytidagi poygani aniqlash uchun
+        self._version = 0
+        self.stats = {"loads": 0, "reconciled_changes": 0, "reconcile_skipped": 0}
+
+    # ---------- o'qish ----------
+    def owns(self, user_id):
+        return self.partition is None or user_id % self.partition[1] == self.partition[0]
+
+    def coins_of(self, user_id):
+        return self.user_coins.get(user_id, set())
+
+    def subscribers(self, coin):
+        return self.coin_users.get(coin, set())
+
+    def watching_users(self):
+        return set(self.user_coins)
+
+    def coins(self):
+        return set(self.coin_users)
+
+    def has(self, user_id, coin):
+        return coin in self.user_coins.get(user_id, ())
+
+    def interval(self, user_id):
+        return self.user_interval.get(user_id) or DEFAULT_INTERVAL
+
+    def is_premium(self, user_id):
+        return self.user_premium.get(user_id, False)
+
+    def ticker_message(self, user_id):
+        """Live ticker o'chiq bo'lsa None, aks holda xabar id (0 - hali yo'q)"""
+        return self.user_live.get(user_id)
+
+    # ---------- yozish (handlerlar) ----------
+    def add(self, user_id, coin):
+        self._version += 1
+        self.user_coins.setdefault(user_id, set()).add(coin)
+        self.coin_users.setdefault(coin, set()).add(user_id)
+        self._notify(user_id)
+
+    def remove(self, user_id, coin):
+        self._version += 1
+        coins = self.user_coins.get(user_id)
+        if coins is not None:
+            coins.discard(coin)
+            if not coins:
+                del self.user_coins[user_id]
+        users = self.coin_users.get(coin)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.coin_users[coin]
+        self._notify(user_id)
+
+    def set_user(self, user_id, interval=DEFAULT_INTERVAL, is_premium=False):
+        self._version += 1
+        self.user_interval[user_id] = interval
+        self.user_premium[user_id] = bool(is_premium)
+
+    def set_interval(self, user_id, interval):
+        self._version += 1
+        self.user_interval[user_id] = interval
+        self._notify(user_id)
+
+    def set_premium(self, user_id, is_premium):
+        self._version += 1
+        self.user_premium[user_id] = bool(is_premium)
+        self._notify(user_id)
+
+    def set_live(self, user_id, enabled):
+        self._version += 1
+        if enabled:
+            self.user_live[user_id] = 0
+        else:
+            self.user_live.pop(user_id, None)
+        self._notify(user_id)
+
+    def set_ticker_message(self, user_id, message_id):
+        self._version += 1
+        if user_id in self.user_live:
+            self.user_live[user_id] = message_id
+
+    def set_user_state(self, user_id, coins, interval, is_premium, live=False):
+        """Foydalanuvchi holatini to'liq almashtirish (shard workerga yuborilgan o'zgarish)"""
+        self._version += 1
+        old = self.user_coins.pop(user_id, set())
+        for coin in old - set(coins):
+            users = self.coin_users.get(coin)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.coin_users[coin]
+        if coins:
+            self.user_coins[user_id] = set(coins)
+            for coin in coins:
+                self.coin_users.setdefault(coin, set()).add(user_id)
+        self.user_interval[user_id] = interval
+        self.user_premium[user_id] = bool(is_premium)
+        if live:
+            self.user_live.setdefault(user_id, 0)
+        else:
+            self.user_live.pop(user_id, None)
+        self._notify(user_id)
+
+    def state_of(self, user_id):
+        return (
+            tuple(self.coins_of(user_id)), self.interval(user_id),
+            self.is_premium(user_id), user_id in self.user_live,
+        )
+
+    # ---------- DB ----------
+    @staticmethod
+    def fetch_rows(db):
+        """DB'dan to'liq holat (thread'da chaqirish mumkin)"""
+        users = db.execute(
+            "SELECT id, interval_min, is_premium, live_ticker, ticker_message_id FROM Users", fetchall=True
+        ) or []
+        prefs = db.execute("SELECT user_id, coin_symbol FROM CryptoPreferences", fetchall=True) or []
+        return users, prefs
+
+    def load(self, db):
+        """Startupda to'liq yuklash"""
+        self.apply(*self.fetch_rows(db))
+        logger.info(
+            f"📋 Kuzatuv indeksi: {len(self.user_coins)} foydalanuvchi, {len(self.coin_users)} coin"
+        )
+
+    async def run(self, adb):
+        """Fonda davriy reconcile - DB o'qish AsyncDatabase o'quvchi thread'ida, indeks loop ichida yangilanadi"""
+        while True:
+            await asyncio.sleep(WATCHLIST_RECONCILE_SECONDS)
+            try:
+                version = self._version
+                rows = await adb.read(self.fetch_rows)
+                if version != self._version:
+                    # O'qish paytida handler indeksni o'zgartirdi - eski holat yozilmasin
+                    self.stats["reconcile_skipped"] += 1
+                    continue
+                self.apply(*rows)
+            except Exception as e:
+                logger.error(f"Watchlist reconcile xatosi: {e}")
+
+    def apply(self, users, prefs):
+        """
+        DB holatini indeksga o'rnatish; farq qilgan foydalanuvchilar listenerlarga bildiriladi
+        """
+        if self.partition is not None:
+            users = [row for row in users if self.owns(row[0])]
+            prefs = [row for row in prefs if self.owns(row[0])]
+
+        user_coins = {}
+        coin_users = {}
+        for user_id, coin in prefs:
+            user_coins.setdefault(user_id, set()).add(coin)
+            coin_users.setdefault(coin, set()).add(user_id)
+
+        user_interval = {row[0]: row[1] for row in users}
+        changed = {
+            user_id
+            for user_id in set(user_coins) | set(self.user_coins)
+            if user_coins.get(user_id) != self.user_coins.get(user_id)
+            or user_interval.get(user_id) != self.user_interval.get(user_id)
+        }
+
+        self.user_coins = user_coins
+        self.coin_users = coin_users
+        self.user_interval = user_interval
+        self.user_premium = {row[0]: bool(row[2]) for row in users}
+        self.user_live = {row[0]: row[4] or 0 for row in users if row[3]}
+
+        if self.stats["loads"]:
+            self.stats["reconciled_changes"] += len(changed)
+        self.stats["loads"] += 1
+        for user_id in changed:
+            self._notify(user_id)
+
+    def _notify(self, user_id):
+        for listener in self.listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.error(f"Watchlist listener xatosi: {e}")
+
+    def snapshot(self):
+        return {
+            "users": len(self.user_coins),
+            "coins": len(self.coin_users),
+            "pairs": sum(len(coins) for coins in self.user_coins.values()),
+            "live": len(self.user_live),
+            **self.stats,
+        }
+
+
+watchlist = WatchlistIndex()